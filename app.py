@@ -1,22 +1,45 @@
 
+import asyncio
+import threading
 import gradio as gr
-from src.rag_pipeline import ComplaintRAG
+from src.api_client import RAGClient, format_pool_metrics
+from src.config import GENERATION_QUEUE_SIZE, APP_STREAMING, RAG_API_URL
+from src.instrumentation import process_uptime
 
-# Initialize RAG System (Load once)
-print("Loading RAG System for UI...")
-rag = ComplaintRAG()
+# Interpreter start-up plus the imports above
+IMPORT_SECONDS = process_uptime()
 
-def chat_function(message, history):
-    # 1. Retrieve sources for display
-    docs = rag.retrieve_only(message)
-    
-    # 2. Generate Answer
-    # Note: query() internally calls retrieval again. 
-    # For a production system we'd optimize to pass docs, but this is fine for now.
-    answer = rag.query(message)
-    
-    # 3. Format Sources
+startup_report = None
+if RAG_API_URL:
+    # Thin client: the models live in the `python -m src.server` worker pool
+    print(f"Imports took {IMPORT_SECONDS:.2f}s. Using the RAG API at {RAG_API_URL}")
+    client = RAGClient(RAG_API_URL)
+    rag = latency = None
+else:
+    from src.rag_pipeline import ComplaintRAG
+    from src.instrumentation import StageRecorder
+    from src.startup import start
+
+    # Initialize RAG System (Load once)
+    print(f"Imports took {IMPORT_SECONDS:.2f}s. Loading RAG System for UI...")
+    client = None
+    latency = StageRecorder()
+    rag = ComplaintRAG(hooks=[latency], auto_filter=True)
+
+    def load_rag():
+        # Embedder, index and LLM load (and warm up) in parallel while the UI comes up;
+        # a question asked before they are ready waits for the component it needs
+        global startup_report
+        startup_report = start(rag, import_seconds=IMPORT_SECONDS)
+        print(startup_report.summary())
+
+    threading.Thread(target=load_rag, name="startup", daemon=True).start()
+
+def format_sources(docs, filters=None):
     sources_html = "<br><hr><h4>Sources:</h4>"
+    if filters is not None:
+        # Filters parsed from the question ("... in Texas in 2023")
+        sources_html += f'<span style="font-size: 0.8em; color: gray;">Filtered to: {filters.describe()}</span><br>'
     for i, doc in enumerate(docs):
         # Extract metadata safely
         product = doc.metadata.get('Product', 'Unknown Product')
@@ -35,10 +58,58 @@ def chat_function(message, history):
             <span style="font-size: 0.8em;">ID: {c_id} | Date: {date}</span>
         </div>
         """
+    return sources_html
+
+async def chat_function(message, history):
+    if client is not None:
+        # Whole answers from whichever server worker takes the request
+        result = await asyncio.to_thread(client.query, message)
+        answer = result.answer
+        sources_html = format_sources(result.sources, result.filters)
+        yield f"{answer}\n{sources_html}"
+        return
+    if APP_STREAMING:
+        # 1. Retrieve once (off the event loop); sources are known before generation starts
+        stream = await asyncio.to_thread(rag.stream_query, message)
+        sources_html = format_sources(stream.sources, stream.filters)
+        
+        # 2. Render the answer as it is decoded, sources underneath
+        answer = ""
+        yield f"_Generating..._\n{sources_html}"
+        async for piece in stream:
+            answer += piece
+            yield f"{answer}\n{sources_html}"
+        result = stream.result
+    else:
+        # Whole answers, generated in micro-batches alongside other users' requests
+        result = await rag.aquery(message)
+        answer = result.answer
+        sources_html = format_sources(result.sources, result.filters)
+        yield f"{answer}\n{sources_html}"
     
-    # Combine Answer and Sources
-    final_output = f"{answer}\n{sources_html}"
-    return final_output
+    if result.cached:
+        stats = rag.cache_stats()
+        sources_html += f"""
+        <span style="font-size: 0.8em; color: gray;">Served from cache in {result.timings['total'] * 1000:.1f} ms
+        (hit rate {stats['hit_rate']:.0%}, {stats['size']} cached questions)</span>
+        """
+        yield f"{answer}\n{sources_html}"
+
+def latency_report():
+    if client is not None:
+        try:
+            return format_pool_metrics(client.metrics())
+        except Exception as e:
+            return f"_Server metrics unavailable: {e}_"
+    report = latency.format_markdown()
+    if startup_report is not None:
+        report = f"Ready {startup_report.ready_seconds:.1f}s after launch.\n\n" + report
+    queue = rag.queue_stats()
+    if queue:
+        report += (f"\n\nGeneration queue: {queue['queue_depth']}/{queue['max_queue']} waiting, "
+                   f"mean batch {queue['mean_batch_size']:.1f}, "
+                   f"wait p50 {queue['wait_p50_ms']:.0f} ms / p95 {queue['wait_p95_ms']:.0f} ms")
+    return report
 
 # Create Gradio Interface
 with gr.Blocks(title="CrediTrust Intelligent Complaint Analysis") as demo:
@@ -48,13 +119,18 @@ with gr.Blocks(title="CrediTrust Intelligent Complaint Analysis") as demo:
     chatbot = gr.Chatbot(label="Conversation")
     msg = gr.Textbox(label="Your Question", placeholder="e.g., Why are people complaining about credit card late fees?")
     clear = gr.ClearButton([msg, chatbot])
+    with gr.Accordion("Latency by stage", open=False):
+        latency_table = gr.Markdown(latency_report())
 
-    def respond(message, chat_history):
-        bot_message = chat_function(message, chat_history)
-        chat_history.append((message, bot_message))
-        return "", chat_history
+    async def respond(message, chat_history):
+        chat_history.append((message, ""))
+        async for bot_message in chat_function(message, chat_history):
+            chat_history[-1] = (message, bot_message)
+            yield "", chat_history, latency_report()
 
-    msg.submit(respond, [msg, chatbot], [msg, chatbot])
+    msg.submit(respond, [msg, chatbot], [msg, chatbot, latency_table])
 
 if __name__ == "__main__":
+    # Let several chats run concurrently; generation is still serialized (and batched) by the RAG queue
+    demo.queue(default_concurrency_limit=GENERATION_QUEUE_SIZE)
     demo.launch(share=False)
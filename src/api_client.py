@@ -0,0 +1,110 @@
+import json
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional
+
+from langchain_core.documents import Document
+
+from src.filters import SearchFilter
+
+@dataclass
+class RemoteResult:
+    """
+    A RAGResult as returned by src.server (same fields), plus the index of
+    the worker process that answered.
+    """
+    question: str
+    answer: str
+    sources: List[Document] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    tokens: Dict[str, int] = field(default_factory=dict)
+    cached: bool = False
+    filters: Optional[SearchFilter] = None
+    worker: int = 0
+
+    @classmethod
+    def from_dict(cls, body: Dict[str, Any]) -> 'RemoteResult':
+        return cls(
+            question=body['question'],
+            answer=body['answer'],
+            sources=[_document(source) for source in body['sources']],
+            timings=body['timings'],
+            tokens=body['tokens'],
+            cached=body['cached'],
+            filters=SearchFilter.from_dict(body['filters']) if body.get('filters') else None,
+            worker=body['worker'],
+        )
+
+def _document(source: Dict[str, Any]) -> Document:
+    return Document(page_content=source['content'], metadata=source['metadata'], id=source.get('id'))
+
+class RAGClient:
+    """
+    Client of the src.server HTTP/JSON API, with only light imports, so a UI
+    can front a pool of model-holding workers.
+
+    Args:
+        base_url (str): Server address, e.g. "http://127.0.0.1:8000".
+        timeout (float): Seconds to wait for a response (answers can take a while).
+    """
+
+    def __init__(self, base_url: str, timeout: float = 300.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path: str, payload: Optional[Dict[str, Any]] = None,
+                 allowed: tuple = (200,)) -> Dict[str, Any]:
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            body = json.loads(e.read() or b'{}')
+            if e.code in allowed:
+                return body
+            raise RuntimeError(f"{path} failed with HTTP {e.code}: {body.get('error', body)}") from e
+
+    @staticmethod
+    def _filters(filters: Optional[Mapping[str, Any]]) -> Optional[Dict[str, Any]]:
+        if isinstance(filters, SearchFilter):
+            return filters.to_dict()
+        return dict(filters) if filters is not None else None
+
+    def query(self, question: str, filters: Optional[Mapping[str, Any]] = None) -> RemoteResult:
+        body = self._request('/query', {'question': question, 'filters': self._filters(filters)})
+        return RemoteResult.from_dict(body)
+
+    def retrieve(self, question: str, filters: Optional[Mapping[str, Any]] = None) -> List[Document]:
+        body = self._request('/retrieve', {'question': question, 'filters': self._filters(filters)})
+        return [_document(source) for source in body['sources']]
+
+    def batch(self, questions: List[str], filters: Optional[Mapping[str, Any]] = None) -> List[RemoteResult]:
+        body = self._request('/batch', {'questions': questions, 'filters': self._filters(filters)})
+        return [RemoteResult.from_dict(result) for result in body['results']]
+
+    def health(self) -> Dict[str, Any]:
+        return self._request('/health')
+
+    def ready(self) -> Dict[str, Any]:
+        """The pool status; {'ready': False, ...} while workers are still loading."""
+        return self._request('/ready', allowed=(503,))
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        """Metrics of every worker (see server.Worker.metrics)."""
+        return self._request('/metrics')['workers']
+
+def format_pool_metrics(workers: List[Dict[str, Any]]) -> str:
+    """Markdown table of per-worker request counts, /query latency and memory."""
+    if not workers:
+        return "_No workers have reported yet._"
+    lines = ["| Worker | PID | Ready | Requests | /query p50 (ms) | /query p95 (ms) | PSS (MB) |",
+             "|---|---|---|---|---|---|---|"]
+    for w in workers:
+        latency = w['latency_ms'].get('/query', {})
+        lines.append(f"| {w['worker']} | {w['pid']} | {'yes' if w['ready'] else 'no'} | "
+                     f"{sum(w['requests'].values())} | {latency.get('p50', '-')} | {latency.get('p95', '-')} | "
+                     f"{w['memory'].get('pss_mb', '-')} |")
+    return "\n".join(lines)
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import src.config as cfg
+
+logger = logging.getLogger(__name__)
+
+class GenerationBatcher:
+    """
+    Bounded asyncio queue that micro-batches generation requests.
+
+    Requests are collected until `max_batch_size` are waiting or the first one
+    has waited `window_ms`, then handed to `generate_batch` as one list on a
+    single dedicated thread, so the model never runs two forward passes at
+    once and the event loop is never blocked. When `max_queue` requests are
+    already waiting, `submit` applies backpressure by awaiting a free slot.
+
+    Attributes:
+        batches (int): Batches generated so far.
+        requests (int): Requests answered so far.
+    """
+
+    def __init__(self,
+                 generate_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = cfg.GENERATION_BATCH_SIZE,
+                 window_ms: float = cfg.GENERATION_BATCH_WINDOW_MS,
+                 max_queue: int = cfg.GENERATION_QUEUE_SIZE):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = window_ms / 1000
+        self.max_queue = max_queue
+        self.batches = 0
+        self.requests = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generation")
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _ensure_worker(self):
+        if self._closed:
+            raise RuntimeError("GenerationBatcher is closed")
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        if self._loop is not None and self._loop is not loop:
+            self._abandon(RuntimeError("GenerationBatcher moved to another event loop"))
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = loop.create_task(self._run())
+
+    def _abandon(self, error: Exception):
+        """
+        Stops the worker of the current loop and fails every request still
+        queued on it, so no caller waits forever on a future nobody resolves.
+        The loop's own thread does the work; a closed loop has no waiters left.
+        """
+        loop, queue, worker = self._loop, self._queue, self._worker
+
+        def fail_pending():
+            if worker is not None:
+                worker.cancel()
+            while queue is not None and not queue.empty():
+                _, _, future = queue.get_nowait()
+                if not future.done():
+                    future.set_exception(error)
+
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            fail_pending()
+        else:
+            loop.call_soon_threadsafe(fail_pending)
+
+    def close(self):
+        """Fails queued requests, stops the worker and releases the generation thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._abandon(RuntimeError("GenerationBatcher is closed"))
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, item: Any) -> Tuple[Any, float]:
+        """
+        Queues one item for generation.
+
+        Returns:
+            Tuple[Any, float]: The item's output from `generate_batch` and the
+            seconds it spent queued before its batch started.
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((item, time.perf_counter(), future))
+        return await future
+
+    async def _collect(self, batch: List[Tuple[Any, float, asyncio.Future]]):
+        """Waits for a request, then for more until `batch` is full or the window has passed."""
+        first = await self._queue.get()
+        batch.append(first)
+        deadline = first[1] + self.window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        while True:
+            batch = []
+            try:
+                await self._collect(batch)
+                await self._dispatch(batch)
+            except asyncio.CancelledError:
+                # Stopped by close() or a loop change while this batch was collected or generated
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("GenerationBatcher stopped"))
+                raise
+
+    async def _dispatch(self, batch: List[Tuple[Any, float, asyncio.Future]]):
+        """
+        Generates one batch on the generation thread and resolves its futures.
+        A batch that fails is retried one item at a time, so only the requests
+        that fail on their own get the error.
+        """
+        started = time.perf_counter()
+        waits = [started - queued for _, queued, _ in batch]
+        with self._lock:
+            self._waits.extend(waits)
+            self.batches += 1
+            self.requests += len(batch)
+        items = [item for item, _, _ in batch]
+        try:
+            outputs = await self._loop.run_in_executor(self._executor, self.generate_batch, items)
+            results = [(output, None) for output in outputs]
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Generation failed: {e}")
+                results = [(None, e)]
+            else:
+                logger.error(f"Generation batch of {len(batch)} failed, retrying its requests one at a time: {e}")
+                results = await self._loop.run_in_executor(self._executor, self._generate_each, items)
+        for (_, _, future), (output, error), wait in zip(batch, results, waits):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result((output, wait))
+
+    def _generate_each(self, items: List[Any]) -> List[Tuple[Any, Optional[Exception]]]:
+        """Runs `generate_batch` on every item alone: (output, None) or (None, error) per item."""
+        results = []
+        for item in items:
+            try:
+                results.append((self.generate_batch([item])[0], None))
+            except Exception as e:
+                logger.error(f"Generation failed: {e}")
+                results.append((None, e))
+        return results
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, float]:
+        """Current queue depth, average batch size and wait times (ms) over the last 1000 requests."""
+        with self._lock:
+            waits = np.array(self._waits) * 1000
+            batches, requests = self.batches, self.requests
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue": self.max_queue,
+            "batches": batches,
+            "mean_batch_size": requests / batches if batches else 0.0,
+            "wait_p50_ms": float(np.percentile(waits, 50)) if len(waits) else 0.0,
+            "wait_p95_ms": float(np.percentile(waits, 95)) if len(waits) else 0.0,
+        }
@@ -0,0 +1,95 @@
+import argparse
+import json
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.config import EMBEDDING_MODEL_NAME, REPORTS_DIR
+from src.data_io import read_table
+from src.embedding_engine import (
+    EMBEDDING_BACKENDS, OnnxEmbeddings, length_buckets, load_embeddings, padding_ratio,
+)
+from src.synthetic_data import generate_complaints
+
+CHUNK_CHARS = 500 # create_vector_store.CHUNK_SIZE
+
+def corpus(n: int, data_path: Optional[str] = None, seed: int = 0) -> List[str]:
+    """`n` chunk-sized texts: real narratives from `data_path`, or synthetic complaints."""
+    if data_path:
+        texts = read_table(data_path, columns=['cleaned_narrative'])['cleaned_narrative'].dropna()
+    else:
+        # Up to ~90 words, the length of a full chunk
+        texts = generate_complaints(n, seed=seed, max_words=90, narrative_fraction=1.0)['Consumer complaint narrative']
+    return [text[:CHUNK_CHARS] for text in texts.head(n)]
+
+def top_k(corpus_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    # Vectors are normalized, so the dot product is the cosine similarity
+    return np.argsort(-(query_vectors @ corpus_vectors.T), axis=1)[:, :k]
+
+def benchmark_backends(texts: List[str], queries: List[str], backends: List[str], k: int,
+                       model_name: str = EMBEDDING_MODEL_NAME) -> Dict[str, Dict[str, float]]:
+    """
+    Embeds `texts` and `queries` with each backend (no embedding cache) and
+    compares its top-k neighbours with those of the first backend.
+    """
+    results = {}
+    reference = None
+    for backend in backends:
+        model = load_embeddings(model_name, backend)
+        model.embed_documents(texts[:8]) # warm-up
+        start = time.perf_counter()
+        docs = np.asarray(model.embed_documents(texts), dtype=np.float32)
+        docs_seconds = time.perf_counter() - start
+        latencies = []
+        vectors = []
+        for query in queries:
+            start = time.perf_counter()
+            vectors.append(model.embed_query(query))
+            latencies.append(time.perf_counter() - start)
+        neighbours = top_k(docs, np.asarray(vectors, dtype=np.float32), k)
+        if reference is None:
+            reference = neighbours
+        overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(neighbours, reference)])
+        results[backend] = {
+            'docs_per_sec': round(len(texts) / docs_seconds, 1),
+            'query_p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 2),
+            f'overlap@{k}': round(float(overlap), 4),
+        }
+        if isinstance(model, OnnxEmbeddings):
+            lengths = [len(ids) for ids in model.token_ids(texts)]
+            arrival = [np.arange(i, min(i + model.batch_size, len(texts))) for i in range(0, len(texts), model.batch_size)]
+            results[backend]['padding_arrival'] = round(padding_ratio(lengths, arrival), 3)
+            results[backend]['padding_bucketed'] = round(padding_ratio(lengths, length_buckets(lengths, model.batch_size)), 3)
+    return results
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Compare embedding engines: docs/sec, query latency and top-k overlap with the first backend.")
+    parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS,
+                        help="The first backend is the reference (normally fp32 'torch').")
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--data-path', default=None,
+                        help="Parquet/Feather/CSV with a cleaned_narrative column (default: synthetic complaints).")
+    parser.add_argument('--json', default=str(REPORTS_DIR / "embedding_backends.json"))
+    args = parser.parse_args(argv)
+
+    texts = corpus(args.docs + args.queries, args.data_path)
+    # Queries are short, like questions: the opening words of held-out complaints
+    queries = [' '.join(text.split()[:12]) for text in texts[args.docs:]]
+    results = benchmark_backends(texts[:args.docs], queries, args.backends, args.k)
+
+    print(f"{'backend':>10} {'docs/s':>10} {'query p50 ms':>13} {'overlap@' + str(args.k):>10} {'padding':>16}")
+    for name, stats in results.items():
+        padding = (f"{stats['padding_arrival']:.0%} -> {stats['padding_bucketed']:.0%}"
+                   if 'padding_bucketed' in stats else '')
+        print(f"{name:>10} {stats['docs_per_sec']:>10} {stats['query_p50_ms']:>13} "
+              f"{stats[f'overlap@{args.k}']:>10} {padding:>16}")
+    with open(args.json, 'w') as f:
+        json.dump({'docs': args.docs, 'queries': args.queries, 'reference': args.backends[0],
+                   'backends': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
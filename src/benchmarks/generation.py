@@ -0,0 +1,99 @@
+import argparse
+import json
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import GENERATION_BATCH_SIZE, REPORTS_DIR
+from src.evaluate_rag import evaluate_pipeline, load_questions
+from src.generation import GENERATION_BACKENDS
+from src.rag_pipeline import ComplaintRAG
+
+REFERENCE_CSV = REPORTS_DIR / "rag_evaluation_enhanced.csv"
+
+def token_f1(answer: str, reference: str) -> float:
+    """SQuAD-style token overlap F1 between two answers."""
+    a, b = answer.lower().split(), reference.lower().split()
+    if not a or not b:
+        return float(a == b)
+    common = sum((Counter(a) & Counter(b)).values())
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(a), common / len(b)
+    return 2 * precision * recall / (precision + recall)
+
+def load_reference(path: str) -> Dict[str, str]:
+    """Reads the "Generated Answer" of every question in an evaluation CSV (see src.evaluate_rag)."""
+    df = pd.read_csv(path, keep_default_na=False)
+    return dict(zip(df["Question"], df["Generated Answer"].astype(str)))
+
+def compare_backends(questions: List[str], backends: List[str], batch_size: int,
+                     reference: Dict[str, str]) -> Dict[str, Dict[str, float]]:
+    """
+    Answers `questions` with every backend and scores the answers against
+    `reference` (question -> answer, normally the fp32 evaluation report):
+    exact-match rate and mean token F1, plus generation latency per question.
+    Questions without a reference answer are timed but not scored.
+    """
+    scored = [i for i, q in enumerate(questions) if q in reference]
+    if not scored:
+        raise ValueError("None of the questions has a reference answer")
+    results = {}
+    for backend in backends:
+        rag = ComplaintRAG(generation_backend=backend, cache_size=0)
+        start = time.perf_counter()
+        rag._load_llm()
+        load_seconds = time.perf_counter() - start
+        df = evaluate_pipeline(rag, questions, batch_size=batch_size)
+        pairs = [(df["Generated Answer"].iloc[i], reference[questions[i]]) for i in scored]
+        results[backend] = {
+            'load_s': round(load_seconds, 2),
+            'generate_ms': round(float(df["Generate (ms)"].mean()), 1),
+            'latency_s': round(float(df["Latency (s)"].mean()), 2),
+            'exact_match': round(float(np.mean([a == r for a, r in pairs])), 3),
+            'token_f1': round(float(np.mean([token_f1(a, r) for a, r in pairs])), 3),
+        }
+    base = results[backends[0]]['generate_ms']
+    for stats in results.values():
+        stats['speedup'] = round(base / stats['generate_ms'], 2) if stats['generate_ms'] else 0.0
+    return results
+
+def format_markdown(results: Dict[str, Dict[str, float]]) -> str:
+    lines = ["| Backend | Load (s) | Generate (ms/question) | Speedup | Exact match | Token F1 |",
+             "|---|---|---|---|---|---|"]
+    for name, s in results.items():
+        lines.append(f"| {name} | {s['load_s']} | {s['generate_ms']} | {s['speedup']}x | "
+                     f"{s['exact_match']} | {s['token_f1']} |")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Compare generation backends on the evaluation questions: latency and agreement with the "
+                    "answers in the evaluation report.")
+    parser.add_argument('--backends', nargs='+', default=list(GENERATION_BACKENDS), choices=GENERATION_BACKENDS,
+                        help="The first backend is the speedup baseline.")
+    parser.add_argument('--reference', default=str(REFERENCE_CSV),
+                        help="Evaluation CSV whose 'Generated Answer' column the backends are scored against.")
+    parser.add_argument('--questions', default=None,
+                        help="Text file with one question per line (default: the reference CSV's questions).")
+    parser.add_argument('--batch-size', type=int, default=GENERATION_BATCH_SIZE)
+    parser.add_argument('--json', default=str(REPORTS_DIR / "generation_backends.json"))
+    args = parser.parse_args(argv)
+
+    reference = load_reference(args.reference)
+    questions = load_questions(args.questions) if args.questions else list(reference)
+    results = compare_backends(questions, args.backends, args.batch_size, reference)
+    table = format_markdown(results)
+    print(table)
+    with open(args.json, 'w') as f:
+        json.dump({'reference': args.reference, 'baseline': args.backends[0], 'backends': results}, f, indent=2)
+    with open(REPORTS_DIR / "generation_backends.md", 'w') as f:
+        f.write(f"# Generation Backends\n\nDate: {time.strftime('%Y-%m-%d')}. "
+                f"Exact match and token F1 are measured against the answers in `{args.reference}`; "
+                f"speedup is relative to `{args.backends[0]}`.\n\n{table}\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from src.data_io import read_table, write_table
+from src.process_data import filter_complaints
+from src.synthetic_data import generate_complaints
+
+# Column sets the downstream stages actually load
+PROJECTIONS = {
+    'all columns': None,
+    'create_vector_store': [
+        'cleaned_narrative', 'Complaint ID', 'Date received', 'Product',
+        'Sub-product', 'Issue', 'Company', 'State', 'Category',
+    ],
+    'visualize_eda': ['Category', 'word_count'],
+}
+
+def benchmark_formats(df: pd.DataFrame, workdir: str, repeats: int = 3) -> Dict[str, Dict]:
+    """
+    Writes `df` in every intermediate format and times loading it back,
+    in full and with each stage's column projection.
+    """
+    results = {}
+    for suffix in ('.csv', '.parquet', '.feather'):
+        path = os.path.join(workdir, f'filtered_complaints{suffix}')
+        start = time.perf_counter()
+        write_table(df, path)
+        write_seconds = time.perf_counter() - start
+
+        loads = {}
+        for name, columns in PROJECTIONS.items():
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                loaded = read_table(path, columns=columns)
+                timings.append(time.perf_counter() - start)
+            loads[name] = round(min(timings), 4)
+            assert len(loaded) == len(df)
+
+        results[suffix.lstrip('.')] = {
+            'size_mb': round(os.path.getsize(path) / 1024 ** 2, 2),
+            'write_seconds': round(write_seconds, 4),
+            'load_seconds': loads,
+        }
+    return results
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compare CSV, Parquet and Feather load times for filtered complaints.")
+    parser.add_argument('--rows', type=int, default=200_000, help="Synthetic raw rows to generate before filtering.")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--json', help="Optional path to write the results as JSON.")
+    args = parser.parse_args(argv)
+
+    df = filter_complaints(generate_complaints(args.rows))
+    print(f"Filtered rows: {len(df)}")
+    with tempfile.TemporaryDirectory() as tmp:
+        results = benchmark_formats(df, tmp, repeats=args.repeats)
+
+    header = f"{'format':>8} {'MB':>8} " + " ".join(f"{name:>20}" for name in PROJECTIONS)
+    print(header)
+    for fmt, stats in results.items():
+        loads = " ".join(f"{stats['load_seconds'][name]:>19.3f}s" for name in PROJECTIONS)
+        print(f"{fmt:>8} {stats['size_mb']:>8} {loads}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': len(df), 'formats': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from src.process_data import ENGINES, filter_complaints
+from src.synthetic_data import write_raw_csv
+
+def benchmark_engines(raw: pd.DataFrame, repeats: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Times filter_complaints with every engine on the same raw frame.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Best-of-`repeats` seconds and rows/sec per engine.
+    """
+    results = {}
+    outputs = {}
+    for engine in ENGINES:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            outputs[engine] = filter_complaints(raw, engine=engine)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results[engine] = {"seconds": round(best, 4), "rows_per_sec": round(len(raw) / best, 1)}
+
+    reference = outputs['python']
+    for engine, output in outputs.items():
+        if not output.equals(reference):
+            raise AssertionError(f"Engine '{engine}' output differs from the row-wise reference")
+    return results
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing engines on synthetic complaints.")
+    parser.add_argument('--rows', type=int, default=200_000, help="Synthetic raw rows to generate.")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Optional path to write the results as JSON.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Round-trip through CSV so dtypes match what process_data.py sees
+        raw_path = write_raw_csv(os.path.join(tmp, 'complaints.csv'), args.rows, seed=args.seed)
+        raw = pd.read_csv(raw_path, dtype=str)
+
+    results = benchmark_engines(raw, repeats=args.repeats)
+    speedup = results['python']['seconds'] / results['vectorized']['seconds']
+    print(f"Rows: {len(raw)}")
+    for engine, stats in results.items():
+        print(f"{engine:>10}: {stats['seconds']:.3f}s  {stats['rows_per_sec']:,.0f} rows/sec")
+    print(f"Speedup: {speedup:.1f}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"rows": len(raw), "engines": results, "speedup": round(speedup, 2)}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import json
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+from src.indexing import insert_embeddings, iter_batches
+from src.sparse_index import BM25Index, build_sparse_index
+from src.vector_index import (
+    QUANT_CODECS, ExactIndex, IVFIndex, QuantizedIndex, build_ivf, export_from_chroma, quantize_index,
+)
+
+def clustered_vectors(n: int, dim: int, clusters: int = 200, spread: float = 3.0,
+                      seed: int = 0) -> np.ndarray:
+    """Unit-norm vectors drawn around random centres, like sentence embeddings of related texts."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * (spread / np.sqrt(dim))
+    vectors = centres[rng.integers(0, clusters, n)] + noise
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def measure(search: Callable[[np.ndarray], List[str]], queries: np.ndarray,
+            truth: List[List[str]], k: int) -> Dict[str, float]:
+    """Single-query QPS and recall@k against the exact neighbours."""
+    found = []
+    start = time.perf_counter()
+    for query in queries:
+        found.append(search(query))
+    elapsed = time.perf_counter() - start
+    recall = np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth)])
+    return {'qps': round(len(queries) / elapsed, 1), f'recall@{k}': round(float(recall), 4)}
+
+def benchmark_backends(n: int, dim: int, n_queries: int, k: int, nprobes: List[int],
+                       workdir: str) -> Dict[str, Dict[str, float]]:
+    # Queries come from the same distribution as the corpus but are not in it
+    vectors = clustered_vectors(n + n_queries, dim)
+    vectors, queries = vectors[:n], vectors[n:]
+
+    store = Chroma(persist_directory=f"{workdir}/chroma")
+    docs = [Document(page_content=f"chunk {i}", metadata={'row': i}, id=str(i)) for i in range(n)]
+    for batch in iter_batches(range(n), 5000):
+        insert_embeddings(store, [docs[i] for i in batch], vectors[batch].tolist())
+    export_from_chroma(store, f"{workdir}/index")
+    n_lists = build_ivf(f"{workdir}/index")
+    sizes = quantize_index(f"{workdir}/index", QUANT_CODECS)
+
+    exact = ExactIndex(f"{workdir}/index")
+    ids = [str(i) for i in range(n)]
+    truth_idx, _ = exact.search(queries, k)
+    truth = [[ids[i] for i in row] for row in truth_idx]
+
+    def index_search(index):
+        return lambda query: [ids[i] for i in index.search(query, k)[0][0]]
+
+    results = {
+        'chroma': measure(lambda q: [d.id for d in store.similarity_search_by_vector(q.tolist(), k=k)],
+                          queries, truth, k),
+        'exact': measure(index_search(exact), queries, truth, k),
+    }
+    for nprobe in nprobes:
+        results[f'ivf nprobe={nprobe}/{n_lists}'] = measure(
+            index_search(IVFIndex(f"{workdir}/index", nprobe=nprobe)), queries, truth, k)
+
+    for codec in QUANT_CODECS:
+        stats = measure(index_search(QuantizedIndex(f"{workdir}/index", codec=codec)), queries, truth, k)
+        results[f'quantized {codec}'] = {**stats, 'scan_mb': round(sizes[codec] / 1024 ** 2, 1)}
+
+    start = time.perf_counter()
+    exact.search(queries, k)
+    results['exact batched'] = {'qps': round(n_queries / (time.perf_counter() - start), 1), f'recall@{k}': 1.0}
+    for name in ('exact', 'exact batched'):
+        results[name]['scan_mb'] = round(exact.vectors.nbytes / 1024 ** 2, 1)
+    return results
+
+def synthetic_texts(n: int, vocab_size: int = 30_000, words: int = 80, seed: int = 0) -> List[str]:
+    """Complaint-length texts with Zipf-distributed word frequencies, as in natural language."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(vocab_size)])
+    ranks = np.minimum(rng.zipf(1.1, size=(n, words)), vocab_size) - 1
+    return [' '.join(row) for row in vocab[ranks]]
+
+def benchmark_sparse(n: int, n_queries: int, k: int, workdir: str) -> Dict[str, float]:
+    """Build time and single-query latency of the BM25 index over `n` synthetic chunks."""
+    texts = synthetic_texts(n + n_queries)
+    store = Chroma(persist_directory=f"{workdir}/bm25_chroma")
+    docs = [Document(page_content=text, metadata={'content_hash': str(i)}, id=str(i))
+            for i, text in enumerate(texts[:n])]
+    for batch in iter_batches(range(n), 5000):
+        insert_embeddings(store, [docs[i] for i in batch], [[0.0, 0.0]] * len(batch))
+    start = time.perf_counter()
+    build_sparse_index(store, f"{workdir}/bm25", incremental=False)
+    build_seconds = time.perf_counter() - start
+
+    index = BM25Index(f"{workdir}/bm25")
+    # Questions are short: a few words each
+    queries = [' '.join(text.split()[:6]) for text in texts[n:]]
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k)
+        latencies.append(time.perf_counter() - start)
+    return {
+        'build_s': round(build_seconds, 1),
+        'qps': round(len(queries) / sum(latencies), 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 2),
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Compare Chroma, exact, IVF and quantized retrieval: QPS, recall@k and scanned MB.")
+    parser.add_argument('--vectors', type=int, default=50_000)
+    parser.add_argument('--dim', type=int, default=384, help="all-MiniLM-L6-v2 produces 384-dim vectors.")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--bm25-docs', type=int, default=0,
+                        help="Also time the BM25 index over this many synthetic chunks.")
+    parser.add_argument('--json', help="Optional path to write the results as JSON.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = benchmark_backends(args.vectors, args.dim, args.queries, args.k, args.nprobe, tmp)
+        sparse = benchmark_sparse(args.bm25_docs, args.queries, args.k, tmp) if args.bm25_docs else None
+
+    print(f"{'backend':>24} {'QPS':>10} {'recall@' + str(args.k):>10} {'scan MB':>10}")
+    for name, stats in results.items():
+        print(f"{name:>24} {stats['qps']:>10} {stats[f'recall@{args.k}']:>10} {stats.get('scan_mb', ''):>10}")
+    if sparse:
+        print(f"BM25 over {args.bm25_docs} chunks: built in {sparse['build_s']}s, {sparse['qps']} QPS, "
+              f"p50 {sparse['p50_ms']} ms, p95 {sparse['p95_ms']} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'vectors': args.vectors, 'dim': args.dim, 'backends': results, 'bm25': sparse}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
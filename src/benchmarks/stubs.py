@@ -0,0 +1,133 @@
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD = re.compile(r"\S+")
+
+def _word_id(word: str, vocab_size: int) -> int:
+    # crc32 rather than hash(), which is salted per process
+    return 2 + zlib.crc32(word.lower().encode('utf-8')) % (vocab_size - 2)
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words vectors (hashed word counts, L2-normalized).
+    Texts sharing words are close, so retrieval behaves plausibly, and no
+    model has to be downloaded or run.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text):
+            vector[_word_id(word, self.dim + 2) - 2] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class StubTokenizer:
+    """
+    Whitespace tokenizer with the parts of the HF tokenizer API the pipeline
+    uses: batched calls with padding, truncation, offset mappings, NumPy
+    tensors and (batch_)decode. One word is one token; 0 pads, 1 ends.
+    """
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def __init__(self, vocab_size: int = 32_000, model_max_length: int = 512):
+        self.vocab_size = vocab_size
+        self.model_max_length = model_max_length
+        self._words: Dict[int, str] = {}
+
+    def _encode(self, text: str, add_special_tokens: bool, max_length: Optional[int]):
+        spans = [m.span() for m in _WORD.finditer(text)]
+        ids = []
+        for start, end in spans:
+            token = _word_id(text[start:end], self.vocab_size)
+            self._words.setdefault(token, text[start:end])
+            ids.append(token)
+        if max_length is not None:
+            limit = max_length - 1 if add_special_tokens else max_length
+            ids, spans = ids[:limit], spans[:limit]
+        if add_special_tokens:
+            ids.append(self.eos_token_id)
+        return ids, spans
+
+    def __call__(self, text: Union[str, List[str]], add_special_tokens: bool = True,
+                 return_offsets_mapping: bool = False, return_tensors: Optional[str] = None,
+                 padding: bool = False, truncation: bool = False, max_length: Optional[int] = None,
+                 **kwargs) -> Dict[str, Any]:
+        texts = [text] if isinstance(text, str) else list(text)
+        limit = (max_length or self.model_max_length) if truncation else None
+        encoded = [self._encode(t, add_special_tokens, limit) for t in texts]
+        ids = [token_ids for token_ids, _ in encoded]
+        if return_tensors is None:
+            output = {'input_ids': ids, 'attention_mask': [[1] * len(row) for row in ids]}
+            if return_offsets_mapping:
+                output['offset_mapping'] = [spans for _, spans in encoded]
+            return {name: values[0] for name, values in output.items()} if isinstance(text, str) else output
+        width = max(len(row) for row in ids)
+        input_ids = np.full((len(ids), width), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros_like(input_ids)
+        for i, row in enumerate(ids):
+            input_ids[i, :len(row)] = row
+            attention_mask[i, :len(row)] = 1
+        return {'input_ids': input_ids, 'attention_mask': attention_mask}
+
+    def decode(self, ids: Any, skip_special_tokens: bool = True) -> str:
+        words = []
+        for token in np.asarray(ids).tolist():
+            if token in (self.pad_token_id, self.eos_token_id):
+                if not skip_special_tokens:
+                    words.append('<pad>' if token == self.pad_token_id else '</s>')
+                continue
+            words.append(self._words.get(token, f"w{token}"))
+        return ' '.join(words)
+
+    def batch_decode(self, ids: Any, skip_special_tokens: bool = True) -> List[str]:
+        return [self.decode(row, skip_special_tokens) for row in ids]
+
+class StubSeq2SeqLM:
+    """
+    NumPy stand-in for flan-t5's generate(). Its cost follows an
+    encoder-decoder: `layers` dense passes over every input token, then
+    one step per output token that attends over the whole encoder output.
+    The answer echoes the first input words. Timings measure how the
+    pipeline scales with prompt length and batch size, not model speed.
+    """
+    tensor_type = "np" # ComplaintRAG tokenizes prompts to NumPy arrays for it
+
+    def __init__(self, hidden: int = 256, layers: int = 4, new_tokens: int = 32, vocab_size: int = 32_000,
+                 seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.embeddings = rng.standard_normal((vocab_size, hidden)).astype(np.float32) / np.sqrt(hidden)
+        self.weights = [rng.standard_normal((hidden, hidden)).astype(np.float32) / np.sqrt(hidden)
+                        for _ in range(layers)]
+        self.new_tokens = new_tokens
+
+    def generate(self, input_ids: np.ndarray, attention_mask: Optional[np.ndarray] = None,
+                 max_length: int = 512, max_new_tokens: Optional[int] = None, **kwargs) -> np.ndarray:
+        input_ids = np.asarray(input_ids)
+        if attention_mask is None:
+            attention_mask = np.ones_like(input_ids)
+        hidden = self.embeddings[input_ids % len(self.embeddings)]
+        for weight in self.weights:
+            hidden = np.tanh(hidden @ weight)
+        steps = min(self.new_tokens, max_new_tokens or max_length - 1, input_ids.shape[1])
+        state = hidden[:, :1, :]
+        for _ in range(steps):
+            scores = (state @ hidden.transpose(0, 2, 1)) + np.where(attention_mask[:, None, :] > 0, 0.0, -1e9)
+            weights = np.exp(scores - scores.max(axis=-1, keepdims=True))
+            state = np.tanh((weights / weights.sum(axis=-1, keepdims=True)) @ hidden @ self.weights[0])
+        output = np.zeros((len(input_ids), steps + 1), dtype=np.int64)
+        output[:, 1:] = np.where(attention_mask[:, :steps] > 0, input_ids[:, :steps], 0)
+        return output
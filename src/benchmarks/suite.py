@@ -0,0 +1,473 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_community.document_loaders import DataFrameLoader
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import src.config as cfg
+from src.benchmarks.stubs import HashingEmbeddings, StubSeq2SeqLM, StubTokenizer
+from src.create_vector_store import CHUNK_OVERLAP, CHUNK_SIZE, CONTENT_COLUMN, METADATA_COLUMNS, iter_chunks
+from src.dedup import deduplicate
+from src.embedding_engine import EMBEDDING_BACKENDS, load_embeddings
+from src.generation import GENERATION_BACKENDS
+from src.indexing import index_documents, insert_embeddings, iter_batches
+from src.instrumentation import StageTimer
+from src.process_data import filter_complaints
+from src.rag_pipeline import ComplaintRAG
+from src.sparse_index import build_sparse_index
+from src.synthetic_data import COMPANIES, ISSUES, generate_complaints
+from src.vector_index import IndexVectorStore, build_ivf, export_from_chroma, load_index
+
+WORKLOADS = ('indexing', 'retrieval', 'generation', 'e2e')
+RETRIEVAL_BACKENDS = ('chroma', 'exact', 'ivf')
+CATEGORIES = ('credit card', 'personal loan', 'savings account', 'money transfer')
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    """p50/p95/mean of per-request latencies, in milliseconds."""
+    ms = np.asarray(seconds) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+    }
+
+def complaint_frame(n_rows: int, seed: int = 0):
+    """Synthetic raw complaints run through the preprocessing, as create_vector_store reads them."""
+    df = filter_complaints(generate_complaints(n_rows, seed=seed))
+    return df[[CONTENT_COLUMN] + METADATA_COLUMNS].reset_index(drop=True)
+
+def chunk_frame(df) -> List[Document]:
+    """Chunks complaints with the splitter settings of create_vector_store."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                                              separators=["\n\n", "\n", " ", ""])
+    loader = DataFrameLoader(df.fillna({CONTENT_COLUMN: ''}), page_content_column=CONTENT_COLUMN)
+    return list(iter_chunks(loader.lazy_load(), splitter))
+
+def synthetic_chunks(n_chunks: int, seed: int = 0) -> List[Document]:
+    """At least `n_chunks` chunks of synthetic complaints (the first `n_chunks` are returned)."""
+    # Roughly 0.6 chunks per raw row survive the product and narrative filters
+    rows = 2 * n_chunks + 100
+    while True:
+        chunks = chunk_frame(complaint_frame(rows, seed))
+        if len(chunks) >= n_chunks:
+            return chunks[:n_chunks]
+        rows *= 2
+
+def synthetic_questions(n: int, seed: int = 0) -> List[str]:
+    """Distinct PM-style questions, so no request is answered from the query cache."""
+    rng = np.random.default_rng(seed)
+    questions = []
+    for i in range(n):
+        issue, category = rng.choice(ISSUES).lower(), rng.choice(CATEGORIES)
+        company = rng.choice(COMPANIES).title()
+        questions.append(f"What do customers say about {issue} on {category}s at {company}? (#{i})")
+    return questions
+
+def prompt_with_tokens(tokenizer: Any, text: str, n_tokens: int) -> str:
+    """The prefix of `text` that encodes to about `n_tokens` tokens (including end-of-sequence)."""
+    ids = tokenizer(text, add_special_tokens=False)['input_ids'][:n_tokens - 1]
+    return tokenizer.decode(ids, skip_special_tokens=True)
+
+def load_embedder(name: str) -> Embeddings:
+    """The stub embedder, or one of the real engines of src.embedding_engine (uncached)."""
+    if name == 'stub':
+        return HashingEmbeddings()
+    return load_embeddings(cfg.EMBEDDING_MODEL_NAME, name)
+
+def build_pipeline(args: argparse.Namespace, workdir: str) -> ComplaintRAG:
+    """
+    A ComplaintRAG over the index built by the indexing workload, with the
+    query cache off. Stub models are set directly on the instance, so the
+    pipeline never tries to load the real ones; the stub LLM declares that
+    it takes NumPy inputs (see ComplaintRAG._tensor_type).
+    """
+    rag = ComplaintRAG(
+        vector_store_path=os.path.join(workdir, 'chroma'),
+        index_path=os.path.join(workdir, 'index'),
+        sparse_index_path=os.path.join(workdir, 'sparse'),
+        backend=args.e2e_backend,
+        cache_size=0,
+        auto_filter=False,
+        reranker='none',
+        llm_snapshot=False,
+        generation_backend=args.generator if args.generator != 'stub' else cfg.GENERATION_BACKEND,
+        embedding_backend=args.embedder if args.embedder != 'stub' else 'torch',
+    )
+    if args.embedder == 'stub':
+        rag._embedding_fn = HashingEmbeddings()
+    if args.generator == 'stub':
+        rag._tokenizer, rag._model = StubTokenizer(), StubSeq2SeqLM()
+    return rag
+
+def benchmark_indexing(n_complaints: int, embeddings: Embeddings, workdir: str,
+                       workers: int = 1, seed: int = 0) -> Dict[str, Any]:
+    """
+    Times the create_vector_store stages on synthetic complaints:
+    preprocessing, deduplication, chunking, embedding + insertion into
+    Chroma, export to the in-process index and the BM25 build. The stores
+    are left in `workdir` for the end-to-end workload.
+    """
+    timings = {}
+    start = time.perf_counter()
+    df = complaint_frame(n_complaints, seed)
+    timings['preprocess_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df, dedup = deduplicate(df, CONTENT_COLUMN)
+    timings['dedup_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = chunk_frame(df)
+    timings['chunk_s'] = time.perf_counter() - start
+
+    store = Chroma(persist_directory=os.path.join(workdir, 'chroma'), embedding_function=embeddings)
+    stats = index_documents(chunks, embeddings, store, workers=workers)
+
+    start = time.perf_counter()
+    export_from_chroma(store, os.path.join(workdir, 'index'))
+    build_ivf(os.path.join(workdir, 'index'))
+    timings['export_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_sparse_index(store, os.path.join(workdir, 'sparse'), incremental=False)
+    timings['sparse_index_s'] = time.perf_counter() - start
+
+    return {
+        'complaints': len(df),
+        'duplicates_removed': dedup.removed,
+        'chunks': stats.chunks,
+        'chunks_per_sec': round(stats.chunks_per_sec, 1),
+        'embed_s': round(stats.embed_seconds, 3),
+        'insert_s': round(stats.insert_seconds, 3),
+        'index_s': round(stats.wall_seconds, 3),
+        **{name: round(seconds, 3) for name, seconds in timings.items()},
+    }
+
+def benchmark_retrieval(sizes: List[int], ks: List[int], n_queries: int, embeddings: Embeddings,
+                        workdir: str, backends: Tuple[str, ...] = RETRIEVAL_BACKENDS,
+                        seed: int = 0) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+    """
+    Single-query latency of store.similarity_search_by_vector (the call the
+    pipeline makes, including building the Documents) for every corpus
+    size, backend and k. Questions are embedded once, outside the timings.
+    """
+    chunks = synthetic_chunks(max(sizes), seed)
+    vectors = embeddings.embed_documents([c.page_content for c in chunks])
+    queries = embeddings.embed_documents(synthetic_questions(n_queries, seed + 1))
+
+    results = {}
+    for size in sorted(sizes):
+        path = os.path.join(workdir, f"retrieval_{size}")
+        chroma = Chroma(persist_directory=os.path.join(path, 'chroma'), embedding_function=embeddings)
+        for batch in iter_batches(range(size), 5000):
+            insert_embeddings(chroma, [chunks[i] for i in batch], [vectors[i] for i in batch])
+        export_from_chroma(chroma, os.path.join(path, 'index'))
+        if 'ivf' in backends:
+            build_ivf(os.path.join(path, 'index'))
+        stores = {name: chroma if name == 'chroma' else
+                  IndexVectorStore(load_index(os.path.join(path, 'index'), name), embeddings)
+                  for name in backends}
+
+        results[str(size)] = {}
+        for name, store in stores.items():
+            store.similarity_search_by_vector(queries[0], k=max(ks)) # warm-up
+            results[str(size)][name] = {}
+            for k in ks:
+                latencies = []
+                for query in queries:
+                    start = time.perf_counter()
+                    store.similarity_search_by_vector(query, k=k)
+                    latencies.append(time.perf_counter() - start)
+                results[str(size)][name][f"k={k}"] = {
+                    **latency_stats(latencies), 'qps': round(len(latencies) / sum(latencies), 1)}
+    return results
+
+def benchmark_generation(rag: ComplaintRAG, prompt_tokens: List[int], repeats: int,
+                         seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Latency of rag._generate (tokenize, generate, decode) for prompts cut
+    to each length from synthetic complaint text.
+    """
+    tokenizer, _ = rag._load_generator()
+    text = ' '.join(complaint_frame(200, seed)[CONTENT_COLUMN])
+    results = {}
+    for n in prompt_tokens:
+        prompt = prompt_with_tokens(tokenizer, text, n)
+        rag._generate(prompt, StageTimer([])) # warm-up
+        latencies, stages = [], []
+        for _ in range(repeats):
+            timer = StageTimer([])
+            start = time.perf_counter()
+            _, tokens = rag._generate(prompt, timer)
+            latencies.append(time.perf_counter() - start)
+            stages.append(timer.timings)
+        results[str(n)] = {
+            'input_tokens': tokens['input_tokens'],
+            'output_tokens': tokens['output_tokens'],
+            **latency_stats(latencies),
+            **{f"{stage}_ms": round(float(np.mean([s[stage] for s in stages])) * 1000, 3)
+               for stage in ('tokenize', 'generate', 'decode')},
+        }
+    return results
+
+async def _drive(rag: ComplaintRAG, questions: List[str], concurrency: int) -> Tuple[List[float], List[dict]]:
+    """`concurrency` clients issuing rag.aquery back to back until `questions` run out."""
+    pending = iter(questions)
+    latencies, timings = [], []
+
+    async def client():
+        for question in pending:
+            start = time.perf_counter()
+            result = await rag.aquery(question)
+            latencies.append(time.perf_counter() - start)
+            timings.append(result.timings)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, timings
+
+def benchmark_concurrency(rag: ComplaintRAG, questions: List[str],
+                          levels: List[int]) -> Dict[str, Dict[str, float]]:
+    """
+    End-to-end QPS through aquery, so concurrent requests share the
+    retrieval pool and are micro-batched into generate() calls as in
+    src.server.
+    """
+    rag.retrieve_only(questions[0])
+    asyncio.run(_drive(rag, questions[:2], 1)) # warm-up
+    results = {}
+    for concurrency in levels:
+        rag.reset_generation_queue() # fresh batch-size counters per level
+        start = time.perf_counter()
+        latencies, timings = asyncio.run(_drive(rag, questions, concurrency))
+        wall = time.perf_counter() - start
+        queue = rag.queue_stats()
+        results[str(concurrency)] = {
+            'requests': len(latencies),
+            'qps': round(len(latencies) / wall, 2),
+            **latency_stats(latencies),
+            **{f"{stage}_ms": round(float(np.mean([t.get(stage, 0.0) for t in timings])) * 1000, 3)
+               for stage in ('retrieval', 'queue_wait', 'generation')},
+            'mean_batch_size': round(queue.get('mean_batch_size', 0.0), 2),
+        }
+    return results
+
+def benchmark_remote(api_url: str, questions: List[str], levels: List[int]) -> Dict[str, Dict[str, float]]:
+    """End-to-end QPS against a running src.server, with one thread per concurrent client."""
+    from src.api_client import RAGClient
+    client = RAGClient(api_url)
+    client.query(questions[0]) # warm-up
+    results = {}
+    for concurrency in levels:
+        def timed(question: str) -> float:
+            start = time.perf_counter()
+            client.query(question)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, questions))
+        wall = time.perf_counter() - start
+        results[str(concurrency)] = {'requests': len(latencies), 'qps': round(len(latencies) / wall, 2),
+                                     **latency_stats(latencies)}
+    return results
+
+def git_revision() -> Dict[str, Any]:
+    """Commit the results belong to, and whether the tree had uncommitted changes."""
+    def git(*args: str) -> str:
+        return subprocess.run(['git', *args], cwd=cfg.BASE_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    try:
+        return {'commit': git('rev-parse', '--short', 'HEAD'),
+                'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': 'unknown', 'dirty': False}
+
+def flatten(results: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    """Numeric leaves of nested results, keyed by their dotted path."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+def higher_is_better(metric: str) -> Optional[bool]:
+    """Direction of a metric from its name; None for counts and sizes."""
+    name = metric.rsplit('.', 1)[-1]
+    if name == 'qps' or name.endswith('_per_sec'):
+        return True
+    if name.endswith('_ms') or name.endswith('_s'):
+        return False
+    return None
+
+def compare_results(old: Dict[str, Any], new: Dict[str, Any],
+                    threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Relative change of every metric present in both runs' workloads.
+
+    Returns:
+        List[Dict[str, Any]]: One row per metric with "old", "new", "change"
+            (fraction) and "regression", True when it moved the wrong way
+            by more than `threshold`.
+    """
+    before, after = flatten(old['workloads']), flatten(new['workloads'])
+    rows = []
+    for metric in sorted(before.keys() & after.keys()):
+        change = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+        better = higher_is_better(metric)
+        regression = better is not None and (change < -threshold if better else change > threshold)
+        rows.append({'metric': metric, 'old': before[metric], 'new': after[metric],
+                     'change': round(change, 4), 'regression': regression})
+    return rows
+
+def format_comparison(rows: List[Dict[str, Any]], old_commit: str, new_commit: str) -> str:
+    lines = [f"{'metric':<52} {old_commit:>12} {new_commit:>12} {'change':>9}"]
+    for row in rows:
+        if higher_is_better(row['metric']) is None:
+            continue
+        flag = '  REGRESSION' if row['regression'] else ''
+        lines.append(f"{row['metric']:<52} {row['old']:>12g} {row['new']:>12g} {row['change']:>+9.1%}{flag}")
+    return "\n".join(lines)
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Runs the selected workloads and returns the report written by main()."""
+    workloads = {}
+    embeddings = load_embedder(args.embedder)
+    with tempfile.TemporaryDirectory() as workdir:
+        # The end-to-end pipeline searches the stores built by the indexing run
+        if 'indexing' in args.workloads or 'e2e' in args.workloads:
+            print(f"Indexing {args.complaints} synthetic complaints...")
+            workloads['indexing'] = benchmark_indexing(args.complaints, embeddings, workdir,
+                                                       args.workers, args.seed)
+        if 'retrieval' in args.workloads:
+            print(f"Retrieval over {args.corpus_sizes} chunks at k={args.k}...")
+            workloads['retrieval'] = benchmark_retrieval(args.corpus_sizes, args.k, args.queries, embeddings,
+                                                         workdir, tuple(args.retrieval_backends), args.seed)
+        if 'generation' in args.workloads or 'e2e' in args.workloads:
+            rag = build_pipeline(args, workdir)
+            if args.embedder != 'stub':
+                rag._embedding_fn = embeddings
+        if 'generation' in args.workloads:
+            print(f"Generation at {args.prompt_tokens} prompt tokens ({args.generator})...")
+            workloads['generation'] = benchmark_generation(rag, args.prompt_tokens, args.repeats, args.seed)
+        if 'e2e' in args.workloads:
+            questions = synthetic_questions(args.requests, args.seed + 2)
+            print(f"End-to-end QPS at concurrency {args.concurrency}...")
+            workloads['e2e'] = benchmark_concurrency(rag, questions, args.concurrency)
+            if args.api_url:
+                print(f"End-to-end QPS against {args.api_url}...")
+                workloads['remote'] = benchmark_remote(args.api_url, questions, args.concurrency)
+
+    return {
+        **git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'args': {name: value for name, value in vars(args).items() if name not in ('output', 'compare')},
+        'workloads': workloads,
+    }
+
+def _print_indexing(stats: Dict[str, Any]):
+    print(f"\nIndexing: {stats['chunks']} chunks from {stats['complaints']} complaints, "
+          f"{stats['chunks_per_sec']} chunks/sec (embed {stats['embed_s']}s, insert {stats['insert_s']}s, "
+          f"export {stats['export_s']}s, BM25 {stats['sparse_index_s']}s)")
+
+def _print_retrieval(sizes: Dict[str, Any]):
+    print(f"\n{'chunks':>8} {'backend':>8} {'k':>4} {'p50 ms':>9} {'p95 ms':>9} {'QPS':>9}")
+    for size, backends in sizes.items():
+        for name, by_k in backends.items():
+            for k, stats in by_k.items():
+                print(f"{size:>8} {name:>8} {k[2:]:>4} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['qps']:>9}")
+
+def _print_generation(lengths: Dict[str, Any]):
+    print(f"\n{'tokens':>7} {'p50 ms':>9} {'p95 ms':>9} {'generate ms':>12}")
+    for stats in lengths.values():
+        print(f"{stats['input_tokens']:>7} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['generate_ms']:>12}")
+
+def _print_concurrency(name: str, levels: Dict[str, Any]):
+    print(f"\n{name}: {'clients':>7} {'QPS':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for concurrency, stats in levels.items():
+        print(f"{'':>{len(name) + 1}} {concurrency:>7} {stats['qps']:>8} {stats['p50_ms']:>9} {stats['p95_ms']:>9}")
+
+def print_report(report: Dict[str, Any]):
+    printers = {
+        'indexing': _print_indexing,
+        'retrieval': _print_retrieval,
+        'generation': _print_generation,
+        'e2e': lambda levels: _print_concurrency('e2e', levels),
+        'remote': lambda levels: _print_concurrency('remote', levels),
+    }
+    for name, printer in printers.items():
+        if name in report['workloads']:
+            printer(report['workloads'][name])
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark suite: indexing throughput, retrieval latency by k and corpus size, "
+                    "generation latency by prompt length and end-to-end QPS by concurrency.")
+    parser.add_argument('--workloads', nargs='+', default=list(WORKLOADS), choices=WORKLOADS)
+    parser.add_argument('--embedder', default='stub', choices=('stub',) + tuple(EMBEDDING_BACKENDS),
+                        help="'stub' hashes words (no model); the others load EMBEDDING_MODEL_NAME.")
+    parser.add_argument('--generator', default='stub', choices=('stub',) + tuple(GENERATION_BACKENDS),
+                        help="'stub' is a NumPy stand-in whose cost grows with prompt length; "
+                             "the others load LLM_MODEL_NAME.")
+    parser.add_argument('--complaints', type=int, default=5000, help="Raw synthetic complaints to index.")
+    parser.add_argument('--workers', type=int, default=1, help="Embedding threads while indexing.")
+    parser.add_argument('--corpus-sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--retrieval-backends', nargs='+', default=list(RETRIEVAL_BACKENDS),
+                        choices=RETRIEVAL_BACKENDS)
+    parser.add_argument('--queries', type=int, default=100, help="Queries per retrieval measurement.")
+    parser.add_argument('--prompt-tokens', type=int, nargs='+', default=[64, 128, 256, 512])
+    parser.add_argument('--repeats', type=int, default=5, help="generate() calls per prompt length.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=64, help="Questions per concurrency level.")
+    parser.add_argument('--e2e-backend', default='exact', choices=RETRIEVAL_BACKENDS)
+    parser.add_argument('--api-url', default=None,
+                        help="Also load-test a running src.server at this URL (e.g. http://127.0.0.1:8000).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help="JSON report path (default: reports/benchmarks/<commit>.json).")
+    parser.add_argument('--compare', default=None,
+                        help="Earlier JSON report to compare against; regressions over --threshold are flagged.")
+    parser.add_argument('--threshold', type=float, default=0.1)
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    report = run(args)
+    print_report(report)
+
+    output = args.output or str(cfg.REPORTS_DIR / "benchmarks" / f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        rows = compare_results(previous, report, args.threshold)
+        print(f"\nChange since {previous['commit']}:")
+        print(format_comparison(rows, previous['commit'], report['commit']))
+        regressions = [row['metric'] for row in rows if row['regression']]
+        print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+    return report
+
+if __name__ == "__main__":
+    main()
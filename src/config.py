@@ -6,16 +6,99 @@ from pathlib import Path
 BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / "data"
 VECTOR_STORE_PATH = BASE_DIR / "vector_store"
+VECTOR_INDEX_PATH = BASE_DIR / "vector_index" # flat export of the store for the exact/ivf backends
+SPARSE_INDEX_PATH = BASE_DIR / "sparse_index" # BM25 inverted index built alongside the store
 REPORTS_DIR = BASE_DIR / "reports"
 
 # Model Configurations
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 LLM_MODEL_NAME = "google/flan-t5-base"
 
+# Embedding cache (shared by indexing and querying)
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = DATA_DIR / "embedding_cache.sqlite"
+EMBEDDING_CACHE_MAX_ENTRIES = 500_000 # ~0.8 GB of 384-dim float32 vectors
+
+# Embedding engine: "torch" (sentence-transformers, fp32), "onnx" or "onnx-int8" (ONNX Runtime over the
+# export written by `python -m src.embedding_engine --export [--int8]`); compare with src.benchmarks.embedding
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = 32 # texts per forward pass; the ONNX engine groups texts of similar length
+EMBEDDING_MAX_SEQ_LENGTH = 256 # all-MiniLM-L6-v2 limit; longer chunks are truncated
+
 # RAG Parameters
 RETRIEVER_K = 5
+# "chroma" (persistent Chroma client), "exact" (NumPy brute force over a memory-mapped
+# matrix), "ivf" (approximate inverted lists) or "quantized" (compressed scan + exact
+# re-rank); all but chroma read VECTOR_INDEX_PATH
+RETRIEVER_BACKEND = os.getenv("RAG_RETRIEVER_BACKEND", "chroma")
+IVF_N_LISTS = 0 # 0 picks ~sqrt(number of vectors)
+IVF_NPROBE = 8 # lists scanned per query; higher = better recall, slower
+QUANTIZATION = "int8" # "float16", "int8" or "pq" codes scanned by the quantized backend
+PQ_SUBVECTORS = 48 # bytes per vector for "pq"; must divide the embedding dimension (384)
+RERANK_CANDIDATES = 50 # quantized candidates re-scored with the float32 vectors
+AUTO_FILTERS = False # derive category/state/date filters from the question ("... in Texas in 2023")
+# Hybrid retrieval: BM25 results fused with dense ones by reciprocal rank (used when SPARSE_INDEX_PATH exists)
+HYBRID_SEARCH = True
+HYBRID_CANDIDATES = 20 # results taken from each retriever before fusion
+DENSE_WEIGHT = 1.0
+SPARSE_WEIGHT = 1.0
+RRF_K = 60 # reciprocal-rank fusion offset: score = sum(weight / (RRF_K + rank))
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reranking: retrieve RERANK_POOL candidates, then keep the best RETRIEVER_K.
+# "none", "mmr" (diversify with the stored embeddings) or "cross-encoder" (score question/chunk pairs)
+RERANKER = os.getenv("RAG_RERANKER", "none")
+RERANK_POOL = 50
+MMR_LAMBDA = 0.7 # 1.0 = pure relevance, lower values favour diverse chunks
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+CROSS_ENCODER_BATCH_SIZE = 64 # pairs per forward pass
 GENERATION_MAX_LENGTH = 512
 GENERATION_TEMP = 0.3
+# "torch" (fp32), "int8" (PyTorch dynamic quantization) or "onnx" (ONNX Runtime, exported to
+# ONNX_MODEL_DIR by `python -m src.generation --export`); compare them with src.benchmarks.generation
+GENERATION_BACKEND = os.getenv("RAG_GENERATION_BACKEND", "torch")
+ONNX_MODEL_DIR = BASE_DIR / "onnx_models"
+INTRA_OP_THREADS = int(os.getenv("RAG_INTRA_OP_THREADS", "0")) # threads within one operator; 0 = runtime default
+INTER_OP_THREADS = int(os.getenv("RAG_INTER_OP_THREADS", "0")) # operators run concurrently; 0 = runtime default
+# Prompt assembly: retrieved chunks are packed, in rank order, into CONTEXT_MAX_TOKENS prompt tokens
+CONTEXT_MAX_TOKENS = 512 # flan-t5 encoder limit; 0 joins every chunk and lets the tokenizer truncate
+CONTEXT_MIN_DOC_TOKENS = 32 # a chunk that does not fit is trimmed only if this much of it still fits
+CONTEXT_OVERLAP_CHARS = 50 # CHUNK_OVERLAP in create_vector_store: text repeated by neighbouring chunks
+CONTEXT_TOKEN_CACHE_SIZE = 20_000 # chunk tokenizations kept in memory
+GENERATION_BATCH_SIZE = 8 # prompts padded into one generate() call by query_batch
+GENERATION_BATCH_WINDOW_MS = 20 # how long aquery waits to group concurrent requests
+GENERATION_QUEUE_SIZE = 64 # aquery requests waiting for generation before callers block
+STREAM_MAX_CONCURRENT = 2 # streamed generate() calls running at once; further streams wait for a slot
+RETRIEVAL_WORKERS = 4 # threads running embed + vector search for aquery
+APP_STREAMING = True # stream tokens to the UI; False batches whole answers through aquery
+
+# Startup (app.py): embedder, index and LLM load in parallel threads, then each runs one warm-up call
+STARTUP_WARMUP = True
+STARTUP_WARMUP_QUESTION = "What are common complaints about credit card fees?"
+# torch-saved LLM written by `python -m src.startup --snapshot`; loads faster than from_pretrained
+LLM_SNAPSHOT_DIR = BASE_DIR / "model_snapshots"
+USE_LLM_SNAPSHOT = os.getenv("RAG_LLM_SNAPSHOT", "1") == "1" # used only when a snapshot exists
+
+# HTTP/JSON serving (`python -m src.server`): worker processes forked after the LLM and the
+# in-process index are loaded, so they share those pages instead of holding one copy each
+SERVER_HOST = os.getenv("RAG_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("RAG_SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("RAG_SERVER_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))
+SERVER_MAX_BATCH = 64 # questions accepted by one /batch request
+SERVER_HANDLER_THREADS = 32 # connections each worker serves at once; further ones wait for a thread
+# The server defaults to a memory-mapped index the workers share; with "chroma" each worker opens its own client
+SERVER_RETRIEVER_BACKEND = os.getenv("RAG_SERVER_RETRIEVER_BACKEND", "exact")
+# When set (e.g. http://127.0.0.1:8000), app.py is a thin client of that server instead of loading models
+RAG_API_URL = os.getenv("RAG_API_URL", "")
+
+# Query result cache (per ComplaintRAG instance)
+QUERY_CACHE_MAX_ENTRIES = 256 # 0 disables the cache
+QUERY_CACHE_TTL_SECONDS = 3600
+QUERY_CACHE_FINGERPRINT_TTL_SECONDS = 5.0 # how often the store is re-checked for changes
+
+# Profiling (set RAG_PROFILE=1 to dump a cProfile file per query)
+PROFILE_QUERIES = os.getenv("RAG_PROFILE") == "1"
+PROFILE_DIR = REPORTS_DIR / "profiles"
 
 # Evaluation
 EVAL_QUESTIONS_PATH = DATA_DIR / "eval_questions.txt" # Future proofing
@@ -0,0 +1,219 @@
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+import src.config as cfg
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n"
+# Shorter shared prefixes/suffixes are taken as coincidence rather than chunk overlap
+MIN_OVERLAP_CHARS = 12
+
+@dataclass
+class PromptContext:
+    """
+    A prompt whose context fits the token budget.
+
+    Attributes:
+        prompt (str): The formatted prompt.
+        documents (List[Document]): Retrieved documents that made it into the context, in rank order.
+        prompt_tokens (int): Tokens of the whole prompt, special tokens included.
+        context_tokens (int): Of those, the tokens spent on document text.
+        trimmed (int): Documents cut short to fit the budget.
+        dropped (int): Documents left out, as duplicates or for lack of room.
+        overlap_chars (int): Characters removed because a neighbouring chunk already contained them.
+    """
+    prompt: str
+    documents: List[Document] = field(default_factory=list)
+    prompt_tokens: int = 0
+    context_tokens: int = 0
+    trimmed: int = 0
+    dropped: int = 0
+    overlap_chars: int = 0
+
+    def token_counts(self) -> Dict[str, int]:
+        """Counts reported in RAGResult.tokens and the "prompt_build" stage info."""
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "context_tokens": self.context_tokens,
+            "context_docs": len(self.documents),
+            "docs_trimmed": self.trimmed,
+            "docs_dropped": self.dropped,
+        }
+
+def overlap_length(left: str, right: str, limit: int) -> int:
+    """Length of the longest suffix of `left` that starts `right`, between MIN_OVERLAP_CHARS and `limit`."""
+    for size in range(min(limit, len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def _source_key(doc: Document) -> Optional[str]:
+    """Complaint a chunk was cut from ('<Complaint ID>-<chunk index>' IDs), if known."""
+    complaint = doc.metadata.get('Complaint ID') if doc.metadata else None
+    if complaint is not None:
+        return str(complaint)
+    return doc.id.rsplit('-', 1)[0] if doc.id else None
+
+class ContextBuilder:
+    """
+    Packs retrieved chunks into a prompt of at most `max_tokens` tokens,
+    counted with the LLM's own tokenizer.
+
+    Chunks are taken in rank order. Text a chunk shares with a higher-ranked
+    chunk of the same complaint (the splitter's overlap) is cut, and exact
+    repeats are dropped. Whole chunks are added while they fit; the first one
+    that does not is trimmed at a token boundary if at least `min_doc_tokens`
+    of it fit, and lower-ranked chunks only get in if they fit whole. The
+    prompt therefore reaches the encoder untruncated, and no tokens are spent
+    on text the tokenizer would have cut off anyway.
+
+    Chunk tokenizations (token end offsets) are kept in an LRU cache, since
+    popular chunks are retrieved again and again.
+    """
+
+    def __init__(self, tokenizer: Any, template: str, max_tokens: int = cfg.CONTEXT_MAX_TOKENS,
+                 min_doc_tokens: int = cfg.CONTEXT_MIN_DOC_TOKENS,
+                 overlap_chars: int = cfg.CONTEXT_OVERLAP_CHARS,
+                 cache_size: int = cfg.CONTEXT_TOKEN_CACHE_SIZE):
+        """
+        Args:
+            tokenizer (Any): HF fast tokenizer of the LLM (offset mappings are used for trimming).
+            template (str): Prompt with {context} and {question} fields.
+            max_tokens (int): Token budget of the whole prompt.
+            min_doc_tokens (int): Smallest useful piece of a trimmed chunk.
+            overlap_chars (int): Longest overlap looked for between chunks.
+            cache_size (int): Chunk tokenizations kept (LRU).
+        """
+        self.tokenizer = tokenizer
+        self.template = template
+        self.max_tokens = max_tokens
+        self.min_doc_tokens = max(1, min_doc_tokens)
+        self.overlap_chars = overlap_chars
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[int, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def token_ends(self, texts: List[str]) -> List[Tuple[int, ...]]:
+        """Character offset at which each token of each text ends (no special tokens)."""
+        found: Dict[str, Tuple[int, ...]] = {}
+        with self._lock:
+            for text in texts:
+                ends = self._cache.get(text)
+                if ends is not None:
+                    self._cache.move_to_end(text)
+                    found[text] = ends
+            missing = [text for text in dict.fromkeys(texts) if text not in found]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            # One batched call for everything not seen before
+            encoded = self.tokenizer(missing, add_special_tokens=False, return_offsets_mapping=True)
+            with self._lock:
+                for text, offsets in zip(missing, encoded["offset_mapping"]):
+                    found[text] = self._cache[text] = tuple(end for _, end in offsets)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [found[text] for text in texts]
+
+    def count_tokens(self, prompt: str) -> int:
+        """Tokens the encoder receives for `prompt`, special tokens included."""
+        return len(self.tokenizer(prompt)["input_ids"])
+
+    def cache_stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def _dedupe(self, docs: List[Document]) -> Tuple[List[Tuple[Document, str]], int, int]:
+        """Cuts overlap with higher-ranked chunks of the same complaint; drops repeats."""
+        kept: List[Tuple[Document, str]] = []
+        seen = set()
+        dropped = removed = 0
+        for doc in docs:
+            text = doc.page_content.strip()
+            key = _source_key(doc)
+            for other, _ in kept:
+                if _source_key(other) != key:
+                    continue
+                # `other` precedes this chunk in the complaint, or follows it
+                original = other.page_content.strip()
+                head = overlap_length(original, text, self.overlap_chars)
+                text = text[head:].lstrip()
+                tail = overlap_length(text, original, self.overlap_chars)
+                text = text[:len(text) - tail].rstrip()
+                removed += head + tail
+            if not text or text in seen:
+                dropped += 1
+                continue
+            seen.add(text)
+            kept.append((doc, text))
+        return kept, dropped, removed
+
+    def build(self, question: str, docs: List[Document]) -> PromptContext:
+        """
+        Assembles the prompt for `question` from `docs` (best first).
+
+        Returns:
+            PromptContext: The prompt, the documents it draws on and its token counts.
+        """
+        overhead = self.count_tokens(self.template.format(context="", question=question))
+        candidates, dropped, overlap = self._dedupe(docs)
+        separator = len(self.token_ends([SEPARATOR])[0])
+        remaining = self.max_tokens - overhead
+        if remaining <= 0:
+            logger.warning(f"Question alone uses {overhead} of {self.max_tokens} prompt tokens; no context added")
+
+        pieces: List[str] = []
+        used: List[Document] = []
+        trimmed = set()
+        all_ends = self.token_ends([text for _, text in candidates])
+        for (doc, text), ends in zip(candidates, all_ends):
+            room = remaining - (separator if pieces else 0)
+            if len(ends) <= room:
+                pieces.append(text)
+                remaining = room - len(ends)
+            elif room >= self.min_doc_tokens:
+                trimmed.add(len(pieces))
+                pieces.append(text[:ends[room - 1]].rstrip())
+                remaining = 0
+            else:
+                dropped += 1
+                continue
+            used.append(doc)
+
+        # Pieces tokenized apart can merge differently once joined; shrink the last one until the prompt fits
+        prompt = self.template.format(context=SEPARATOR.join(pieces), question=question)
+        prompt_tokens = self.count_tokens(prompt)
+        while pieces and prompt_tokens > self.max_tokens:
+            ends = self.token_ends([pieces[-1]])[0]
+            keep = len(ends) - (prompt_tokens - self.max_tokens)
+            shorter = pieces[-1][:ends[keep - 1]].rstrip() if keep >= self.min_doc_tokens else ""
+            if shorter and shorter != pieces[-1]:
+                trimmed.add(len(pieces) - 1)
+                pieces[-1] = shorter
+            else:
+                trimmed.discard(len(pieces) - 1)
+                pieces.pop()
+                used.pop()
+                dropped += 1
+            prompt = self.template.format(context=SEPARATOR.join(pieces), question=question)
+            prompt_tokens = self.count_tokens(prompt)
+
+        return PromptContext(
+            prompt=prompt,
+            documents=used,
+            prompt_tokens=prompt_tokens,
+            context_tokens=max(prompt_tokens - overhead, 0),
+            trimmed=len(trimmed),
+            dropped=dropped,
+            overlap_chars=overlap,
+        )
@@ -1,105 +1,241 @@
 
+import argparse
+import logging
 import pandas as pd
-import numpy as np
 import os
+from typing import Iterable, Iterator, List, Optional
 from langchain_community.document_loaders import DataFrameLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 import shutil
+from langchain_core.documents import Document
+import src.config as cfg
+from src.data_io import read_table, write_table
+from src.embeddings import CachedEmbeddings, cached_embeddings
+from src.embedding_engine import EMBEDDING_BACKENDS, cache_model_name, load_embeddings
+from src.vector_index import build_ivf, export_from_chroma, quantize_index
+from src.sparse_index import build_sparse_index
+from src.dedup import DEFAULT_THRESHOLD as DEDUP_THRESHOLD, DUPLICATES_COLUMN, DedupStats, deduplicate
+from src.indexing import (
+    DEFAULT_EMBED_BATCH_SIZE, DEFAULT_INSERT_BATCH_SIZE, assign_chunk_id, index_documents,
+    split_cpu_threads, sync_documents,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Configurations
-DATA_PATH = 'data/filtered_complaints.csv'
+DATA_PATH = 'data/filtered_complaints.parquet'
+SAMPLE_PATH = 'data/sampled_complaints.parquet'
 SAMPLE_SIZE = 10000
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 VECTOR_STORE_PATH = 'vector_store'
+SPARSE_INDEX_PATH = str(cfg.SPARSE_INDEX_PATH)
 EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+EMBED_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+
+# Only these columns are loaded: the text to embed plus the metadata kept on each chunk
+CONTENT_COLUMN = 'cleaned_narrative'
+METADATA_COLUMNS = [
+    'Complaint ID',
+    'Date received',
+    'Product',
+    'Sub-product',
+    'Issue',
+    'Company',
+    'State',
+    'Category',
+]
+
+def iter_chunks(documents: Iterable[Document], text_splitter: RecursiveCharacterTextSplitter) -> Iterator[Document]:
+    """
+    Splits documents one at a time so chunks can be streamed into the indexer.
+    Every chunk gets a stable '<Complaint ID>-<chunk index>' ID.
+    """
+    for document in documents:
+        for i, chunk in enumerate(text_splitter.split_documents([document])):
+            yield assign_chunk_id(chunk, i)
+
+def dedup_savings(dedup: DedupStats, indexed_complaints: int, indexed_chars: int, sampled: bool) -> str:
+    """
+    What deduplication saved for the complaints that are actually indexed.
+    Over the full corpus that is the dropped text. A sample has a fixed
+    size, so no work is saved; instead, near-duplicates no longer take up
+    part of it.
+    """
+    step = CHUNK_SIZE - CHUNK_OVERLAP
+    if not sampled:
+        return f"~{dedup.removed_chars // step} fewer chunks to embed and store"
+    duplicates = dedup.removed / dedup.documents * indexed_complaints if dedup.documents else 0.0
+    return (f"same amount of text to embed (fixed sample size); a sample taken before deduplication would have "
+            f"spent ~{duplicates:.0f} complaints (~{int(indexed_chars * dedup.saved_fraction) // step} chunks) "
+            f"on near-duplicates")
+
+def sample_complaints(df: pd.DataFrame, sample_size: int, incremental: bool = False) -> pd.DataFrame:
+    """Stratified (by Category) sample of `sample_size` complaints; the whole frame when it is not larger."""
+    if incremental and 0 < sample_size < len(df):
+        print("Warning: a stratified sample changes whenever the corpus grows, so incremental "
+              "updates only touch the delta with --sample-size 0.")
+    if sample_size <= 0 or sample_size >= len(df):
+        print("Indexing the full corpus (no sampling)...")
+        return df
+    else:
+        print(f"performing stratified sampling (n={sample_size})...")
+        try:
+            from sklearn.model_selection import train_test_split
+            # Calculate fraction for sampling
+            frac = sample_size / len(df)
+            if frac > 1.0:
+                frac = 1.0
+        
+            # We use train_test_split to get a stratified subset
+            # train_test_split returns (train, test). We can treat the 'test' as our sample if size is small,
+            # or 'train' if large. Here we want `frac` size. 
+            # Actually StratifiedShuffleSplit or just train_test_split(test_size=frac)
+            # If we want exactly X items, we can use test_size=int(SAMPLE_SIZE) (if <= len) or train_size...
+        
+            _, sample = train_test_split(
+                df, 
+                test_size=sample_size, 
+                stratify=df['Category'], 
+                random_state=42
+            )
+            return sample
+        except Exception as e:
+            print(f"Sampling failed or sklearn missing: {e}. Fallback to random sample.")
+            return df.sample(n=min(sample_size, len(df)), random_state=42)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Chunk, embed and index the filtered complaints.")
+    parser.add_argument('--data-path', default=DATA_PATH)
+    parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE,
+                        help="Complaints to sample (stratified); 0 indexes the full corpus.")
+    parser.add_argument('--embed-batch-size', type=int, default=DEFAULT_EMBED_BATCH_SIZE,
+                        help="Texts per embedding call.")
+    parser.add_argument('--insert-batch-size', type=int, default=DEFAULT_INSERT_BATCH_SIZE,
+                        help="Chunks per bulk insert into the vector store.")
+    parser.add_argument('--workers', type=int, default=EMBED_WORKERS,
+                        help="Embedding worker threads.")
+    parser.add_argument('--embedding-backend', default=cfg.EMBEDDING_BACKEND, choices=EMBEDDING_BACKENDS,
+                        help="Embedding engine; the onnx ones need `python -m src.embedding_engine --export`.")
+    parser.add_argument('--embedding-cache', default=str(cfg.EMBEDDING_CACHE_PATH),
+                        help="Embedding cache file shared with the RAG pipeline; '' disables it.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Update the existing store in place: embed only new or changed chunks "
+                             "and delete removed ones instead of rebuilding from scratch.")
+    parser.add_argument('--export-index', action='store_true', default=cfg.RETRIEVER_BACKEND != 'chroma',
+                        help="Also export the store to the in-process exact/IVF index "
+                             "(default when RETRIEVER_BACKEND is not 'chroma').")
+    parser.add_argument('--no-dedup', action='store_true',
+                        help="Index near-duplicate complaints too instead of keeping one per cluster.")
+    parser.add_argument('--dedup-threshold', type=float, default=DEDUP_THRESHOLD,
+                        help="Estimated Jaccard similarity above which complaints are near-duplicates.")
+    parser.add_argument('--no-sparse-index', action='store_true',
+                        help="Skip building the BM25 index used for hybrid retrieval.")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
 
-def main():
     # 1. Load Data
-    print(f"Loading data from {DATA_PATH}...")
-    if not os.path.exists(DATA_PATH):
-        print(f"Error: {DATA_PATH} not found. Please run Task 1 first.")
+    print(f"Loading data from {args.data_path}...")
+    if not os.path.exists(args.data_path):
+        print(f"Error: {args.data_path} not found. Please run Task 1 first.")
         return
 
-    df = pd.read_csv(DATA_PATH)
+    df = read_table(args.data_path, columns=[CONTENT_COLUMN] + METADATA_COLUMNS)
     print(f"Total records: {len(df)}")
 
-    # 2. Stratified Sampling
-    print(f"performing stratified sampling (n={SAMPLE_SIZE})...")
-    try:
-        from sklearn.model_selection import train_test_split
-        # Calculate fraction for sampling
-        frac = SAMPLE_SIZE / len(df)
-        if frac > 1.0:
-            frac = 1.0
-        
-        # We use train_test_split to get a stratified subset
-        # train_test_split returns (train, test). We can treat the 'test' as our sample if size is small,
-        # or 'train' if large. Here we want `frac` size. 
-        # Actually StratifiedShuffleSplit or just train_test_split(test_size=frac)
-        # If we want exactly X items, we can use test_size=int(SAMPLE_SIZE) (if <= len) or train_size...
-        
-        _, df_sample = train_test_split(
-            df, 
-            test_size=SAMPLE_SIZE, 
-            stratify=df['Category'], 
-            random_state=42
-        )
-    except Exception as e:
-        print(f"Sampling failed or sklearn missing: {e}. Fallback to random sample.")
-        df_sample = df.sample(n=min(SAMPLE_SIZE, len(df)), random_state=42)
+    # 2. Near-duplicate removal (templated / copy-pasted narratives); each kept
+    # complaint records its cluster size in DUPLICATES_COLUMN
+    dedup = None
+    if not args.no_dedup:
+        print(f"Removing near-duplicates (threshold {args.dedup_threshold})...")
+        df, dedup = deduplicate(df, CONTENT_COLUMN, threshold=args.dedup_threshold)
+        print(f"Deduplication: {dedup.summary()}")
+    elif DUPLICATES_COLUMN not in df.columns:
+        df[DUPLICATES_COLUMN] = 1
 
+    # 3. Stratified Sampling
+    df_sample = sample_complaints(df, args.sample_size, args.incremental)
     print(f"Sampled records: {len(df_sample)}")
+    if dedup is not None:
+        # Measured on what is indexed: sampling after deduplication changes what it saves
+        indexed_chars = int(df_sample[CONTENT_COLUMN].fillna('').str.len().sum())
+        print(f"Deduplication savings: {dedup_savings(dedup, len(df_sample), indexed_chars, df_sample is not df)}")
     print("Sample distribution:")
     print(df_sample['Category'].value_counts())
     
     # Save sample (optional but good for debugging)
-    df_sample.to_csv('data/sampled_complaints.csv', index=False)
+    write_table(df_sample, SAMPLE_PATH)
 
-    # 3. Document Preparation
+    # 4. Document Preparation
     # We need to convert DataFrame to LangChain Documents
     # We want to keep metadata
     print("Converting to Documents...")
     # Clean NaN content just in case
-    df_sample['cleaned_narrative'] = df_sample['cleaned_narrative'].fillna('')
+    df_sample[CONTENT_COLUMN] = df_sample[CONTENT_COLUMN].fillna('')
     
     # Loader
-    loader = DataFrameLoader(df_sample, page_content_column="cleaned_narrative")
-    documents = loader.load()
+    loader = DataFrameLoader(df_sample, page_content_column=CONTENT_COLUMN)
     
-    # 4. Chunking
+    # 5. Chunking (lazily, so chunks stream straight into the indexer)
     print("Chunking documents...")
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
         separators=["\n\n", "\n", " ", ""]
     )
-    texts = text_splitter.split_documents(documents)
-    print(f"Total chunks created: {len(texts)}")
+    chunks = iter_chunks(loader.lazy_load(), text_splitter)
     
-    # 5. Embedding & Indexing
-    print(f"Initializing embedding model ({EMBEDDING_MODEL})...")
-    # Using local HF embeddings
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    # 6. Embedding & Indexing
+    print(f"Initializing embedding model ({EMBEDDING_MODEL}, {args.embedding_backend})...")
+    # Each call encodes one embed batch, in forward passes of texts with similar lengths.
+    # Torch's threads are split between the workers. The ONNX workers all run on one
+    # session and draw from its intra-op pool, so that pool gets every core.
+    split_cpu_threads(args.workers)
+    embeddings = cached_embeddings(
+        load_embeddings(EMBEDDING_MODEL, args.embedding_backend, intra_op=os.cpu_count() or 0),
+        cache_model_name(EMBEDDING_MODEL, args.embedding_backend),
+        cache_path=args.embedding_cache,
+    )
     
     print(f"Creating/Updating Vector Store at {VECTOR_STORE_PATH}...")
-    # Check if vector store exists and clear it if we want a fresh start?
-    # Task says "Create", usually implies fresh.
-    if os.path.exists(VECTOR_STORE_PATH):
+    # A full rebuild starts fresh; incremental mode diffs against what is stored.
+    if os.path.exists(VECTOR_STORE_PATH) and not args.incremental:
         shutil.rmtree(VECTOR_STORE_PATH) # Clear old test runs
         
-    # Create Chroma
-    # We pass 'ids' potentially? Chroma generates them if not provided.
-    vector_store = Chroma.from_documents(
-        documents=texts,
-        embedding=embeddings,
-        persist_directory=VECTOR_STORE_PATH
+    vector_store = Chroma(
+        persist_directory=VECTOR_STORE_PATH,
+        embedding_function=embeddings
     )
-    
-    # Persist (auto-persisted in newer chroma versions, but persist() is safe)
-    # vector_store.persist() # Deprecated in newer langchain/chroma, often auto-saves.
+    print(f"Indexing with {args.workers} workers (embed batch {args.embed_batch_size}, "
+          f"insert batch {args.insert_batch_size})...")
+    batching = dict(
+        embed_batch_size=args.embed_batch_size,
+        insert_batch_size=args.insert_batch_size,
+        workers=args.workers,
+    )
+    if args.incremental:
+        sync = sync_documents(chunks, embeddings, vector_store, **batching)
+        print(f"Incremental update: {sync.summary()}")
+    else:
+        stats = index_documents(chunks, embeddings, vector_store, **batching)
+        print(f"Total chunks created: {stats.chunks}")
+        print(f"Indexing throughput: {stats.summary()}")
+    if isinstance(embeddings, CachedEmbeddings):
+        print(f"Embedding cache: {embeddings.cache.stats()}")
+    if args.export_index:
+        meta = export_from_chroma(vector_store, str(cfg.VECTOR_INDEX_PATH))
+        n_lists = build_ivf(str(cfg.VECTOR_INDEX_PATH))
+        quantize_index(str(cfg.VECTOR_INDEX_PATH), (cfg.QUANTIZATION,))
+        print(f"Exported {meta['count']} vectors to {cfg.VECTOR_INDEX_PATH} "
+              f"({n_lists} IVF lists, {cfg.QUANTIZATION} codes)")
+    if not args.no_sparse_index:
+        # Incremental runs only tokenize chunks whose content hash changed
+        sparse = build_sparse_index(vector_store, SPARSE_INDEX_PATH, incremental=args.incremental)
+        print(f"BM25 index at {SPARSE_INDEX_PATH}: {sparse.summary()}")
     
     print("Vector Store successfully created.")
 
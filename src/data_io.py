@@ -0,0 +1,189 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# Intermediate formats, keyed by file suffix. Parquet is the default between
+# pipeline stages; Feather (Arrow IPC) can be memory-mapped; CSV is kept as an
+# export format for spreadsheets and ad-hoc inspection.
+FORMATS = {
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.csv': 'csv',
+}
+
+ROW_GROUP_SIZE = 65_536 # rows per Parquet row group / Arrow record batch written by TableWriter
+
+def table_format(path: str) -> str:
+    """Returns 'parquet', 'feather' or 'csv' based on the file suffix of `path`."""
+    suffix = os.path.splitext(str(path))[1].lower()
+    if suffix not in FORMATS:
+        raise ValueError(f"Unsupported table format '{suffix}' for {path}; expected one of {sorted(FORMATS)}")
+    return FORMATS[suffix]
+
+def partial_path(path: str) -> str:
+    """The temporary name `path` is written under before it is renamed into place."""
+    directory, name = os.path.split(str(path))
+    return os.path.join(directory, f".partial-{name}")
+
+@contextmanager
+def replacing(path: str) -> Iterator[str]:
+    """
+    Yields a temporary path to write `path`'s new contents to. On a clean
+    exit it is renamed over `path` in one step, so processes that memory-map
+    the old file keep reading a complete copy; on an error it is removed and
+    `path` is left as it was.
+    """
+    write_path = partial_path(path)
+    try:
+        yield write_path
+    except BaseException:
+        if os.path.exists(write_path):
+            os.remove(write_path)
+        raise
+    if os.path.exists(write_path):
+        os.replace(write_path, path)
+
+def read_table(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Loads a pipeline intermediate, reading only `columns` when given.
+
+    Columnar formats skip the unrequested columns on disk; Feather files are
+    memory-mapped.
+    """
+    fmt = table_format(path)
+    if fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    if fmt == 'feather':
+        return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    return pd.read_csv(path, usecols=columns)
+
+def read_arrow(path: str, columns: Optional[List[str]] = None) -> pa.Table:
+    """
+    read_table() returning the Arrow table itself. Feather files are
+    memory-mapped, so their data stays in the page cache instead of
+    becoming Python objects.
+    """
+    fmt = table_format(path)
+    if fmt == 'parquet':
+        return pq.read_table(path, columns=columns, memory_map=True)
+    if fmt == 'feather':
+        return feather.read_table(path, columns=columns, memory_map=True)
+    return pa.Table.from_pandas(pd.read_csv(path, usecols=columns), preserve_index=False)
+
+def _arrow_schema(df: pd.DataFrame) -> pa.Schema:
+    """
+    Fixed schema for a processed chunk. Text columns are always strings, so a
+    chunk where a column happens to be entirely empty cannot change the type.
+    """
+    fields = []
+    for column, dtype in df.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            arrow_type = pa.bool_()
+        elif pd.api.types.is_integer_dtype(dtype):
+            arrow_type = pa.int64()
+        elif pd.api.types.is_float_dtype(dtype):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column, arrow_type))
+    return pa.schema(fields)
+
+def _compact(column: pa.ChunkedArray) -> pa.Array:
+    """
+    `column` as one freshly allocated array: no slack left over from slicing
+    and no validity bitmap without nulls, so equal rows give equal bytes.
+    """
+    array = pa.concat_arrays(column.chunks) if column.num_chunks else pa.array([], type=column.type)
+    if array.null_count == 0 and array.buffers()[0] is not None:
+        array = pa.Array.from_buffers(array.type, len(array), [None] + array.buffers()[1:], null_count=0)
+    return array
+
+class TableWriter:
+    """
+    Appends DataFrame chunks to a single output file in any supported format.
+
+    The first chunk fixes the columns and schema; every later chunk is cast to
+    it. Columnar output is buffered into row groups (record batches) of
+    `row_group_size` rows, so the file does not depend on how the rows were
+    chunked. Use as a context manager so the buffer and file footer are
+    written on exit.
+
+    With `replace=True` the rows go to a temporary file that is renamed over
+    `path` on a clean exit, so a process that memory-maps the old file keeps
+    reading a complete copy.
+    """
+
+    def __init__(self, path: str, replace: bool = False, row_group_size: Optional[int] = None):
+        self.path = str(path)
+        self.format = table_format(self.path)
+        self.rows_written = 0
+        self.row_group_size = max(1, row_group_size or ROW_GROUP_SIZE)
+        self._schema = None
+        self._writer = None
+        self._pending: List[pd.DataFrame] = []
+        self._pending_rows = 0
+        self._write_path = partial_path(self.path) if replace else self.path
+
+    def write(self, df: pd.DataFrame):
+        first = self._schema is None
+        if first:
+            self._schema = _arrow_schema(df)
+            if self.format == 'parquet':
+                self._writer = pq.ParquetWriter(self._write_path, self._schema)
+            elif self.format == 'feather':
+                self._writer = pa.ipc.new_file(self._write_path, self._schema)
+
+        if self.format == 'csv':
+            df.to_csv(self._write_path, mode='w' if first else 'a', header=first, index=False)
+        else:
+            self._pending.append(df)
+            self._pending_rows += len(df)
+            if self._pending_rows >= self.row_group_size:
+                self._flush(final=False)
+        self.rows_written += len(df)
+
+    def _flush(self, final: bool):
+        """Writes the buffered rows as full row groups, plus the remainder when `final`."""
+        # Converted per row group and compacted, so the buffers are the same however the rows arrived
+        df = pd.concat(self._pending, ignore_index=True) if len(self._pending) > 1 else self._pending[0]
+        end = len(df) if final else len(df) - len(df) % self.row_group_size
+        for start in range(0, end, self.row_group_size):
+            rows = df.iloc[start:min(start + self.row_group_size, end)]
+            table = pa.Table.from_pandas(rows, schema=self._schema, preserve_index=False)
+            self._writer.write_table(pa.table([_compact(column) for column in table.columns], schema=self._schema))
+        self._pending = [df.iloc[end:]] if end < len(df) else []
+        self._pending_rows = len(df) - end
+
+    def close(self):
+        if self._writer is not None:
+            if self._pending_rows:
+                self._flush(final=True)
+            self._writer.close()
+            self._writer = None
+        if self._write_path != self.path and os.path.exists(self._write_path):
+            os.replace(self._write_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._write_path != self.path:
+            # Leave the previous file in place rather than a partial one
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if os.path.exists(self._write_path):
+                os.remove(self._write_path)
+            return
+        self.close()
+
+def write_table(df: pd.DataFrame, path: str, replace: bool = False):
+    """Writes a whole DataFrame in the format implied by `path` (see TableWriter for `replace`)."""
+    with TableWriter(path, replace=replace) as writer:
+        writer.write(df)
@@ -0,0 +1,233 @@
+import argparse
+import logging
+import time
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.data_io import read_table, write_table
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.8 # estimated Jaccard similarity of word shingles above which complaints are duplicates
+DEFAULT_PERMUTATIONS = 128 # MinHash signature length
+DEFAULT_BANDS = 16 # LSH bands of 8 rows: pairs above ~0.7 similarity become candidates
+DEFAULT_SHINGLE_WORDS = 5
+# Shingles hashed per block of the signature computation; bounds memory to ~SHINGLE_BLOCK x permutations x 8 bytes
+SHINGLE_BLOCK = 1 << 16
+# Cluster size recorded on every kept complaint (1 = unique)
+DUPLICATES_COLUMN = 'duplicate_count'
+
+# Shingle hashes are reduced modulo this Mersenne prime so they fit in 31 bits
+_PRIME = np.uint64((1 << 31) - 1)
+_SHINGLE_BASE = np.uint64(1_000_003)
+# Signature value of a text without shingles
+_EMPTY = np.iinfo(np.uint32).max
+
+@dataclass
+class DedupStats:
+    """What deduplication removed, and how much indexing work that saves."""
+    documents: int = 0
+    kept: int = 0
+    clusters: int = 0
+    total_chars: int = 0
+    removed_chars: int = 0
+    seconds: float = 0.0
+
+    @property
+    def removed(self) -> int:
+        return self.documents - self.kept
+
+    @property
+    def saved_fraction(self) -> float:
+        """
+        Share of the narrative text that was dropped. It is the chunking and
+        embedding work saved only when the whole corpus is indexed; see
+        create_vector_store.dedup_savings for a sample.
+        """
+        return self.removed_chars / self.total_chars if self.total_chars else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.removed} near-duplicates removed from {self.documents} complaints "
+                f"({self.clusters} clusters, {self.saved_fraction:.1%} of the narrative text), "
+                f"{self.seconds:.1f}s")
+
+def shingle_hashes(texts: pd.Series, shingle_words: int = DEFAULT_SHINGLE_WORDS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashes of every run of `shingle_words` consecutive words, for all texts at once.
+
+    Words are hashed once per distinct word (CRC32), and runs are combined
+    as a polynomial hash over shifted copies of the word array. Texts
+    shorter than a shingle get one shingle of all their words.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Shingle hashes (< 2^31) and the row each one belongs to,
+        grouped by row in ascending order. Rows without words have no shingles.
+    """
+    words = texts.fillna('').str.lower().str.split()
+    lengths = words.str.len().to_numpy(dtype=np.int64)
+    codes, uniques = pd.factorize(words.explode().dropna())
+    word_hash = np.array([zlib.crc32(w.encode('utf-8')) for w in uniques], dtype=np.uint64)[codes] % _PRIME
+
+    rows = np.repeat(np.arange(len(texts)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    position = np.arange(len(rows)) - starts[rows]
+    hashes = np.zeros(len(rows), dtype=np.uint64)
+    for offset in range(shingle_words):
+        part = np.zeros(len(rows), dtype=np.uint64)
+        part[:len(rows) - offset] = word_hash[offset:]
+        # Words past the end of a text do not belong to its shingles
+        part[position + offset >= lengths[rows]] = 0
+        hashes = (hashes * _SHINGLE_BASE + part) % _PRIME
+    valid = position <= np.maximum(lengths[rows] - shingle_words, 0)
+    return hashes[valid], rows[valid]
+
+def minhash_signatures(hashes: np.ndarray, rows: np.ndarray, n_rows: int,
+                       permutations: int = DEFAULT_PERMUTATIONS, seed: int = 0) -> np.ndarray:
+    """
+    MinHash signatures, one row per text: for each of `permutations`
+    multiply-add-shift hashes ((a * x + b) mod 2^64) >> 32, the minimum over
+    the text's shingles. Each block of shingles is hashed with one outer
+    product (permutation-major, so the reduction runs along contiguous
+    memory) and reduced per text with np.minimum.reduceat; no modulo is needed.
+
+    Returns:
+        np.ndarray: (n_rows, permutations) uint32; texts without shingles are all 2^32 - 1.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, permutations, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, permutations, dtype=np.uint64)
+    signatures = np.full((n_rows, permutations), _EMPTY, dtype=np.uint32)
+    if len(hashes) == 0:
+        return signatures
+    # Blocks end on row boundaries so every row is reduced in one piece
+    group_starts = np.concatenate([[0], np.flatnonzero(np.diff(rows)) + 1])
+    first = 0
+    while first < len(group_starts):
+        start = group_starts[first]
+        last = max(int(np.searchsorted(group_starts, start + SHINGLE_BLOCK)), first + 1)
+        stop = group_starts[last] if last < len(group_starts) else len(hashes)
+        permuted = np.multiply.outer(a, hashes[start:stop])
+        permuted += b[:, None]
+        permuted >>= np.uint64(32)
+        signatures[rows[group_starts[first:last]]] = np.minimum.reduceat(
+            permuted, group_starts[first:last] - start, axis=1).T
+        first = last
+    return signatures
+
+def lsh_clusters(signatures: np.ndarray, bands: int = DEFAULT_BANDS,
+                 threshold: float = DEFAULT_THRESHOLD) -> np.ndarray:
+    """
+    Groups near-duplicate signatures with LSH banding.
+
+    Signatures that agree on every row of some band share a bucket. Each
+    member is compared with its bucket's first member, and the pair is kept
+    only if the fraction of agreeing signature rows (an estimate of Jaccard
+    similarity) reaches `threshold`. Kept pairs are merged transitively.
+
+    Returns:
+        np.ndarray: Cluster label per signature: the lowest row number in its cluster.
+    """
+    n, permutations = signatures.shape
+    if permutations % bands:
+        raise ValueError(f"bands={bands} does not divide the {permutations} signature rows")
+    if n == 0:
+        return np.arange(0)
+    width = permutations // bands
+    empty = (signatures == _EMPTY).all(axis=1)
+    # One 64-bit key per band (wrapping arithmetic); a rare collision only adds a candidate to verify
+    mixers = np.random.default_rng(0).integers(1, 1 << 63, width, dtype=np.uint64) | np.uint64(1)
+    left, right = [], []
+    for band in range(bands):
+        keys = signatures[:, band * width:(band + 1) * width].astype(np.uint64) @ mixers
+        _, bucket = np.unique(keys, return_inverse=True)
+        first = np.full(bucket.max() + 1, n, dtype=np.int64)
+        np.minimum.at(first, bucket, np.arange(n))
+        leader = first[bucket]
+        candidates = np.flatnonzero((leader != np.arange(n)) & ~empty)
+        similarity = (signatures[candidates] == signatures[leader[candidates]]).mean(axis=1)
+        keep = similarity >= threshold
+        left.append(candidates[keep])
+        right.append(leader[candidates][keep])
+
+    labels = np.arange(n)
+    left, right = np.concatenate(left), np.concatenate(right)
+    # Propagate the smallest row number along the pairs until every cluster agrees
+    while len(left):
+        previous = labels.copy()
+        smallest = np.minimum(labels[left], labels[right])
+        np.minimum.at(labels, left, smallest)
+        np.minimum.at(labels, right, smallest)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            break
+    return labels
+
+def deduplicate(df: pd.DataFrame, text_column: str, threshold: float = DEFAULT_THRESHOLD,
+                permutations: int = DEFAULT_PERMUTATIONS, bands: int = DEFAULT_BANDS,
+                shingle_words: int = DEFAULT_SHINGLE_WORDS, seed: int = 0,
+                batch_rows: int = 20_000) -> Tuple[pd.DataFrame, DedupStats]:
+    """
+    Drops near-duplicate rows, keeping the first row of each cluster.
+
+    The kept rows get a DUPLICATES_COLUMN with their cluster size, which
+    create_vector_store carries into every chunk's metadata.
+
+    Args:
+        df (pd.DataFrame): Complaints, e.g. the output of process_data.
+        text_column (str): Narrative column to compare.
+        threshold (float): Minimum estimated Jaccard similarity of word shingles.
+        permutations (int): MinHash signature length.
+        bands (int): LSH bands; must divide `permutations`.
+        shingle_words (int): Words per shingle.
+        seed (int): Seed of the MinHash permutations.
+        batch_rows (int): Texts shingled and signed at a time (bounds memory).
+
+    Returns:
+        Tuple[pd.DataFrame, DedupStats]: The deduplicated rows and what was removed.
+    """
+    start = time.perf_counter()
+    texts = df[text_column].fillna('').astype(str)
+    signatures = np.empty((len(df), permutations), dtype=np.uint32)
+    for begin in range(0, len(df), batch_rows):
+        batch = texts.iloc[begin:begin + batch_rows]
+        hashes, rows = shingle_hashes(batch, shingle_words)
+        signatures[begin:begin + len(batch)] = minhash_signatures(hashes, rows, len(batch), permutations, seed)
+    labels = lsh_clusters(signatures, bands, threshold)
+
+    sizes = np.bincount(labels, minlength=len(df))
+    keep = labels == np.arange(len(df))
+    deduped = df[keep].copy()
+    deduped[DUPLICATES_COLUMN] = sizes[keep]
+
+    lengths = texts.str.len().to_numpy()
+    stats = DedupStats(
+        documents=len(df),
+        kept=int(keep.sum()),
+        clusters=int((sizes[keep] > 1).sum()),
+        total_chars=int(lengths.sum()),
+        removed_chars=int(lengths[~keep].sum()),
+        seconds=time.perf_counter() - start,
+    )
+    logger.info(f"Deduplication: {stats.summary()}")
+    return deduped, stats
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Remove near-duplicate complaints (MinHash + LSH).")
+    parser.add_argument('--input', default='data/filtered_complaints.parquet')
+    parser.add_argument('--output', default='data/deduplicated_complaints.parquet')
+    parser.add_argument('--column', default='cleaned_narrative')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    df = read_table(args.input)
+    deduped, stats = deduplicate(df, args.column, threshold=args.threshold)
+    write_table(deduped, args.output)
+    print(f"{stats.summary()}")
+    print(f"Saved {len(deduped)} complaints to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import logging
+import os
+import time
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import src.config as cfg
+from src.generation import inference_session, onnx_model_dir, quantize_onnx_file, session_options
+
+logger = logging.getLogger(__name__)
+
+# Embedding engines selectable through cfg.EMBEDDING_BACKEND
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+# Written by `optimum-cli export onnx --task feature-extraction`
+ONNX_EMBEDDING_FILE = 'model.onnx'
+
+def length_buckets(lengths: Sequence[int], batch_size: int) -> List[np.ndarray]:
+    """
+    Indices of `lengths` sorted by length and cut into batches of
+    `batch_size`, so each batch pads only to the length of similar texts.
+    """
+    order = np.argsort(np.asarray(lengths), kind='stable')
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+def padding_ratio(lengths: Sequence[int], batches: Sequence[Sequence[int]]) -> float:
+    """Share of the tokens in padded `batches` that are padding."""
+    lengths = np.asarray(lengths)
+    padded = sum(len(batch) * int(lengths[batch].max()) for batch in batches if len(batch))
+    return 1.0 - int(lengths.sum()) / padded if padded else 0.0
+
+def embedding_model_dir(model_name: str, int8: bool = False, directory: str = str(cfg.ONNX_MODEL_DIR)) -> str:
+    return onnx_model_dir(model_name, directory) + ('-int8' if int8 else '')
+
+def cache_model_name(model_name: str, backend: str = cfg.EMBEDDING_BACKEND) -> str:
+    """
+    Embedding cache namespace of a model run on `backend`. The fp32 engines
+    share entries; int8 vectors differ slightly, so they get their own.
+    """
+    return f"{model_name}#int8" if backend.endswith('int8') else model_name
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformers embeddings (mean pooling, L2-normalized) computed
+    with ONNX Runtime.
+
+    Each call tokenizes its texts without padding, sorts them by token
+    count and runs them in batches of `batch_size`, padded per batch
+    (see length_buckets). Complaint chunks range from a few words to
+    CHUNK_SIZE characters, so arrival-order batches are mostly padding.
+    Sessions are thread-safe, so one instance serves every indexing worker.
+    """
+
+    def __init__(self, session: Any, tokenizer: Any, batch_size: int = cfg.EMBEDDING_BATCH_SIZE,
+                 max_length: int = cfg.EMBEDDING_MAX_SEQ_LENGTH):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._input_names = {i.name for i in session.get_inputs()}
+        self._output_name = session.get_outputs()[0].name
+
+    @classmethod
+    def load(cls, path: str, batch_size: int = cfg.EMBEDDING_BATCH_SIZE,
+             intra_op: int = cfg.INTRA_OP_THREADS, inter_op: int = cfg.INTER_OP_THREADS) -> 'OnnxEmbeddings':
+        """Opens an export written by export_onnx_embeddings (model plus tokenizer files)."""
+        from transformers import AutoTokenizer
+
+        session = inference_session(os.path.join(path, ONNX_EMBEDDING_FILE), session_options(intra_op, inter_op))
+        return cls(session, AutoTokenizer.from_pretrained(path), batch_size)
+
+    def token_ids(self, texts: List[str]) -> List[List[int]]:
+        """Unpadded, truncated token IDs of each text."""
+        return self.tokenizer(texts, truncation=True, max_length=self.max_length)['input_ids']
+
+    def _encode(self, ids: List[List[int]]) -> np.ndarray:
+        width = max(len(row) for row in ids)
+        input_ids = np.full((len(ids), width), self.tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros_like(input_ids)
+        for i, row in enumerate(ids):
+            input_ids[i, :len(row)] = row
+            attention_mask[i, :len(row)] = 1
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask,
+                 'token_type_ids': np.zeros_like(input_ids)}
+        hidden = self.session.run([self._output_name], {k: v for k, v in feeds.items() if k in self._input_names})[0]
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        ids = self.token_ids(texts)
+        vectors = None
+        for batch in length_buckets([len(row) for row in ids], self.batch_size):
+            encoded = self._encode([ids[i] for i in batch])
+            if vectors is None:
+                vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+            vectors[batch] = encoded
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def export_onnx_embeddings(model_name: str = cfg.EMBEDDING_MODEL_NAME, int8: bool = False,
+                           directory: str = str(cfg.ONNX_MODEL_DIR)) -> str:
+    """
+    Exports the sentence-transformers encoder (and its tokenizer) with
+    optimum, optionally quantizing the weights to int8.
+
+    Returns:
+        str: The directory OnnxEmbeddings.load reads.
+    """
+    from optimum.exporters.onnx import main_export
+
+    path = embedding_model_dir(model_name, int8, directory)
+    start = time.perf_counter()
+    main_export(model_name, output=path, task='feature-extraction')
+    if int8:
+        quantize_onnx_file(os.path.join(path, ONNX_EMBEDDING_FILE))
+    logger.info(f"Exported {model_name} to {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+def load_embeddings(model_name: str = cfg.EMBEDDING_MODEL_NAME, backend: str = cfg.EMBEDDING_BACKEND,
+                    batch_size: int = cfg.EMBEDDING_BATCH_SIZE, intra_op: int = cfg.INTRA_OP_THREADS) -> Embeddings:
+    """
+    The embedding model for `backend`:
+
+    - 'torch': HuggingFaceEmbeddings (sentence-transformers, fp32 PyTorch).
+    - 'onnx' / 'onnx-int8': OnnxEmbeddings over the fp32 or int8 export in cfg.ONNX_MODEL_DIR.
+
+    Args:
+        batch_size (int): Texts per forward pass.
+        intra_op (int): ONNX Runtime threads per call (0 = runtime default).
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'; expected one of {EMBEDDING_BACKENDS}")
+    if backend == 'torch':
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+    int8 = backend == 'onnx-int8'
+    path = embedding_model_dir(model_name, int8)
+    if not os.path.exists(os.path.join(path, ONNX_EMBEDDING_FILE)):
+        flag = ' --int8' if int8 else ''
+        raise FileNotFoundError(f"No ONNX export at {path}; run `python -m src.embedding_engine --export{flag}`")
+    return OnnxEmbeddings.load(path, batch_size, intra_op)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export the embedding model for the ONNX Runtime backends.")
+    parser.add_argument('--export', action='store_true', help="Export the model to cfg.ONNX_MODEL_DIR.")
+    parser.add_argument('--int8', action='store_true', help="Quantize the exported weights to int8 ('onnx-int8').")
+    parser.add_argument('--model', default=cfg.EMBEDDING_MODEL_NAME)
+    args = parser.parse_args(argv)
+    if not args.export:
+        parser.error("nothing to do; pass --export")
+    print(f"ONNX model written to {export_onnx_embeddings(args.model, args.int8)}")
+
+if __name__ == "__main__":
+    main()
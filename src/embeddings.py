@@ -0,0 +1,231 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import src.config as cfg
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace runs so trivially different copies of a text share a cache entry."""
+    return _WHITESPACE.sub(' ', text).strip()
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed store of embedding vectors.
+
+    Entries are keyed by a SHA-256 of (model name, normalized text) and hold
+    the vector as raw float32 bytes in a single SQLite file. When the number
+    of entries exceeds `max_entries`, the least recently used ones are
+    evicted down to 90% of the cap; the entries are recounted after every
+    insert, so the cap holds when several processes share the file. Safe to
+    share between threads.
+
+    Reads do not write: access times are kept in memory and written with
+    the next put, or once `touch_batch` keys are pending, so processes
+    sharing the file are not serialized on a commit per lookup.
+
+    Attributes:
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups that had to be embedded.
+        evictions (int): Entries removed to respect the size cap.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int = cfg.EMBEDDING_CACHE_MAX_ENTRIES,
+                 touch_batch: int = 1000):
+        self.path = str(path)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.touch_batch = touch_batch
+        self._touched: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings '
+            '(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)')
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+
+    def key(self, text: str) -> str:
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors for whichever of `keys` are present."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite caps the number of bound parameters per statement
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            now = time.time()
+            self._touched.update((key, now) for key in found)
+            if len(self._touched) >= self.touch_batch:
+                self._flush_touches()
+                self._conn.commit()
+        return found
+
+    def _flush_touches(self):
+        """Writes pending access times (the caller holds the lock and commits)."""
+        if self._touched:
+            self._conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                   [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Stores vectors (as float32) and evicts least recently used entries past the cap."""
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._flush_touches()
+            before = self._conn.total_changes
+            self._conn.executemany('INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?)', rows)
+            if self._conn.total_changes == before:
+                self._conn.commit()
+                return
+            # Other processes (indexer, server workers) share the file, so count what is really stored
+            self._size = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            if self._size > self.max_entries:
+                self._evict(self._size - int(self.max_entries * 0.9))
+            self._conn.commit()
+
+    def _evict(self, count: int):
+        deleted = self._conn.execute(
+            'DELETE FROM embeddings WHERE key IN '
+            '(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)', (count,)
+        ).rowcount
+        self._size -= deleted
+        self.evictions += deleted
+        logger.info(f"Embedding cache evicted {deleted} least recently used entries")
+
+    def record_lookups(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Drop-in Embeddings wrapper that consults an EmbeddingCache before the
+    wrapped model. Duplicate texts within one call are embedded only once.
+
+    Queries and documents share one key space, which holds for the
+    sentence-transformers models used here (they embed both identically).
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache.key(t) for t in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        # In-call duplicates of a missing text are served without embedding, so count as hits
+        self.cache.record_lookups(len(keys) - len(missing), len(missing))
+
+        if missing:
+            computed = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = {key: np.asarray(v, dtype=np.float32) for key, v in zip(missing, computed)}
+            self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[k].tolist() for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.key(text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            self.cache.record_lookups(1, 0)
+            return cached[key].tolist()
+        self.cache.record_lookups(0, 1)
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        self.cache.put_many({key: vector})
+        return vector.tolist()
+
+class DeferredEmbeddings(Embeddings):
+    """
+    Embeddings that obtain the model from `load` on first use, so a vector
+    store can be opened while the embedding model is still loading.
+    """
+
+    def __init__(self, load: Callable[[], Embeddings]):
+        self._load = load
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._load().embed_query(text)
+
+def cached_embeddings(embeddings: Embeddings,
+                      model_name: str,
+                      cache_path: Optional[str] = None,
+                      max_entries: int = cfg.EMBEDDING_CACHE_MAX_ENTRIES) -> Embeddings:
+    """
+    Wraps `embeddings` with the shared on-disk cache.
+
+    Args:
+        embeddings (Embeddings): The underlying embedding model.
+        model_name (str): Model identifier, part of every cache key.
+        cache_path (str): SQLite file; defaults to cfg.EMBEDDING_CACHE_PATH.
+            An empty string disables caching.
+        max_entries (int): Size cap before LRU eviction.
+
+    Returns:
+        Embeddings: The cached wrapper, or `embeddings` itself if caching is disabled.
+    """
+    if cache_path is None:
+        cache_path = str(cfg.EMBEDDING_CACHE_PATH) if cfg.EMBEDDING_CACHE_ENABLED else ''
+    if not cache_path:
+        return embeddings
+    return CachedEmbeddings(embeddings, EmbeddingCache(cache_path, model_name, max_entries))
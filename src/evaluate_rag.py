@@ -1,21 +1,26 @@
 
+import argparse
 import pandas as pd
 import time
 import logging
-from typing import List, Dict
-from src.rag_pipeline import ComplaintRAG
-from src.config import REPORTS_DIR
+from typing import List, Optional
+from src.rag_pipeline import ComplaintRAG, RAGResult
+from src.config import REPORTS_DIR, GENERATION_BATCH_SIZE
+from src.instrumentation import StageRecorder
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def load_questions() -> List[str]:
+def load_questions(path: Optional[str] = None) -> List[str]:
     """
-    Loads evaluation questions. 
-    In a future iteration, this could read from src.config.EVAL_QUESTIONS_PATH.
-    For now, returns a hardcoded list of representative PM questions.
+    Loads evaluation questions, one per line, from `path` (e.g.
+    src.config.EVAL_QUESTIONS_PATH). Without a path, returns a hardcoded
+    list of representative PM questions.
     """
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
     return [
         "What are the common complaints about credit card fees?",
         "Why are customers unhappy with money transfers?",
@@ -27,56 +32,126 @@ def load_questions() -> List[str]:
         "What specifically are customers saying about 'unexpected' charges?"
     ]
 
-def evaluate_pipeline(rag: ComplaintRAG, questions: List[str]) -> pd.DataFrame:
+def answer_questions(rag: ComplaintRAG, questions: List[str],
+                     batch_size: int = GENERATION_BATCH_SIZE) -> List[Optional[RAGResult]]:
     """
-    Runs the RAG pipeline on a set of questions and returns a DataFrame of results.
+    Answers `questions` with query_batch. If the batch call fails, falls back
+    to one query_with_sources per question, so only questions that fail on
+    their own are reported as errors (None).
     """
+    try:
+        return rag.query_batch(questions, batch_size=batch_size)
+    except Exception as e:
+        logger.error(f"Error processing evaluation batch, answering one question at a time: {e}")
     results = []
-    logger.info(f"Starting evaluation of {len(questions)} questions...")
-    
-    for i, q in enumerate(questions):
-        logger.info(f"Processing Q{i+1}: {q}")
-        start_t = time.time()
-        
+    for q in questions:
         try:
-            # 1. Retrieval
-            docs = rag.retrieve_only(q)
-            # Format sources for readability in table
-            sources = [
-                f"[{d.metadata.get('Product','?')}] {d.metadata.get('Complaint ID','?')}" 
-                for d in docs[:3]
-            ]
-            source_str = "; ".join(sources)
-            
-            # 2. Generation
-            answer_text = rag.query(q)
-            
-            elapsed = time.time() - start_t
-            
-            results.append({
-                "Question": q,
-                "Generated Answer": answer_text.strip(),
-                "Retrieved Context IDs": source_str,
-                "Latency (s)": round(elapsed, 2),
-                "Manual Relevance Rating (1-5)": " " # Placeholder for human review
-            })
+            results.append(rag.query_with_sources(q))
         except Exception as e:
             logger.error(f"Error processing question '{q}': {e}")
-            results.append({
+            results.append(None)
+    return results
+
+def batch_throughput(rag: ComplaintRAG, questions: List[str], batch_sizes: List[int]) -> pd.DataFrame:
+    """
+    Times query_batch over the same questions at each batch size. `rag`
+    should have its query cache disabled (cache_size=0), or every run after
+    the first is answered from the cache.
+    """
+    rows = []
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        rag.query_batch(questions, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        rows.append({"Batch size": batch_size, "Questions": len(questions), "Seconds": round(elapsed, 2),
+                     "Questions/sec": round(len(questions) / elapsed, 2)})
+    df = pd.DataFrame(rows)
+    df["Speedup"] = (df["Questions/sec"] / df["Questions/sec"].iloc[0]).round(2)
+    return df
+
+def evaluate_pipeline(rag: ComplaintRAG, questions: List[str], batch_size: int = GENERATION_BATCH_SIZE) -> pd.DataFrame:
+    """
+    Runs the RAG pipeline on a set of questions and returns a DataFrame of results.
+    Questions are answered through ComplaintRAG.query_batch, `batch_size` prompts per generate() call.
+    """
+    rows = []
+    logger.info(f"Starting evaluation of {len(questions)} questions (batch size {batch_size})...")
+    
+    start = time.perf_counter()
+    results = answer_questions(rag, questions, batch_size)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Answered {len(questions)} questions in {elapsed:.1f}s "
+                f"({len(questions) / elapsed if elapsed else 0:.2f} questions/sec)")
+    
+    for q, result in zip(questions, results):
+        if result is None:
+            rows.append({
                 "Question": q,
                 "Generated Answer": "ERROR",
                 "Retrieved Context IDs": "ERROR",
                 "Latency (s)": 0,
+                "Retrieval (s)": 0,
+                "Generation (s)": 0,
+                "Embed (ms)": 0,
+                "Search (ms)": 0,
+                "Generate (ms)": 0,
+                "Input Tokens": 0,
+                "Output Tokens": 0,
                 "Manual Relevance Rating (1-5)": "0" 
             })
+            continue
+        # Format sources for readability in table
+        sources = [
+            f"[{d.metadata.get('Product','?')}] {d.metadata.get('Complaint ID','?')}" 
+            for d in result.sources[:3]
+        ]
+        source_str = "; ".join(sources)
+        
+        # Batched timings are each question's amortized share of its batch
+        rows.append({
+            "Question": q,
+            "Generated Answer": result.answer.strip(),
+            "Retrieved Context IDs": source_str,
+            "Latency (s)": round(result.timings["total"], 2),
+            "Retrieval (s)": round(result.timings.get("retrieval", 0), 2),
+            "Generation (s)": round(result.timings.get("generation", 0), 2),
+            "Embed (ms)": round(result.timings.get("embed_query", 0) * 1000, 1),
+            "Search (ms)": round(result.timings.get("vector_search", 0) * 1000, 1),
+            "Generate (ms)": round(result.timings.get("generate", 0) * 1000, 1),
+            "Input Tokens": result.tokens.get("input_tokens", 0),
+            "Output Tokens": result.tokens.get("output_tokens", 0),
+            "Manual Relevance Rating (1-5)": " " # Placeholder for human review
+        })
             
-    return pd.DataFrame(results)
+    return pd.DataFrame(rows)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Evaluate the RAG pipeline on a question set.")
+    parser.add_argument("--questions", default=None,
+                        help="Text file with one question per line (default: built-in PM questions)")
+    parser.add_argument("--batch-size", type=int, default=GENERATION_BATCH_SIZE,
+                        help="Prompts padded into one generate() call")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=None,
+                        help="Instead of evaluating, report query_batch throughput at each batch size")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    questions = load_questions(args.questions)
+    if args.batch_sizes:
+        df_throughput = batch_throughput(ComplaintRAG(cache_size=0), questions, args.batch_sizes)
+        table = df_throughput.to_markdown(index=False)
+        logger.info(f"query_batch throughput over {len(questions)} questions:\n{table}")
+        with open(REPORTS_DIR / "batch_throughput.md", "w") as f:
+            f.write(f"# query_batch Throughput\n\nDate: {time.strftime('%Y-%m-%d')}\n\n{table}\n")
+        return
 
-def main():
-    rag = ComplaintRAG()
-    questions = load_questions()
+    recorder = StageRecorder()
+    rag = ComplaintRAG(hooks=[recorder])
     
-    df_results = evaluate_pipeline(rag, questions)
+    df_results = evaluate_pipeline(rag, questions, batch_size=args.batch_size)
+    stage_table = recorder.format_markdown()
+    logger.info(f"Stage latency:\n{stage_table}")
     
     # Save Report
     report_path = REPORTS_DIR / "rag_evaluation_enhanced.csv"
@@ -88,6 +163,7 @@ def main():
     with open(md_path, "w") as f:
         f.write(f"# RAG Enhanced Evaluation Report\n\nDate: {time.strftime('%Y-%m-%d')}\n\n")
         f.write(df_results.to_markdown(index=False))
+        f.write(f"\n\n## Stage Latency (per batch call)\n\n{stage_table}\n")
     logger.info(f"Markdown report saved to {md_path}")
 
 if __name__ == "__main__":
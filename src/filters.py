@@ -0,0 +1,249 @@
+import re
+import datetime
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Filter field -> chunk metadata key
+FILTER_FIELDS = {
+    'category': 'Category',
+    'product': 'Product',
+    'company': 'Company',
+    'state': 'State',
+}
+DATE_FIELD = 'Date received'
+# Numeric YYYYMMDD copy of DATE_FIELD stored on every chunk, since Chroma only range-filters numbers
+DATE_KEY = 'date_int'
+
+CATEGORY_KEYWORDS = {
+    'Credit Card': ('credit card', 'credit cards', 'prepaid card'),
+    'Personal Loan': ('personal loan', 'personal loans', 'payday loan', 'title loan'),
+    'Savings Account': ('savings account', 'savings accounts'),
+    'Money Transfer': ('money transfer', 'money transfers', 'wire transfer', 'remittance'),
+}
+
+US_STATES = {
+    'AL': 'Alabama', 'AK': 'Alaska', 'AZ': 'Arizona', 'AR': 'Arkansas', 'CA': 'California',
+    'CO': 'Colorado', 'CT': 'Connecticut', 'DE': 'Delaware', 'DC': 'District of Columbia',
+    'FL': 'Florida', 'GA': 'Georgia', 'HI': 'Hawaii', 'ID': 'Idaho', 'IL': 'Illinois',
+    'IN': 'Indiana', 'IA': 'Iowa', 'KS': 'Kansas', 'KY': 'Kentucky', 'LA': 'Louisiana',
+    'ME': 'Maine', 'MD': 'Maryland', 'MA': 'Massachusetts', 'MI': 'Michigan', 'MN': 'Minnesota',
+    'MS': 'Mississippi', 'MO': 'Missouri', 'MT': 'Montana', 'NE': 'Nebraska', 'NV': 'Nevada',
+    'NH': 'New Hampshire', 'NJ': 'New Jersey', 'NM': 'New Mexico', 'NY': 'New York',
+    'NC': 'North Carolina', 'ND': 'North Dakota', 'OH': 'Ohio', 'OK': 'Oklahoma', 'OR': 'Oregon',
+    'PA': 'Pennsylvania', 'PR': 'Puerto Rico', 'RI': 'Rhode Island', 'SC': 'South Carolina',
+    'SD': 'South Dakota', 'TN': 'Tennessee', 'TX': 'Texas', 'UT': 'Utah', 'VT': 'Vermont',
+    'VA': 'Virginia', 'WA': 'Washington', 'WV': 'West Virginia', 'WI': 'Wisconsin', 'WY': 'Wyoming',
+}
+# Words after a state name that make it part of a company name ("Washington Mutual", "Texas Capital Bank")
+_COMPANY_WORDS = (
+    'mutual', 'federal', 'bank', 'banks', 'bancorp', 'banking', 'capital', 'trust', 'financial', 'national',
+    'credit union', 'community', 'energy', 'power', 'gas', 'life', 'insurance', 'company', 'co', 'corp', 'inc',
+)
+# Longest names first so "West Virginia" wins over "Virginia"
+_STATE_NAMES = re.compile(
+    r'\b(' + '|'.join(sorted((re.escape(n) for n in US_STATES.values()), key=len, reverse=True)) + r')\b'
+    + r'(?!\s+(?:' + '|'.join(_COMPANY_WORDS) + r')\b)',
+    re.IGNORECASE,
+)
+# Codes that are also everyday words or abbreviations ("in OK shape", "from ME", "in CO") are only
+# recognized by their full name
+_AMBIGUOUS_CODES = ('CO', 'HI', 'ID', 'IN', 'LA', 'ME', 'OH', 'OK', 'OR')
+_STATE_CODES = re.compile(
+    r'\b(?:in|from) (' + '|'.join(code for code in US_STATES if code not in _AMBIGUOUS_CODES) + r')\b')
+_NAME_TO_CODE = {name.lower(): code for code, name in US_STATES.items()}
+_YEAR_RANGE = re.compile(r'\b(?:from|between) ((?:19|20)\d\d) (?:to|and|-) ((?:19|20)\d\d)\b')
+# Not "for": "charged for 2000 dollars" names an amount; nor a number followed by an amount word
+_YEAR = re.compile(
+    r'\b(?:in|during|since) ((?:19|20)\d\d)\b(?![.,]\d)(?!\s*(?:dollars?|usd|bucks|cents?|fees?|charges?)\b)')
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """
+    Structured restriction on which chunks a search may return.
+
+    Fields left empty do not filter; several values in one field match any
+    of them. Dates are inclusive ISO strings ('YYYY-MM-DD').
+
+    Attributes:
+        categories (Tuple[str, ...]): Normalized product categories (e.g. 'Credit Card').
+        products (Tuple[str, ...]): Raw CFPB product names.
+        companies (Tuple[str, ...]): Company names.
+        states (Tuple[str, ...]): Two-letter state codes.
+        date_from (str): Earliest 'Date received'.
+        date_to (str): Latest 'Date received'.
+    """
+    categories: Tuple[str, ...] = field(default_factory=tuple)
+    products: Tuple[str, ...] = field(default_factory=tuple)
+    companies: Tuple[str, ...] = field(default_factory=tuple)
+    states: Tuple[str, ...] = field(default_factory=tuple)
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return not (self.categories or self.products or self.companies or self.states
+                    or self.date_from or self.date_to)
+
+    def equality_terms(self) -> List[Tuple[str, Tuple[str, ...]]]:
+        """(metadata key, allowed values) for every non-empty field."""
+        values = {'category': self.categories, 'product': self.products,
+                  'company': self.companies, 'state': self.states}
+        return [(FILTER_FIELDS[name], allowed) for name, allowed in values.items() if allowed]
+
+    def describe(self) -> str:
+        """Short human-readable summary, e.g. 'Savings Account; TX; 2023-01-01 to 2023-12-31'."""
+        parts = [', '.join(allowed) for _, allowed in self.equality_terms()]
+        if self.date_from or self.date_to:
+            parts.append(f"{self.date_from or '...'} to {self.date_to or '...'}")
+        return '; '.join(parts)
+
+    @classmethod
+    def from_dict(cls, filters: Mapping[str, Any]) -> 'SearchFilter':
+        """
+        Builds a filter from keyword arguments such as
+        {'state': 'TX', 'category': ['Savings Account'], 'date_from': '2023-01-01'}.
+        Raises ValueError for unknown fields and dates that are not ISO dates.
+        """
+        unknown = set(filters) - set(FILTER_FIELDS) - {'date_from', 'date_to'}
+        if unknown:
+            raise ValueError(f"Unknown filter fields {sorted(unknown)}; "
+                             f"expected {sorted(FILTER_FIELDS) + ['date_from', 'date_to']}")
+
+        def values(name: str) -> Tuple[str, ...]:
+            value = filters.get(name)
+            if value is None:
+                return ()
+            return (value,) if isinstance(value, str) else tuple(value)
+
+        return cls(
+            categories=values('category'),
+            products=values('product'),
+            companies=values('company'),
+            states=tuple(s.upper() for s in values('state')),
+            date_from=_iso_date('date_from', filters.get('date_from')),
+            date_to=_iso_date('date_to', filters.get('date_to')),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The from_dict form of this filter (JSON-serializable), e.g. for the HTTP API."""
+        values = {'category': self.categories, 'product': self.products,
+                  'company': self.companies, 'state': self.states}
+        filters: Dict[str, Any] = {name: list(allowed) for name, allowed in values.items() if allowed}
+        for name in ('date_from', 'date_to'):
+            if getattr(self, name):
+                filters[name] = getattr(self, name)
+        return filters
+
+def _iso_date(name: str, value: Any) -> Optional[str]:
+    """A date_from/date_to value as 'YYYY-MM-DD'; ValueError unless it is an ISO date."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime.date):
+        return value.strftime('%Y-%m-%d')
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an ISO date (YYYY-MM-DD), not {value!r}") from None
+
+def date_key(value: Any) -> Optional[int]:
+    """'2023-05-10' (or a Timestamp) -> 20230510; None for missing or unparseable dates."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    digits = str(value)[:10].replace('-', '')
+    return int(digits) if len(digits) == 8 and digits.isdigit() else None
+
+def to_chroma_where(search_filter: Optional[SearchFilter]) -> Optional[Dict[str, Any]]:
+    """Translates a SearchFilter into a Chroma `where` clause (None if it does not filter)."""
+    if search_filter is None or search_filter.is_empty():
+        return None
+    clauses = [{key: {'$in': list(allowed)}} for key, allowed in search_filter.equality_terms()]
+    if search_filter.date_from:
+        clauses.append({DATE_KEY: {'$gte': date_key(search_filter.date_from)}})
+    if search_filter.date_to:
+        clauses.append({DATE_KEY: {'$lte': date_key(search_filter.date_to)}})
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+def parse_filter(question: str) -> SearchFilter:
+    """
+    Extracts an explicit filter from a question, e.g. "savings account
+    complaints in Texas in 2023" -> category Savings Account, state TX,
+    2023-01-01..2023-12-31. Only unambiguous mentions are used.
+    """
+    lowered = question.lower()
+    categories = tuple(
+        category for category, keywords in CATEGORY_KEYWORDS.items()
+        if any(re.search(r'\b' + re.escape(k) + r'\b', lowered) for k in keywords)
+    )
+    states = [_NAME_TO_CODE[m.lower()] for m in _STATE_NAMES.findall(question)]
+    states += _STATE_CODES.findall(question)
+
+    date_from = date_to = None
+    span = _YEAR_RANGE.search(lowered)
+    if span:
+        date_from, date_to = f"{span.group(1)}-01-01", f"{span.group(2)}-12-31"
+    else:
+        years = _YEAR.findall(lowered)
+        if years:
+            date_from, date_to = f"{min(years)}-01-01", f"{max(years)}-12-31"
+            if re.search(r'\bsince ' + min(years), lowered):
+                date_to = None
+    return SearchFilter(categories=categories, states=tuple(dict.fromkeys(states)),
+                        date_from=date_from, date_to=date_to)
+
+class MetadataIndex:
+    """
+    Inverted index over chunk metadata: for every filter field, each value
+    maps to the sorted row numbers holding it, and dates are kept as a
+    sorted YYYYMMDD column with a row permutation. A filter is answered by
+    set operations on those arrays, without touching any vector.
+    """
+
+    def __init__(self, metadata: "pd.DataFrame"):
+        # pandas is only needed by the in-process indexes, so it is not imported with the query path
+        import pandas as pd
+
+        self.count = len(metadata)
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {}
+        for key in FILTER_FIELDS.values():
+            if key not in metadata.columns:
+                continue
+            codes, uniques = pd.factorize(metadata[key], use_na_sentinel=True)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.postings[key] = {
+                str(value): order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)
+            }
+        dates = metadata[DATE_KEY] if DATE_KEY in metadata.columns else pd.Series([], dtype=float)
+        dates = pd.to_numeric(dates, errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+        self._date_order = np.argsort(dates, kind='stable')
+        self._sorted_dates = dates[self._date_order]
+
+    @classmethod
+    def from_records(cls, records: List[Mapping[str, Any]]) -> 'MetadataIndex':
+        import pandas as pd
+
+        columns = list(FILTER_FIELDS.values()) + [DATE_KEY]
+        return cls(pd.DataFrame([{c: r.get(c) for c in columns} for r in records], columns=columns))
+
+    def rows(self, search_filter: SearchFilter) -> Optional[np.ndarray]:
+        """Sorted row numbers matching the filter, or None when it does not filter at all."""
+        if search_filter is None or search_filter.is_empty():
+            return None
+        result = None
+        for key, allowed in search_filter.equality_terms():
+            postings = self.postings.get(key, {})
+            matches = [postings[v] for v in allowed if v in postings]
+            rows = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int64)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        if search_filter.date_from or search_filter.date_to:
+            low = date_key(search_filter.date_from) if search_filter.date_from else 0
+            high = date_key(search_filter.date_to) if search_filter.date_to else 99991231
+            start = np.searchsorted(self._sorted_dates, low, side='left')
+            stop = np.searchsorted(self._sorted_dates, high, side='right')
+            rows = np.sort(self._date_order[start:stop])
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        return result
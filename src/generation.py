@@ -0,0 +1,234 @@
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import src.config as cfg
+
+logger = logging.getLogger(__name__)
+
+# Generation backends selectable through cfg.GENERATION_BACKEND
+GENERATION_BACKENDS = ('torch', 'int8', 'onnx')
+
+# File layout written by `optimum-cli export onnx --task text2text-generation-with-past`
+ENCODER_FILE = 'encoder_model.onnx'
+DECODER_FILE = 'decoder_model.onnx'
+DECODER_WITH_PAST_FILE = 'decoder_with_past_model.onnx'
+
+def configure_torch_threads(intra_op: int = cfg.INTRA_OP_THREADS, inter_op: int = cfg.INTER_OP_THREADS):
+    """Applies the thread settings to PyTorch (0 keeps its default)."""
+    import torch
+
+    if intra_op > 0:
+        torch.set_num_threads(intra_op)
+    if inter_op > 0:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            # Only allowed before the first inter-op parallel work in the process
+            logger.warning("Inter-op threads already fixed for this process; INTER_OP_THREADS ignored")
+
+def session_options(intra_op: int = cfg.INTRA_OP_THREADS, inter_op: int = cfg.INTER_OP_THREADS) -> Any:
+    """ONNX Runtime options with full graph optimization and the given thread counts (0 keeps the default)."""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op > 0:
+        options.intra_op_num_threads = intra_op
+    if inter_op > 0:
+        options.inter_op_num_threads = inter_op
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return options
+
+def inference_session(path: str, options: Any) -> Any:
+    import onnxruntime as ort
+
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+def quantize_onnx_file(path: str):
+    """Replaces an exported model with its int8 dynamically quantized version."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(path, path + '.int8', weight_type=QuantType.QInt8)
+    os.replace(path + '.int8', path)
+
+def onnx_model_dir(model_name: str, directory: str = str(cfg.ONNX_MODEL_DIR)) -> str:
+    return os.path.join(directory, model_name.replace('/', '--'))
+
+class StopOnEvent:
+    """
+    Stopping criterion that ends generate() once `event` is set, e.g. when
+    the reader of a stream goes away. Works with both the transformers
+    models (inside a StoppingCriteriaList) and OnnxSeq2SeqGenerator.
+    """
+
+    def __init__(self, event: Any):
+        self.event = event
+
+    def __call__(self, input_ids: Any, scores: Any, **kwargs) -> bool:
+        return self.event.is_set()
+
+class OnnxSeq2SeqGenerator:
+    """
+    Greedy seq2seq decoding on ONNX Runtime, without PyTorch.
+
+    The encoder runs once per batch. The first decoder step also returns the
+    cross-attention keys/values, which are then reused for every later
+    step; each later step feeds only the newest token plus the self-attention
+    cache to the with-past decoder. generate() mirrors the part of
+    transformers' generate() the pipeline uses (NumPy inputs, `max_length`
+    counting the decoder start token, an optional streamer and stopping
+    criteria), so it returns
+    the same token IDs as greedy decoding with the PyTorch model.
+    """
+    tensor_type = "np" # inputs the pipeline tokenizes for generate()
+
+    def __init__(self, encoder: Any, decoder: Any, decoder_with_past: Any, config: Dict[str, Any]):
+        self.encoder = encoder
+        self.decoder = decoder
+        self.decoder_with_past = decoder_with_past
+        self.decoder_start_token_id = config['decoder_start_token_id']
+        self.eos_token_id = config['eos_token_id']
+        self.pad_token_id = config['pad_token_id']
+        self._input_names = {
+            session: {i.name for i in session.get_inputs()}
+            for session in (encoder, decoder, decoder_with_past)
+        }
+
+    @classmethod
+    def load(cls, path: str, intra_op: int = cfg.INTRA_OP_THREADS,
+             inter_op: int = cfg.INTER_OP_THREADS) -> 'OnnxSeq2SeqGenerator':
+        """Opens an exported model directory (see export_onnx) with the given thread counts."""
+        options = session_options(intra_op, inter_op)
+
+        def session(name: str):
+            return inference_session(os.path.join(path, name), options)
+
+        with open(os.path.join(path, 'config.json')) as f:
+            config = json.load(f)
+        return cls(session(ENCODER_FILE), session(DECODER_FILE), session(DECODER_WITH_PAST_FILE), config)
+
+    def _run(self, session: Any, feeds: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        names = [o.name for o in session.get_outputs()]
+        wanted = self._input_names[session]
+        values = session.run(names, {k: v for k, v in feeds.items() if k in wanted})
+        return dict(zip(names, values))
+
+    def generate(self, input_ids: np.ndarray, attention_mask: Optional[np.ndarray] = None,
+                 max_length: int = cfg.GENERATION_MAX_LENGTH, streamer: Any = None,
+                 stopping_criteria: Optional[List[Callable[..., bool]]] = None, **kwargs) -> np.ndarray:
+        """
+        Greedy decoding of a padded batch. Decoding also stops as soon as any
+        of `stopping_criteria` (called as criterion(generated_ids, None)) is true.
+
+        Returns:
+            np.ndarray: (batch, <= max_length) token IDs, starting with the decoder start
+            token; finished rows are padded.
+        """
+        input_ids = np.asarray(input_ids, dtype=np.int64)
+        if attention_mask is None:
+            attention_mask = np.ones_like(input_ids)
+        attention_mask = np.asarray(attention_mask, dtype=np.int64)
+        hidden = self._run(self.encoder, {'input_ids': input_ids, 'attention_mask': attention_mask})
+        feeds = {'encoder_hidden_states': hidden['last_hidden_state'], 'encoder_attention_mask': attention_mask}
+
+        tokens = np.full((len(input_ids), 1), self.decoder_start_token_id, dtype=np.int64)
+        generated = [tokens]
+        if streamer is not None:
+            streamer.put(tokens[0])
+        finished = np.zeros(len(input_ids), dtype=bool)
+        session = self.decoder
+        for _ in range(max_length - 1):
+            outputs = self._run(session, {**feeds, 'input_ids': tokens})
+            next_tokens = outputs['logits'][:, -1, :].argmax(axis=-1)
+            next_tokens = np.where(finished, self.pad_token_id, next_tokens)
+            finished |= next_tokens == self.eos_token_id
+            tokens = next_tokens[:, None].astype(np.int64)
+            generated.append(tokens)
+            if streamer is not None:
+                streamer.put(tokens[0])
+            if finished.all():
+                break
+            if stopping_criteria and any(criterion(tokens, None) for criterion in stopping_criteria):
+                break
+            # present.* of this step are the past_key_values.* of the next; cross-attention
+            # entries only come out of the first step and stay in `feeds` from then on
+            feeds.update({'past_key_values' + name[len('present'):]: value
+                          for name, value in outputs.items() if name.startswith('present')})
+            session = self.decoder_with_past
+        if streamer is not None:
+            streamer.end()
+        return np.concatenate(generated, axis=1)
+
+def export_onnx(model_name: str = cfg.LLM_MODEL_NAME, directory: str = str(cfg.ONNX_MODEL_DIR),
+                int8: bool = False) -> str:
+    """
+    Exports encoder, decoder and with-past decoder with optimum, optionally
+    quantizing their weights to int8 (onnxruntime dynamic quantization).
+
+    Returns:
+        str: The model directory OnnxSeq2SeqGenerator.load reads.
+    """
+    from optimum.exporters.onnx import main_export
+
+    path = onnx_model_dir(model_name, directory)
+    start = time.perf_counter()
+    # Unmerged decoders, so the first step and the cached steps are separate sessions
+    main_export(model_name, output=path, task='text2text-generation-with-past', no_post_process=True)
+    if int8:
+        for name in (ENCODER_FILE, DECODER_FILE, DECODER_WITH_PAST_FILE):
+            quantize_onnx_file(os.path.join(path, name))
+    logger.info(f"Exported {model_name} to {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+def load_generation_model(model_name: str = cfg.LLM_MODEL_NAME, backend: str = cfg.GENERATION_BACKEND,
+                          snapshot: bool = cfg.USE_LLM_SNAPSHOT, intra_op: int = cfg.INTRA_OP_THREADS) -> Any:
+    """
+    The generation model for `backend`:
+
+    - 'torch': the fp32 PyTorch model (from the startup snapshot if there is one).
+    - 'int8': the same model with its Linear layers dynamically quantized to int8,
+      which roughly halves CPU matmul time at a small accuracy cost.
+    - 'onnx': an OnnxSeq2SeqGenerator over the export in cfg.ONNX_MODEL_DIR.
+
+    `intra_op` threads per operator (0 = runtime default); inter-op threads
+    come from cfg.INTER_OP_THREADS.
+    """
+    if backend not in GENERATION_BACKENDS:
+        raise ValueError(f"Unknown generation backend '{backend}'; expected one of {GENERATION_BACKENDS}")
+    if backend == 'onnx':
+        path = onnx_model_dir(model_name)
+        if not os.path.exists(os.path.join(path, ENCODER_FILE)):
+            raise FileNotFoundError(f"No ONNX export at {path}; run `python -m src.generation --export`")
+        return OnnxSeq2SeqGenerator.load(path, intra_op)
+
+    import torch
+    from transformers import AutoModelForSeq2SeqLM
+    from src.startup import load_model_snapshot
+
+    configure_torch_threads(intra_op)
+    model = load_model_snapshot(model_name) if snapshot else None
+    if model is None:
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    model.eval()
+    if backend == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export flan-t5 for the ONNX Runtime generation backend.")
+    parser.add_argument('--export', action='store_true', help="Export the model to cfg.ONNX_MODEL_DIR.")
+    parser.add_argument('--int8', action='store_true', help="Quantize the exported weights to int8.")
+    parser.add_argument('--model', default=cfg.LLM_MODEL_NAME)
+    args = parser.parse_args(argv)
+    if not args.export:
+        parser.error("nothing to do; pass --export")
+    print(f"ONNX model written to {export_onnx(args.model, int8=args.int8)}")
+
+if __name__ == "__main__":
+    main()
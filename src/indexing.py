@@ -0,0 +1,270 @@
+import hashlib
+import logging
+import math
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.dedup import DUPLICATES_COLUMN
+from src.filters import DATE_FIELD, DATE_KEY, date_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBED_BATCH_SIZE = 64
+DEFAULT_INSERT_BATCH_SIZE = 1024
+DEFAULT_PAGE_SIZE = 10000
+# Metadata that can change while a complaint's text does not; covered by the stored content hash
+TRACKED_METADATA = (DUPLICATES_COLUMN,)
+
+@dataclass
+class IndexingStats:
+    """
+    Throughput counters for an indexing run.
+
+    Attributes:
+        chunks (int): Chunks embedded and inserted.
+        batches (int): Insert batches written to the store.
+        embed_seconds (float): Time from submitting each batch's embeddings until all were ready.
+        insert_seconds (float): Wall time spent inserting into the store.
+        wall_seconds (float): End-to-end wall time.
+    """
+    chunks: int = 0
+    batches: int = 0
+    embed_seconds: float = 0.0
+    insert_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.wall_seconds if self.wall_seconds else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.chunks} chunks in {self.batches} batches, {self.wall_seconds:.1f}s "
+                f"({self.chunks_per_sec:.1f} chunks/sec; embed {self.embed_seconds:.1f}s, "
+                f"insert {self.insert_seconds:.1f}s)")
+
+@dataclass
+class SyncStats:
+    """
+    Outcome of an incremental index update.
+
+    Attributes:
+        added (int): Chunks whose ID was not in the store.
+        updated (int): Chunks whose ID existed but whose content hash changed.
+        unchanged (int): Chunks skipped because the stored hash matched.
+        deleted (int): Stored chunks that no longer exist in the source data.
+        indexing (IndexingStats): Embedding/insert counters for added + updated chunks.
+    """
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    indexing: IndexingStats = field(default_factory=IndexingStats)
+
+    def summary(self) -> str:
+        return (f"{self.added} added, {self.updated} updated, {self.unchanged} unchanged, "
+                f"{self.deleted} deleted; {self.indexing.summary()}")
+
+def content_hash(text: str) -> str:
+    """Short, stable fingerprint of a chunk's text."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+def assign_chunk_id(chunk: Document, chunk_index: int) -> Document:
+    """
+    Gives a chunk a stable ID, '<Complaint ID>-<chunk index>', and records its
+    index and content hash in the metadata. Re-chunking the same complaint
+    yields the same IDs, so the hash tells whether a chunk actually changed.
+    The hash also covers TRACKED_METADATA, so a complaint whose duplicate
+    count changed is rewritten too. Chunks without a Complaint ID fall back
+    to the hash of their text. A numeric copy of 'Date received' is added so
+    date ranges can be filtered.
+    """
+    digest = content_hash(chunk.page_content)
+    complaint_id = chunk.metadata.get('Complaint ID')
+    if complaint_id is None or (isinstance(complaint_id, float) and math.isnan(complaint_id)):
+        complaint_id = f"h{digest}"
+    chunk.id = f"{complaint_id}-{chunk_index}"
+    chunk.metadata['chunk_index'] = chunk_index
+    tracked = [f"{key}={chunk.metadata[key]}" for key in TRACKED_METADATA if key in chunk.metadata]
+    chunk.metadata['content_hash'] = content_hash('\0'.join([chunk.page_content] + tracked)) if tracked else digest
+    date = date_key(chunk.metadata.get(DATE_FIELD))
+    if date is not None:
+        chunk.metadata[DATE_KEY] = date
+    return chunk
+
+def iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Groups any iterable into lists of at most `batch_size` items without materializing it."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def split_cpu_threads(workers: int) -> int:
+    """
+    Gives each embedding worker an equal share of the CPU cores so that
+    `workers` concurrent torch forward passes do not oversubscribe the host.
+
+    Returns:
+        int: Threads per worker, for engines configured per session (ONNX Runtime).
+    """
+    threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    try:
+        import torch
+    except ImportError:
+        return threads
+    torch.set_num_threads(threads)
+    return threads
+
+def clean_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Drops missing values and unwraps numpy scalars so the store accepts the metadata."""
+    cleaned = {}
+    for key, value in metadata.items():
+        if hasattr(value, 'item'):
+            value = value.item()
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            continue
+        cleaned[key] = value
+    return cleaned
+
+def insert_embeddings(vector_store, documents: List[Document], vectors: List[List[float]],
+                      ids: Optional[List[str]] = None):
+    """Bulk-writes pre-computed embeddings into a langchain Chroma store in one call."""
+    if ids is None:
+        ids = [d.id or str(uuid.uuid4()) for d in documents]
+    vector_store._collection.upsert(
+        ids=ids,
+        embeddings=vectors,
+        documents=[d.page_content for d in documents],
+        metadatas=[clean_metadata(d.metadata) or None for d in documents],
+    )
+
+def index_documents(documents: Iterable[Document],
+                    embeddings: Embeddings,
+                    vector_store,
+                    embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+                    insert_batch_size: int = DEFAULT_INSERT_BATCH_SIZE,
+                    workers: int = 1) -> IndexingStats:
+    """
+    Embeds and indexes a stream of chunks in fixed-size batches.
+
+    Each insert batch is split into embedding batches of `embed_batch_size`
+    that run on a pool of `workers` threads (torch releases the GIL inside
+    the forward pass, and threads share one copy of the model). While one
+    insert batch is being embedded, the previous one is written to the store,
+    so embedding and insertion overlap.
+
+    Args:
+        documents (Iterable[Document]): Chunks to index; consumed lazily.
+        embeddings (Embeddings): Embedding function.
+        vector_store: langchain Chroma store to write into.
+        embed_batch_size (int): Texts per embed_documents call.
+        insert_batch_size (int): Chunks per bulk insert.
+        workers (int): Embedding threads.
+
+    Returns:
+        IndexingStats: Counters for the whole run.
+    """
+    stats = IndexingStats()
+    start = time.perf_counter()
+
+    def embed(texts: List[str]) -> List[List[float]]:
+        return embeddings.embed_documents(texts)
+
+    def flush(batch: List[Document], futures: List, submitted: float):
+        vectors = [v for future in futures for v in future.result()]
+        embedded = time.perf_counter()
+        insert_embeddings(vector_store, batch, vectors)
+        inserted = time.perf_counter()
+
+        embed_seconds = embedded - submitted
+        insert_seconds = inserted - embedded
+        stats.chunks += len(batch)
+        stats.batches += 1
+        stats.embed_seconds += embed_seconds
+        stats.insert_seconds += insert_seconds
+        stats.wall_seconds = inserted - start
+        logger.info(f"Batch {stats.batches}: {len(batch)} chunks, embed {embed_seconds:.2f}s, "
+                    f"insert {insert_seconds:.2f}s, {stats.chunks} total ({stats.chunks_per_sec:.1f} chunks/sec)")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = None
+        for batch in iter_batches(documents, insert_batch_size):
+            texts = [d.page_content for d in batch]
+            submitted = time.perf_counter()
+            futures = [executor.submit(embed, sub) for sub in iter_batches(texts, embed_batch_size)]
+            if pending:
+                flush(*pending)
+            pending = (batch, futures, submitted)
+        if pending:
+            flush(*pending)
+
+    stats.wall_seconds = time.perf_counter() - start
+    return stats
+
+def stored_content_hashes(vector_store, page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, Optional[str]]:
+    """Reads every chunk ID in the store with its recorded content hash, one page at a time."""
+    hashes = {}
+    offset = 0
+    while True:
+        page = vector_store._collection.get(include=['metadatas'], limit=page_size, offset=offset)
+        for chunk_id, metadata in zip(page['ids'], page['metadatas']):
+            hashes[chunk_id] = (metadata or {}).get('content_hash')
+        if len(page['ids']) < page_size:
+            return hashes
+        offset += page_size
+
+def sync_documents(chunks: Iterable[Document],
+                   embeddings: Embeddings,
+                   vector_store,
+                   embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+                   insert_batch_size: int = DEFAULT_INSERT_BATCH_SIZE,
+                   workers: int = 1) -> SyncStats:
+    """
+    Brings an existing store in line with `chunks` while embedding only the delta.
+
+    Chunks must carry stable IDs (see assign_chunk_id). New IDs are added,
+    IDs whose content hash changed are upserted, matching ones are skipped,
+    and stored IDs that no longer appear in `chunks` are deleted.
+
+    Returns:
+        SyncStats: Counts per outcome plus indexing throughput.
+    """
+    stats = SyncStats()
+    stored = stored_content_hashes(vector_store)
+    logger.info(f"Vector store holds {len(stored)} chunks")
+    seen = set()
+
+    def changed_chunks() -> Iterator[Document]:
+        for chunk in chunks:
+            seen.add(chunk.id)
+            if chunk.id not in stored:
+                stats.added += 1
+            elif stored[chunk.id] != chunk.metadata.get('content_hash'):
+                stats.updated += 1
+            else:
+                stats.unchanged += 1
+                continue
+            yield chunk
+
+    stats.indexing = index_documents(
+        changed_chunks(), embeddings, vector_store,
+        embed_batch_size=embed_batch_size,
+        insert_batch_size=insert_batch_size,
+        workers=workers,
+    )
+
+    stale = [chunk_id for chunk_id in stored if chunk_id not in seen]
+    for batch in iter_batches(stale, insert_batch_size):
+        vector_store._collection.delete(ids=batch)
+    stats.deleted = len(stale)
+    return stats
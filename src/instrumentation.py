@@ -0,0 +1,168 @@
+import cProfile
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+import src.config as cfg
+
+logger = logging.getLogger(__name__)
+
+# Called once per completed stage with (stage name, seconds, extra info such as token counts)
+StageHook = Callable[[str, float, Dict[str, Any]], None]
+
+# Pipeline stages in execution order, used to order reports; "first_token" is the
+# time-to-first-token of streamed answers
+STAGES = [
+    "cache_lookup",
+    "embed_query",
+    "vector_search",
+    "sparse_search",
+    "rerank",
+    "prompt_build",
+    "queue_wait",
+    "tokenize",
+    "generate",
+    "decode",
+    "first_token",
+]
+
+class StageRecorder:
+    """
+    StageHook that keeps every observed duration so percentiles can be reported.
+
+    Register it with `ComplaintRAG(hooks=[recorder])` or `rag.add_hook(recorder)`.
+    """
+
+    def __init__(self):
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._tokens: Dict[str, List[int]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str, seconds: float, info: Dict[str, Any]):
+        with self._lock:
+            self._samples[stage].append(seconds)
+            for key, value in info.items():
+                if key.endswith("_tokens"):
+                    self._tokens[key].append(int(value))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._tokens.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage count, mean, p50 and p95 in seconds, in pipeline order."""
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+        order = [s for s in STAGES if s in samples] + sorted(s for s in samples if s not in STAGES)
+        summary = {}
+        for stage in order:
+            values = np.array(samples[stage])
+            summary[stage] = {
+                "count": int(len(values)),
+                "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+            }
+        return summary
+
+    def token_summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            tokens = {key: list(values) for key, values in self._tokens.items()}
+        return {
+            key: {"mean": float(np.mean(values)), "max": int(np.max(values))}
+            for key, values in tokens.items()
+        }
+
+    def format_markdown(self) -> str:
+        """Renders the summary as a Markdown table (milliseconds)."""
+        summary = self.summary()
+        if not summary:
+            return "_No queries timed yet._"
+        lines = ["| Stage | Count | p50 (ms) | p95 (ms) |", "|---|---|---|---|"]
+        for stage, stats in summary.items():
+            lines.append(f"| {stage} | {stats['count']} | {stats['p50'] * 1000:.1f} | {stats['p95'] * 1000:.1f} |")
+        return "\n".join(lines)
+
+class StageTimer:
+    """
+    Times pipeline stages for one query, stores them in `timings` and forwards
+    each one to the registered hooks. A failing hook is logged, never raised.
+    """
+
+    def __init__(self, hooks: List[StageHook], timings: Optional[Dict[str, float]] = None):
+        self.hooks = hooks
+        self.timings = timings if timings is not None else {}
+
+    @contextmanager
+    def stage(self, name: str, **info) -> Iterator[Dict[str, Any]]:
+        """
+        Context manager timing one stage. The yielded dict can be filled with
+        extra info (e.g. token counts) that is passed on to the hooks. A stage
+        that raises is still recorded, with info["failed"] = True.
+        """
+        start = time.perf_counter()
+        try:
+            yield info
+        except BaseException:
+            info["failed"] = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, **info)
+
+    def record(self, name: str, seconds: float, **info):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        for hook in self.hooks:
+            try:
+                hook(name, seconds, info)
+            except Exception as e:
+                logger.warning(f"Stage hook failed for '{name}': {e}")
+
+@contextmanager
+def profiled(enabled: bool, label: str = "query", output_dir: str = str(cfg.PROFILE_DIR)) -> Iterator[None]:
+    """
+    Runs the enclosed block under cProfile when `enabled` and dumps the stats
+    to `<output_dir>/<label>-<timestamp>.prof` (open with snakeviz or pstats).
+    """
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Python 3.12+ allows one active cProfile at a time; concurrent queries run unprofiled
+        logger.warning(f"Not profiling {label}: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**6}.prof")
+        profiler.dump_stats(path)
+        logger.info(f"Profile written to {path}")
+
+def process_uptime() -> float:
+    """
+    Seconds since this process started, from /proc (Linux only; 0.0
+    elsewhere). Read right after an entry point's imports, it covers
+    interpreter start-up plus those imports, without timing code having to
+    run before the import block.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 (start time in clock ticks since boot); the command name may contain spaces
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import src.config as cfg
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, used as the cache key."""
+    return _WHITESPACE.sub(' ', question).strip().lower()
+
+def store_fingerprint(path: str) -> Tuple:
+    """
+    Cheap fingerprint of an on-disk index: (relative path, size, mtime) of
+    every file under `path`. Any write to the store changes it.
+    """
+    entries = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            full = os.path.join(root, name)
+            try:
+                st = os.stat(full)
+            except FileNotFoundError:
+                continue
+            entries.append((os.path.relpath(full, path), st.st_size, st.st_mtime_ns))
+    return tuple(sorted(entries))
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live.
+
+    Attributes:
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that found nothing (or only an expired entry).
+        expirations (int): Entries dropped because their TTL elapsed.
+        evictions (int): Entries dropped to respect `max_entries`.
+        invalidations (int): Times the whole cache was cleared.
+    """
+
+    def __init__(self,
+                 max_entries: int = cfg.QUERY_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = cfg.QUERY_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic,
+                 fingerprint_ttl: float = cfg.QUERY_CACHE_FINGERPRINT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.fingerprint_ttl = fingerprint_ttl
+        self._clock = clock
+        self._fingerprint_checked: Optional[float] = None
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self._clock() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def check_fingerprint(self, fingerprint: Hashable):
+        """Clears the cache if `fingerprint` differs from the one seen last time."""
+        if self._fingerprint is not None and fingerprint != self._fingerprint:
+            self.clear()
+        self._fingerprint = fingerprint
+
+    def refresh_fingerprint(self, compute: Callable[[], Hashable]):
+        """
+        check_fingerprint(compute()), at most once per `fingerprint_ttl`
+        seconds, so lookups do not stat the whole store every time.
+        """
+        now = self._clock()
+        if self._fingerprint_checked is not None and now - self._fingerprint_checked < self.fingerprint_ttl:
+            return
+        self._fingerprint_checked = now
+        self.check_fingerprint(compute())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -1,19 +1,196 @@
 
+import asyncio
+import importlib
 import logging
-from typing import Optional, List, Dict, Any
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings, HuggingFacePipeline
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Tuple, Iterator, Callable, Mapping, Union
+import numpy as np
 from langchain_core.documents import Document
 import src.config as cfg
+from src.query_cache import QueryCache, normalize_question, store_fingerprint
+from src.instrumentation import StageHook, StageTimer, profiled
+from src.batching import GenerationBatcher
+from src.filters import SearchFilter, parse_filter, to_chroma_where
+from src.rerank import Reranker, load_reranker
+from src.context import ContextBuilder
+from src.startup import snapshot_tokenizer_path
+from src.generation import load_generation_model
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.prompts import PromptTemplate
+    from src.sparse_index import BM25Index
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Heavy dependencies (langchain integrations, transformers, Chroma, the index
+# modules) are imported on first use, so importing this module stays fast.
+# They still read as attributes of this module, e.g. for mock.patch.
+_LAZY_IMPORTS = {
+    'Chroma': ('langchain_chroma', 'Chroma'),
+    'HuggingFaceEmbeddings': ('langchain_huggingface', 'HuggingFaceEmbeddings'),
+    'HuggingFacePipeline': ('langchain_huggingface', 'HuggingFacePipeline'),
+    'AutoTokenizer': ('transformers', 'AutoTokenizer'),
+    'AutoModelForSeq2SeqLM': ('transformers', 'AutoModelForSeq2SeqLM'),
+    'pipeline': ('transformers', 'pipeline'),
+    'TextIteratorStreamer': ('transformers', 'TextIteratorStreamer'),
+    'StoppingCriteriaList': ('transformers', 'StoppingCriteriaList'),
+    'PromptTemplate': ('langchain_core.prompts', 'PromptTemplate'),
+    'RunnablePassthrough': ('langchain_core.runnables', 'RunnablePassthrough'),
+    'RunnableLambda': ('langchain_core.runnables', 'RunnableLambda'),
+    'StrOutputParser': ('langchain_core.output_parsers', 'StrOutputParser'),
+    'cached_embeddings': ('src.embeddings', 'cached_embeddings'),
+    'DeferredEmbeddings': ('src.embeddings', 'DeferredEmbeddings'),
+    'load_embeddings': ('src.embedding_engine', 'load_embeddings'),
+    'cache_model_name': ('src.embedding_engine', 'cache_model_name'),
+    'IndexVectorStore': ('src.vector_index', 'IndexVectorStore'),
+    'load_index': ('src.vector_index', 'load_index'),
+    'BM25Index': ('src.sparse_index', 'BM25Index'),
+    'reciprocal_rank_fusion': ('src.sparse_index', 'reciprocal_rank_fusion'),
+    'SPARSE_META_FILE': ('src.sparse_index', 'SPARSE_META_FILE'),
+    'StopOnEvent': ('src.generation', 'StopOnEvent'),
+}
+
+def _import(name: str) -> Any:
+    """Module attribute `name`, importing it on first use (a patched attribute wins)."""
+    value = globals().get(name)
+    if value is None:
+        module, attribute = _LAZY_IMPORTS[name]
+        value = globals()[name] = getattr(importlib.import_module(module), attribute)
+    return value
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_IMPORTS:
+        return _import(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def import_dependencies() -> float:
+    """
+    Imports every deferred dependency now. Imports hold the interpreter lock,
+    so startup.start() runs this once before loading models in parallel.
+
+    Returns:
+        float: Seconds spent importing.
+    """
+    start = time.perf_counter()
+    for name in _LAZY_IMPORTS:
+        _import(name)
+    return time.perf_counter() - start
+
+PROMPT_TEMPLATE = """
+            You are a helpful financial analyst assistant for CrediTrust. 
+            Answer the question based ONLY on the following context. 
+            If the answer is not in the context, say "I don't have enough information."
+            
+            Context:
+            {context}
+            
+            Question: 
+            {question}
+            
+            Answer:
+            """
+
+# Stages summed into the "retrieval" and "generation" subtotals of RAGResult.timings
+RETRIEVAL_STAGES = ("embed_query", "vector_search", "sparse_search", "rerank")
+GENERATION_STAGES = ("prompt_build", "tokenize", "generate", "decode")
+
+@dataclass
+class RAGResult:
+    """
+    Result of a single RAG query.
+
+    Attributes:
+        question (str): The question that was asked.
+        answer (str): Generated answer.
+        sources (List[Document]): Exact documents that were fed to the LLM.
+        timings (Dict[str, float]): Seconds per stage ("embed_query", "vector_search",
+            "prompt_build", "tokenize", "generate", "decode"), their "retrieval" and
+            "generation" subtotals, and the "total".
+        tokens (Dict[str, int]): "input_tokens" fed to the LLM and "output_tokens" generated;
+            with a context budget also "prompt_tokens", "context_tokens", "context_docs",
+            "docs_trimmed" and "docs_dropped" (see context.PromptContext).
+        cached (bool): True if the result was served from the query cache.
+        filters (SearchFilter): Metadata filter the retrieval was restricted to, if any.
+    """
+    question: str
+    answer: str
+    sources: List[Document] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    tokens: Dict[str, int] = field(default_factory=dict)
+    cached: bool = False
+    filters: Optional[SearchFilter] = None
+
+# Accepted wherever a query takes `filters`: a SearchFilter or its dict form, e.g. {"state": "TX"}
+Filters = Union[SearchFilter, Mapping[str, Any], None]
+
+_STREAM_DONE = object()
+
+
+class RAGStream:
+    """
+    Answer to one question that is generated while it is being read.
+
+    `sources` is filled in before generation starts. Iterating (sync or
+    async) yields answer text as it is decoded, and once the iteration is
+    exhausted `result` holds the complete RAGResult. `filters` is the
+    metadata filter retrieval was restricted to, if any.
+
+    A reader that stops early (breaks out, closes the iterator or raises)
+    cancels the generation behind the stream; cancel() does so explicitly.
+    """
+
+    def __init__(self, question: str, sources: List[Document], pieces: Iterator[str],
+                 finish: Callable[[str], RAGResult], filters: Optional[SearchFilter] = None,
+                 cancel: Optional[threading.Event] = None):
+        self.question = question
+        self.sources = sources
+        self.filters = filters
+        self.result: Optional[RAGResult] = None
+        self._pieces = pieces
+        self._finish = finish
+        self._cancel = cancel
+
+    def cancel(self):
+        """Stops generating: the model halts at its next decoding step."""
+        if self._cancel is not None:
+            self._cancel.set()
+
+    def __iter__(self) -> Iterator[str]:
+        answer = []
+        try:
+            for piece in self._pieces:
+                answer.append(piece)
+                yield piece
+        except BaseException:
+            # GeneratorExit when the reader closes the stream early
+            self.cancel()
+            raise
+        self.result = self._finish("".join(answer))
+
+    async def __aiter__(self):
+        # Each next() may block on the model, so it runs off the event loop
+        iterator = iter(self)
+        loop = asyncio.get_running_loop()
+        done = False
+        try:
+            while True:
+                piece = await loop.run_in_executor(None, next, iterator, _STREAM_DONE)
+                if piece is _STREAM_DONE:
+                    done = True
+                    return
+                yield piece
+        finally:
+            if not done:
+                self.cancel()
+
+
 class ComplaintRAG:
     """
     Retrieval-Augmented Generation (RAG) pipeline for analyzing customer complaints.
@@ -27,7 +204,23 @@ class ComplaintRAG:
     def __init__(self, 
                  vector_store_path: str = str(cfg.VECTOR_STORE_PATH),
                  embedding_model: str = cfg.EMBEDDING_MODEL_NAME,
-                 llm_model: str = cfg.LLM_MODEL_NAME):
+                 llm_model: str = cfg.LLM_MODEL_NAME,
+                 cache_size: int = cfg.QUERY_CACHE_MAX_ENTRIES,
+                 cache_ttl: float = cfg.QUERY_CACHE_TTL_SECONDS,
+                 hooks: Optional[List[StageHook]] = None,
+                 profile: bool = cfg.PROFILE_QUERIES,
+                 backend: str = cfg.RETRIEVER_BACKEND,
+                 index_path: str = str(cfg.VECTOR_INDEX_PATH),
+                 auto_filter: bool = cfg.AUTO_FILTERS,
+                 hybrid: bool = cfg.HYBRID_SEARCH,
+                 sparse_index_path: str = str(cfg.SPARSE_INDEX_PATH),
+                 reranker: str = cfg.RERANKER,
+                 rerank_pool: int = cfg.RERANK_POOL,
+                 context_tokens: int = cfg.CONTEXT_MAX_TOKENS,
+                 llm_snapshot: bool = cfg.USE_LLM_SNAPSHOT,
+                 generation_backend: str = cfg.GENERATION_BACKEND,
+                 embedding_backend: str = cfg.EMBEDDING_BACKEND,
+                 intra_op_threads: int = cfg.INTRA_OP_THREADS):
         """
         Initializes the RAG pipeline components.
         
@@ -35,124 +228,928 @@ class ComplaintRAG:
             vector_store_path (str): Path to persistent vector store.
             embedding_model (str): HF model identifier for embeddings.
             llm_model (str): HF model identifier for generation.
+            cache_size (int): Max cached query results (LRU); 0 disables the cache.
+            cache_ttl (float): Seconds a cached result stays valid.
+            hooks (List[StageHook]): Callbacks invoked as hook(stage, seconds, info)
+                after every pipeline stage, e.g. an instrumentation.StageRecorder.
+            profile (bool): Run every query under cProfile and dump the stats to
+                cfg.PROFILE_DIR. Each stage is its own method, so sampling
+                profilers such as py-spy also attribute time per stage.
+            backend (str): Retriever engine: "chroma", or the in-process
+                "exact" / "ivf" indexes exported to `index_path`.
+            index_path (str): Directory written by `python -m src.vector_index`.
+            auto_filter (bool): When a query passes no `filters`, derive them from
+                the question ("... in Texas in 2023") with filters.parse_filter.
+            hybrid (bool): Fuse BM25 results from `sparse_index_path` with the dense
+                ones (reciprocal-rank fusion); skipped if that index was never built.
+            sparse_index_path (str): Directory written by `python -m src.sparse_index`.
+            reranker (str): 'none', 'mmr' or 'cross-encoder' (see src.rerank).
+            rerank_pool (int): Candidates retrieved for the reranker, which keeps RETRIEVER_K.
+            context_tokens (int): Token budget of the prompt; retrieved chunks are packed
+                into it by a context.ContextBuilder. 0 joins every chunk and leaves the
+                tokenizer to truncate the prompt.
+            llm_snapshot (bool): Load the LLM from the snapshot in cfg.LLM_SNAPSHOT_DIR
+                (see startup.save_model_snapshot) when one exists for `llm_model`.
+            generation_backend (str): 'torch', 'int8' or 'onnx' (see src.generation).
+            embedding_backend (str): 'torch', 'onnx' or 'onnx-int8' (see src.embedding_engine).
+            intra_op_threads (int): Threads per operator for the models loaded by this
+                instance (0 = runtime default); src.server gives each worker its share.
         """
         self.vector_store_path = vector_store_path
         self.embedding_model_name = embedding_model
         self.llm_model_name = llm_model
+        self._query_cache = QueryCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self._hooks = list(hooks or [])
+        self.profile = profile
+        self.backend = backend
+        self.index_path = index_path
+        self.auto_filter = auto_filter
+        self.hybrid = hybrid
+        self.sparse_index_path = sparse_index_path
+        self._sparse_index: Optional["BM25Index"] = None
+        self._reranker: Optional[Reranker] = load_reranker(reranker)
+        self.rerank_pool = rerank_pool
+        self.context_tokens = context_tokens
+        self.llm_snapshot = llm_snapshot
+        self.generation_backend = generation_backend
+        self.embedding_backend = embedding_backend
+        self.intra_op_threads = intra_op_threads
+        self._context_builder: Optional[ContextBuilder] = None
         
         # Lazy loading components
         self._vector_store = None
+        self._embedding_fn = None
         self._retriever = None
+        self._tokenizer = None
+        self._model = None
         self._llm = None
+        self._prompt = None
         self._chain = None
+        self._answer_chain = None
+        # One lock per component, so startup.start() can load them in parallel
+        self._load_lock = threading.RLock()
+        self._embedding_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._llm_lock = threading.RLock()
+        self._retrieval_executor = None
+        self._batcher = None
+        # Bounds concurrent streamed generations; threads start on first use
+        self._stream_executor = ThreadPoolExecutor(
+            max_workers=max(1, cfg.STREAM_MAX_CONCURRENT), thread_name_prefix="stream-generation")
+
+    def _load_embedding_fn(self) -> "Embeddings":
+        """Loads the (cached) embedding model."""
+        with self._embedding_lock:
+            if self._embedding_fn is None:
+                logger.info(f"Loading embedding model: {self.embedding_model_name} ({self.embedding_backend})")
+                if self.embedding_backend == "torch":
+                    model = _import("HuggingFaceEmbeddings")(model_name=self.embedding_model_name)
+                else:
+                    model = _import("load_embeddings")(
+                        self.embedding_model_name, self.embedding_backend, intra_op=self.intra_op_threads)
+                self._embedding_fn = _import("cached_embeddings")(
+                    model, _import("cache_model_name")(self.embedding_model_name, self.embedding_backend)
+                )
+            return self._embedding_fn
+
+    def _load_index(self):
+        """
+        Opens the vector store and the sparse index. The store gets a deferred
+        embedder, so this does not wait for the embedding model to load.
+        """
+        with self._index_lock:
+            if self._vector_store is None:
+                embedding_fn = _import("DeferredEmbeddings")(self._load_embedding_fn)
+                if self.backend == "chroma":
+                    logger.info(f"Loading vector store from: {self.vector_store_path}")
+                    vector_store = _import("Chroma")(
+                        persist_directory=self.vector_store_path,
+                        embedding_function=embedding_fn
+                    )
+                else:
+                    logger.info(f"Loading {self.backend} index from: {self.index_path}")
+                    vector_store = _import("IndexVectorStore")(
+                        _import("load_index")(self.index_path, self.backend), embedding_fn
+                    )
+                # The in-process indexes share one documents table (src.server may have loaded it first)
+                if self._sparse_index is None:
+                    self._sparse_index = self._load_sparse_index(getattr(vector_store, "documents", None))
+                self._vector_store = vector_store
+            return self._vector_store
 
     def _load_retriever(self):
         """Loads and configures the ChromaDB retriever."""
-        if not self._retriever:
-            try:
-                logger.info(f"Loading embedding model: {self.embedding_model_name}")
-                embedding_fn = HuggingFaceEmbeddings(model_name=self.embedding_model_name)
-                
-                logger.info(f"Loading vector store from: {self.vector_store_path}")
-                self._vector_store = Chroma(
-                    persist_directory=self.vector_store_path,
-                    embedding_function=embedding_fn
-                )
-                self._retriever = self._vector_store.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={"k": cfg.RETRIEVER_K}
-                )
-            except Exception as e:
-                logger.error(f"Failed to load retriever: {e}")
-                raise RuntimeError("Critical Error: Could not load Vector Store.") from e
-        return self._retriever
+        with self._load_lock:
+            if not self._retriever:
+                try:
+                    self._load_embedding_fn()
+                    self._retriever = self._load_index().as_retriever(
+                        search_type="similarity",
+                        search_kwargs={"k": cfg.RETRIEVER_K}
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to load retriever: {e}")
+                    raise RuntimeError("Critical Error: Could not load Vector Store.") from e
+            return self._retriever
+
+    def _load_sparse_index(self, documents: Any = None) -> Optional["BM25Index"]:
+        if not self.hybrid:
+            return None
+        if not os.path.exists(os.path.join(self.sparse_index_path, _import("SPARSE_META_FILE"))):
+            logger.warning(f"No sparse index at {self.sparse_index_path}; using dense retrieval only")
+            return None
+        logger.info(f"Loading sparse index from: {self.sparse_index_path}")
+        return _import("BM25Index")(self.sparse_index_path, documents)
 
     def _load_llm(self):
-        """Loads the LLM pipeline."""
-        if not self._llm:
-            try:
-                logger.info(f"Loading LLM model: {self.llm_model_name}")
-                tokenizer = AutoTokenizer.from_pretrained(self.llm_model_name)
-                model = AutoModelForSeq2SeqLM.from_pretrained(self.llm_model_name)
-                
-                pipe = pipeline(
-                    "text2text-generation",
-                    model=model,
-                    tokenizer=tokenizer,
-                    max_length=cfg.GENERATION_MAX_LENGTH,
-                    truncation=True,
-                    temperature=cfg.GENERATION_TEMP
-                )
-                self._llm = HuggingFacePipeline(pipeline=pipe)
-            except Exception as e:
-                logger.error(f"Failed to load LLM: {e}")
-                raise RuntimeError("Critical Error: Could not load LLM.") from e
-        return self._llm
+        """
+        Loads the LLM pipeline. The 'onnx' backend has no transformers
+        pipeline (and so no LangChain LLM); it is only driven through
+        _generate, so this returns None for it.
+        """
+        with self._llm_lock:
+            if self._model is None:
+                try:
+                    logger.info(f"Loading LLM model: {self.llm_model_name} ({self.generation_backend})")
+                    tokenizer = self._load_tokenizer()
+                    model = load_generation_model(
+                        self.llm_model_name, self.generation_backend, self.llm_snapshot, self.intra_op_threads)
+                    if self.generation_backend != "onnx":
+                        pipe = _import("pipeline")(
+                            "text2text-generation",
+                            model=model,
+                            tokenizer=tokenizer,
+                            max_length=cfg.GENERATION_MAX_LENGTH,
+                            truncation=True,
+                            temperature=cfg.GENERATION_TEMP
+                        )
+                        self._llm = _import("HuggingFacePipeline")(pipeline=pipe)
+                    self._tokenizer = tokenizer
+                    self._model = model
+                except Exception as e:
+                    logger.error(f"Failed to load LLM: {e}")
+                    raise RuntimeError("Critical Error: Could not load LLM.") from e
+            return self._llm
+
+    def _load_tokenizer(self) -> Any:
+        """The LLM tokenizer, loaded on its own so prompts can be measured before the model loads."""
+        with self._llm_lock:
+            if self._tokenizer is None:
+                source = snapshot_tokenizer_path(self.llm_model_name) if self.llm_snapshot else None
+                self._tokenizer = _import("AutoTokenizer").from_pretrained(source or self.llm_model_name)
+            return self._tokenizer
+
+    def _get_context_builder(self) -> Optional[ContextBuilder]:
+        if self._context_builder is None and self.context_tokens > 0:
+            self._context_builder = ContextBuilder(self._load_tokenizer(), PROMPT_TEMPLATE, self.context_tokens)
+        return self._context_builder
+
+    def _load_generator(self) -> Tuple[Any, Any]:
+        """Returns the (tokenizer, model) pair behind the LLM pipeline."""
+        self._load_llm()
+        return self._tokenizer, self._model
+
+    @staticmethod
+    def _tensor_type(model: Any) -> str:
+        """
+        Tensors `model.generate()` takes: PyTorch, unless the model declares
+        otherwise in a `tensor_type` attribute, as the ONNX Runtime generator
+        and the benchmark stub do ("np").
+        """
+        return getattr(model, "tensor_type", "pt")
+
+    def _warm_up_embedder(self, text: str):
+        """Runs the embedding model once, bypassing the embedding cache."""
+        embedding_fn = self._load_embedding_fn()
+        getattr(embedding_fn, "embeddings", embedding_fn).embed_query(text)
+
+    def _warm_up_retrieval(self, text: str):
+        """One unhooked retrieval, which pages in the index and any reranker."""
+        self._load_retriever()
+        self._retrieve(text, StageTimer([]))
+
+    def _warm_up_generator(self, text: str):
+        """A short generate() call, so the first question does not pay for lazy initialization."""
+        tokenizer, model = self._load_generator()
+        inputs = tokenizer(text, return_tensors=self._tensor_type(model), truncation=True)
+        model.generate(**inputs, max_length=3)
+
+    def _get_prompt(self) -> "PromptTemplate":
+        if not self._prompt:
+            self._prompt = _import("PromptTemplate").from_template(PROMPT_TEMPLATE)
+        return self._prompt
+
+    def add_hook(self, hook: StageHook):
+        """Registers a callback invoked as hook(stage, seconds, info) after every stage."""
+        self._hooks.append(hook)
+
+    def _get_answer_chain(self):
+        """Constructs the prompt -> LLM -> parser chain that answers from a given context."""
+        if not self._answer_chain:
+            llm = self._load_llm()
+            self._answer_chain = self._get_prompt() | llm | _import("StrOutputParser")()
+        return self._answer_chain
+
+    def _chain_context(self, question: str) -> str:
+        # Same retrieval as query_with_sources (hybrid fusion and reranking included), timed to the hooks
+        return self._format_docs(self._retrieve(question, StageTimer(self._hooks)))
 
     def get_chain(self):
         """Constructs and returns the RAG execution chain."""
         if not self._chain:
-            retriever = self._load_retriever()
-            llm = self._load_llm()
-            
-            template = """
-            You are a helpful financial analyst assistant for CrediTrust. 
-            Answer the question based ONLY on the following context. 
-            If the answer is not in the context, say "I don't have enough information."
-            
-            Context:
-            {context}
-            
-            Question: 
-            {question}
-            
-            Answer:
-            """
-            prompt = PromptTemplate.from_template(template)
+            self._load_retriever()
+            answer_chain = self._get_answer_chain()
             
             self._chain = (
-                {"context": retriever | self._format_docs, "question": RunnablePassthrough()}
-                | prompt
-                | llm
-                | StrOutputParser()
+                {"context": _import("RunnableLambda")(self._chain_context),
+                 "question": _import("RunnablePassthrough")()}
+                | answer_chain
             )
             logger.info("RAG Chain initialized successfully.")
         return self._chain
 
+    def _cache_key(self, question: str, search_filter: Optional[SearchFilter] = None, chain: bool = False) -> tuple:
+        # Chain answers join every chunk and carry no sources, so they get their own entries
+        return (normalize_question(question), search_filter, cfg.RETRIEVER_K, self.embedding_model_name,
+                self.llm_model_name, self.sparse_index_path if self.hybrid else None) + (("chain",) if chain else ())
+
+    def _index_paths(self) -> List[str]:
+        """On-disk indexes whose contents answers depend on."""
+        paths = [self.vector_store_path if self.backend == "chroma" else self.index_path]
+        if self.hybrid:
+            paths.append(self.sparse_index_path)
+        return paths
+
+    def _cached_result(self, question: str, search_filter: Optional[SearchFilter] = None,
+                       chain: bool = False) -> Optional[RAGResult]:
+        """Looks up a previous result, first dropping everything if the vector store changed."""
+        if self._query_cache is None:
+            return None
+        self._query_cache.refresh_fingerprint(lambda: tuple(store_fingerprint(p) for p in self._index_paths()))
+        return self._query_cache.get(self._cache_key(question, search_filter, chain))
+
+    def _resolve_filter(self, question: str, filters: Filters) -> Optional[SearchFilter]:
+        """Normalizes `filters` (or parses them from the question when auto_filter is on)."""
+        if filters is None and self.auto_filter:
+            filters = parse_filter(question)
+        if isinstance(filters, Mapping):
+            filters = SearchFilter.from_dict(filters)
+        return None if filters is None or filters.is_empty() else filters
+
+    def cache_stats(self) -> Dict[str, float]:
+        """Hit-rate counters of the query result cache (empty if disabled)."""
+        return self._query_cache.stats() if self._query_cache is not None else {}
+
     def _format_docs(self, docs: List[Document]) -> str:
         """Formats retrieved documents into a single context string."""
         return "\n\n".join([d.page_content for d in docs])
 
-    def query(self, question: str) -> str:
+    def query(self, question: str, filters: Filters = None) -> str:
         """
         Executes a query against the RAG pipeline.
         
         Args:
             question (str): User's question.
+            filters (Filters): Optional metadata restriction, e.g.
+                {"category": "Savings Account", "state": "TX", "date_from": "2023-01-01"}.
             
         Returns:
             str: Generated answer.
         """
+        search_filter = self._resolve_filter(question, filters)
+        # The chain joins every retrieved chunk and needs a transformers pipeline; filtered,
+        # token-budgeted and ONNX prompts go through query_with_sources
+        if search_filter is not None or self.context_tokens > 0 or self.generation_backend == "onnx":
+            return self.query_with_sources(question, filters=search_filter).answer
+        cached = self._cached_result(question, chain=True)
+        if cached is not None:
+            return cached.answer
         chain = self.get_chain()
         logger.info(f"Processing query: {question}")
         try:
-            return chain.invoke(question)
+            answer = chain.invoke(question)
         except Exception as e:
             logger.error(f"Query execution failed: {e}")
             return "Error: Unable to generate response."
+        if self._query_cache is not None:
+            self._query_cache.put(self._cache_key(question, chain=True), RAGResult(question=question, answer=answer))
+        return answer
+
+    def _embed_query(self, question: str) -> List[float]:
+        return self._embedding_fn.embed_query(question)
+
+    def _store_filter(self, search_filter: Optional[SearchFilter]) -> Any:
+        """The filter in the form the loaded store expects: a Chroma `where` clause or a SearchFilter."""
+        if search_filter is None or isinstance(self._vector_store, _import("IndexVectorStore")):
+            return search_filter
+        return to_chroma_where(search_filter)
+
+    def _pool_k(self) -> int:
+        """Candidates handed to the reranker (just RETRIEVER_K without one)."""
+        return max(cfg.RETRIEVER_K, self.rerank_pool) if self._reranker is not None else cfg.RETRIEVER_K
+
+    def _dense_k(self) -> int:
+        """Dense results per query: extra candidates when they will be fused with BM25."""
+        if self._sparse_index is None:
+            return self._pool_k()
+        return max(self._pool_k(), cfg.HYBRID_CANDIDATES)
+
+    def _vector_search(self, vector: List[float], search_filter: Optional[SearchFilter] = None) -> List[Document]:
+        if search_filter is None:
+            return self._vector_store.similarity_search_by_vector(vector, k=self._dense_k())
+        return self._vector_store.similarity_search_by_vector(
+            vector, k=self._dense_k(), filter=self._store_filter(search_filter))
+
+    def _fuse_sparse(self, question: str, dense: List[Document],
+                     search_filter: Optional[SearchFilter] = None) -> List[Document]:
+        """Reciprocal-rank fusion of the dense results with BM25 results for the same question."""
+        lexical = self._sparse_index.search_documents(
+            question, max(self._pool_k(), cfg.HYBRID_CANDIDATES), filter=search_filter)
+        fused = _import("reciprocal_rank_fusion")([dense, lexical], (cfg.DENSE_WEIGHT, cfg.SPARSE_WEIGHT))
+        return fused[:self._pool_k()]
+
+    def _candidate_vectors(self, docs: List[Document]) -> np.ndarray:
+        """
+        Embeddings of retrieved chunks, read back from the store instead of
+        re-running the model; chunks the store cannot return are embedded
+        (normally an embedding-cache hit).
+        """
+        if isinstance(self._vector_store, _import("IndexVectorStore")):
+            return self._vector_store.get_vectors([d.id for d in docs])
+        ids = [d.id for d in docs if d.id]
+        found = self._vector_store._collection.get(ids=ids, include=["embeddings"]) if ids else {"ids": []}
+        by_id = dict(zip(found["ids"], found["embeddings"] if found["ids"] else []))
+        vectors = [by_id.get(d.id) for d in docs]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self._embedding_fn.embed_documents([docs[i].page_content for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _rerank(self, questions: List[str], vectors: List[List[float]],
+                pools: List[List[Document]]) -> List[List[Document]]:
+        """Runs the reranker over each question's candidate pool, keeping RETRIEVER_K."""
+        doc_vectors = [self._candidate_vectors(docs) for docs in pools] if self._reranker.needs_vectors else None
+        return self._reranker.rerank_batch(questions, pools, cfg.RETRIEVER_K, vectors, doc_vectors)
+
+    def _retrieve(self, question: str, timer: StageTimer,
+                  search_filter: Optional[SearchFilter] = None) -> List[Document]:
+        """Embeds the question and searches the store, timing each step separately."""
+        self._load_retriever()
+        with timer.stage("embed_query"):
+            vector = self._embed_query(question)
+        with timer.stage("vector_search", filtered=search_filter is not None) as info:
+            docs = self._vector_search(vector, search_filter)
+            if not docs and search_filter is not None:
+                # A wrongly parsed filter must not leave the prompt without context
+                logger.info(f"No chunks match the filter ({search_filter.describe()}); searching without it")
+                search_filter = None
+                docs = self._vector_search(vector)
+                info["filter_dropped"] = True
+            info["documents"] = len(docs)
+        if self._sparse_index is not None:
+            with timer.stage("sparse_search", filtered=search_filter is not None):
+                docs = self._fuse_sparse(question, docs, search_filter)
+        if self._reranker is not None:
+            with timer.stage("rerank", reranker=self._reranker.name, candidates=len(docs)):
+                docs = self._rerank([question], [vector], [docs])[0]
+        return docs
+
+    def _build_prompt(self, question: str, docs: List[Document],
+                      timer: StageTimer) -> Tuple[str, List[Document], Dict[str, int]]:
+        """
+        Formats the prompt, within the context token budget if one is set.
+
+        Returns:
+            Tuple[str, List[Document], Dict[str, int]]: The prompt, the documents it
+            includes, and its token counts (empty without a budget).
+        """
+        with timer.stage("prompt_build") as info:
+            builder = self._get_context_builder()
+            if builder is None:
+                return self._get_prompt().format(context=self._format_docs(docs), question=question), docs, {}
+            context = builder.build(question, docs)
+            counts = context.token_counts()
+            info.update(counts)
+            return context.prompt, context.documents, counts
+
+    def _vector_search_batch(self, vectors: List[List[float]],
+                             search_filter: Optional[SearchFilter] = None) -> List[List[Document]]:
+        """Searches the store for several query vectors in a single call."""
+        if isinstance(self._vector_store, _import("IndexVectorStore")):
+            return self._vector_store.similarity_search_by_vectors(
+                vectors, k=self._dense_k(), filter=search_filter)
+        results = self._vector_store._collection.query(
+            query_embeddings=vectors,
+            n_results=self._dense_k(),
+            where=self._store_filter(search_filter),
+            include=["documents", "metadatas"],
+        )
+        return [
+            [
+                Document(page_content=text, metadata=metadata or {}, id=doc_id)
+                for text, metadata, doc_id in zip(texts, metadatas, ids)
+                if text is not None
+            ]
+            for texts, metadatas, ids in zip(results["documents"], results["metadatas"], results["ids"])
+        ]
+
+    def _generate(self, prompt: str, timer: StageTimer) -> Tuple[str, Dict[str, int]]:
+        """
+        Runs flan-t5 on one prompt with the same settings as the HF pipeline
+        (inputs truncated to the model limit, greedy decoding up to
+        GENERATION_MAX_LENGTH), but with tokenization, generation and decoding
+        timed as separate stages.
+        """
+        tokenizer, model = self._load_generator()
+        tokens = {}
+        with timer.stage("tokenize") as info:
+            inputs = tokenizer(prompt, return_tensors=self._tensor_type(model), truncation=True)
+            info["input_tokens"] = tokens["input_tokens"] = int(inputs["input_ids"].shape[-1])
+        with timer.stage("generate") as info:
+            output_ids = model.generate(**inputs, max_length=cfg.GENERATION_MAX_LENGTH)
+            info["output_tokens"] = tokens["output_tokens"] = int((output_ids[0] != tokenizer.pad_token_id).sum())
+        with timer.stage("decode"):
+            answer = tokenizer.decode(output_ids[0], skip_special_tokens=True)
+        return answer, tokens
+
+    def _generate_batch(self, prompts: List[str], timer: StageTimer) -> Tuple[List[str], List[Dict[str, int]]]:
+        """
+        Generates answers for several prompts in one padded forward pass.
+        Greedy decoding with an attention mask gives the same answers as
+        generating each prompt on its own.
+        """
+        tokenizer, model = self._load_generator()
+        with timer.stage("tokenize", batch_size=len(prompts)) as info:
+            inputs = tokenizer(prompts, return_tensors=self._tensor_type(model), padding=True, truncation=True)
+            input_tokens = [int(n) for n in inputs["attention_mask"].sum(-1)]
+            info["input_tokens"] = sum(input_tokens)
+        with timer.stage("generate", batch_size=len(prompts)) as info:
+            output_ids = model.generate(**inputs, max_length=cfg.GENERATION_MAX_LENGTH)
+            output_tokens = [int(n) for n in (output_ids != tokenizer.pad_token_id).sum(-1)]
+            info["output_tokens"] = sum(output_tokens)
+        with timer.stage("decode", batch_size=len(prompts)):
+            answers = tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+        tokens = [{"input_tokens": i, "output_tokens": o} for i, o in zip(input_tokens, output_tokens)]
+        return answers, tokens
+
+    def _stopping_criteria(self, model: Any, cancel: threading.Event) -> Any:
+        """Stopping criteria for `model.generate()` that end decoding once `cancel` is set."""
+        criteria = [_import("StopOnEvent")(cancel)]
+        if self._tensor_type(model) == "np":
+            return criteria
+        return _import("StoppingCriteriaList")(criteria)
+
+    def _stream_generate(self, prompt: str, timer: StageTimer, tokens: Dict[str, int],
+                         cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        Generates on the bounded stream executor and yields text as
+        TextIteratorStreamer decodes it, so the "generate" stage here includes
+        decoding. Time spent waiting for a free generation slot is recorded as
+        "queue_wait". Setting `cancel` (or closing this iterator) stops
+        generate() at its next step. Token counts are written into `tokens`
+        once generation finishes.
+        """
+        cancel = cancel if cancel is not None else threading.Event()
+        tokenizer, model = self._load_generator()
+        with timer.stage("tokenize") as info:
+            inputs = tokenizer(prompt, return_tensors=self._tensor_type(model), truncation=True)
+            info["input_tokens"] = tokens["input_tokens"] = int(inputs["input_ids"].shape[-1])
+
+        # skip_prompt drops the decoder start token that generate() emits first
+        streamer = _import("TextIteratorStreamer")(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stopping_criteria = self._stopping_criteria(model, cancel)
+        started = {}
+
+        def run():
+            started["at"] = time.perf_counter()
+            try:
+                if cancel.is_set():
+                    return None
+                return model.generate(**inputs, max_length=cfg.GENERATION_MAX_LENGTH, streamer=streamer,
+                                      stopping_criteria=stopping_criteria)
+            finally:
+                # Ends the reader's iteration on errors and skipped runs too; a second end() is harmless
+                streamer.end()
+
+        submitted = time.perf_counter()
+        job = self._stream_executor.submit(run)
+        finished = False
+        try:
+            yield from streamer
+            finished = True
+        finally:
+            if not finished:
+                cancel.set()
+        output_ids = job.result()
+        timer.record("queue_wait", started["at"] - submitted)
+        if output_ids is None:
+            return
+        tokens["output_tokens"] = int((output_ids[0] != tokenizer.pad_token_id).sum())
+        timer.record("generate", time.perf_counter() - started["at"], output_tokens=tokens["output_tokens"])
+
+    def stream_query(self, question: str, filters: Filters = None) -> RAGStream:
+        """
+        Answers a question token by token.
+
+        Retrieval runs before this returns, so the sources can be shown at
+        once. The answer is then generated while the stream is consumed, and
+        time-to-first-token is reported as the "first_token" stage. Streamed
+        requests skip the aquery micro-batching queue; at most
+        STREAM_MAX_CONCURRENT of them generate at once, and the rest wait for a
+        slot (reported as "queue_wait"). A stream that is not read to the end
+        cancels its generation.
+        
+        Args:
+            question (str): User's question.
+            filters (Filters): Optional metadata restriction on retrieval.
+            
+        Returns:
+            RAGStream: Sources plus an iterator over the answer text.
+        """
+        start = time.perf_counter()
+        timer = StageTimer(self._hooks)
+        search_filter = self._resolve_filter(question, filters)
+        with timer.stage("cache_lookup"):
+            cached = self._cached_result(question, search_filter)
+        if cached is not None:
+            def finish_cached(answer: str) -> RAGResult:
+                timer.timings["total"] = time.perf_counter() - start
+                return RAGResult(question=question, answer=answer, sources=cached.sources,
+                                 timings=timer.timings, tokens=cached.tokens, cached=True,
+                                 filters=search_filter)
+            return RAGStream(question, cached.sources, iter([cached.answer]), finish_cached, search_filter)
+
+        logger.info(f"Streaming query: {question}")
+        docs = self._retrieve(question, timer, search_filter)
+        prompt, docs, tokens = self._build_prompt(question, docs, timer)
+        cancel = threading.Event()
+        failed = False
+
+        def pieces() -> Iterator[str]:
+            nonlocal failed
+            first = True
+            try:
+                for piece in self._stream_generate(prompt, timer, tokens, cancel):
+                    if first and piece:
+                        timer.record("first_token", time.perf_counter() - start)
+                        first = False
+                    yield piece
+            except Exception as e:
+                logger.error(f"Query execution failed: {e}")
+                failed = True
+                yield "Error: Unable to generate response."
+
+        def finish(answer: str) -> RAGResult:
+            timings = timer.timings
+            timings["retrieval"] = sum(timings.get(s, 0.0) for s in RETRIEVAL_STAGES)
+            timings["generation"] = sum(timings.get(s, 0.0) for s in GENERATION_STAGES)
+            timings["total"] = time.perf_counter() - start
+            result = RAGResult(question=question, answer=answer, sources=docs, timings=timings, tokens=tokens,
+                               filters=search_filter)
+            if self._query_cache is not None and not failed:
+                self._query_cache.put(self._cache_key(question, search_filter), result)
+            return result
+
+        return RAGStream(question, docs, pieces(), finish, search_filter, cancel)
+
+    def query_with_sources(self, question: str, filters: Filters = None) -> RAGResult:
+        """
+        Answers a question and returns the documents used to produce the answer.
+
+        Retrieval runs exactly once: the retrieved documents are formatted into
+        the prompt directly instead of letting the chain query the store again.
+        Every stage is timed and reported to the registered hooks.
+        
+        Args:
+            question (str): User's question.
+            filters (Filters): Optional metadata restriction on retrieval.
+            
+        Returns:
+            RAGResult: Answer, source documents, per-stage timings and token counts.
+        """
+        with profiled(self.profile, label="query"):
+            return self._query_with_sources(question, self._resolve_filter(question, filters))
+
+    def _query_with_sources(self, question: str, search_filter: Optional[SearchFilter] = None) -> RAGResult:
+        start = time.perf_counter()
+        timer = StageTimer(self._hooks)
+        with timer.stage("cache_lookup"):
+            cached = self._cached_result(question, search_filter)
+        if cached is not None:
+            timer.timings["total"] = time.perf_counter() - start
+            return RAGResult(
+                question=question,
+                answer=cached.answer,
+                sources=cached.sources,
+                timings=timer.timings,
+                tokens=cached.tokens,
+                cached=True,
+                filters=search_filter,
+            )
+        
+        logger.info(f"Processing query with sources: {question}")
+        failed = False
+        docs = []
+        tokens = {}
+        try:
+            docs = self._retrieve(question, timer, search_filter)
+            prompt, docs, tokens = self._build_prompt(question, docs, timer)
+            answer, generated = self._generate(prompt, timer)
+            tokens = {**tokens, **generated}
+        except Exception as e:
+            logger.error(f"Query execution failed: {e}")
+            answer = "Error: Unable to generate response."
+            failed = True
+        
+        timings = timer.timings
+        timings["retrieval"] = sum(timings.get(s, 0.0) for s in RETRIEVAL_STAGES)
+        timings["generation"] = sum(timings.get(s, 0.0) for s in GENERATION_STAGES)
+        timings["total"] = time.perf_counter() - start
+        result = RAGResult(question=question, answer=answer, sources=docs, timings=timings, tokens=tokens,
+                           filters=search_filter)
+        if self._query_cache is not None and not failed:
+            self._query_cache.put(self._cache_key(question, search_filter), result)
+        return result
+
+    def query_batch(self, questions: List[str], batch_size: int = cfg.GENERATION_BATCH_SIZE,
+                    filters: Filters = None) -> List[RAGResult]:
+        """
+        Answers many questions at once, for evaluation and bulk reporting.
+
+        All uncached questions are embedded in one pass and searched with a
+        single vector store call. Their prompts are then sorted by length,
+        to minimize padding, and generated `batch_size` at a time. Repeated
+        questions are answered once.
+
+        Hooks receive one record per stage per batch (with a "batch_size"
+        entry in the info dict). Each result's timings hold its amortized
+        share of the batch stages it took part in.
+        
+        Args:
+            questions (List[str]): Questions to answer.
+            batch_size (int): Prompts per generate() call.
+            filters (Filters): Metadata restriction applied to every question.
+            
+        Returns:
+            List[RAGResult]: One result per question, in input order.
+        """
+        with profiled(self.profile, label="query_batch"):
+            return self._query_batch(questions, max(1, batch_size), filters)
+
+    def _query_batch(self, questions: List[str], batch_size: int, filters: Filters = None) -> List[RAGResult]:
+        search_filters = {question: self._resolve_filter(question, filters) for question in questions}
+        results, pending = self._lookup_batch(questions, search_filters)
+        if pending:
+            logger.info(f"Processing batch of {len(pending)} queries")
+            try:
+                results.update(self._answer_batch(pending, search_filters, batch_size))
+            except Exception as e:
+                # Retrieval or prompt building failed for the batch as a whole; answer one by one
+                # so a single bad question does not fail the rest
+                logger.error(f"Batch query failed, answering questions one at a time: {e}")
+                for key, question in pending.items():
+                    results[key] = self._query_with_sources(question, search_filters[question])
+
+        # Repeats of a question share one result, re-labelled with their own wording
+        answered = []
+        for question in questions:
+            result = results[self._cache_key(question, search_filters[question])]
+            answered.append(result if result.question == question else replace(result, question=question))
+        return answered
+
+    def _lookup_batch(self, questions: List[str], search_filters: Dict[str, Optional[SearchFilter]]
+                      ) -> Tuple[Dict[tuple, RAGResult], Dict[tuple, str]]:
+        """Splits distinct questions into cached results and those still to answer, by cache key."""
+        results: Dict[tuple, RAGResult] = {}
+        pending: Dict[tuple, str] = {}
+        for question in questions:
+            key = self._cache_key(question, search_filters[question])
+            if key in results or key in pending:
+                continue
+            cached = self._cached_result(question, search_filters[question])
+            if cached is not None:
+                results[key] = RAGResult(question=question, answer=cached.answer, sources=cached.sources,
+                                         timings={"total": 0.0}, tokens=cached.tokens, cached=True,
+                                         filters=search_filters[question])
+            else:
+                pending[key] = question
+        return results, pending
+
+    def _answer_batch(self, pending: Dict[tuple, str], search_filters: Dict[str, Optional[SearchFilter]],
+                      batch_size: int) -> Dict[tuple, RAGResult]:
+        texts = list(pending.values())
+        timer = StageTimer(self._hooks)
+        sources = self._retrieve_batch(texts, search_filters, timer)
+        prompts, sources, prompt_tokens = self._build_prompts(texts, sources, timer)
+        answers, tokens, generation, failed = self._generate_sorted(prompts, batch_size)
+
+        results = {}
+        for i, key in enumerate(pending):
+            timings = {name: secs / len(texts) for name, secs in timer.timings.items()}
+            timings.update(generation[i])
+            timings["retrieval"] = sum(timings.get(s, 0.0) for s in RETRIEVAL_STAGES)
+            timings["generation"] = sum(timings.get(s, 0.0) for s in GENERATION_STAGES)
+            timings["total"] = timings["retrieval"] + timings["generation"]
+            result = RAGResult(question=texts[i], answer=answers[i], sources=sources[i], timings=timings,
+                               tokens={**prompt_tokens[i], **tokens[i]}, filters=search_filters[texts[i]])
+            results[key] = result
+            if self._query_cache is not None and i not in failed:
+                self._query_cache.put(key, result)
+        return results
+
+    def _retrieve_batch(self, texts: List[str], search_filters: Dict[str, Optional[SearchFilter]],
+                        timer: StageTimer) -> List[List[Document]]:
+        """Embeds all questions in one pass and searches once per distinct filter."""
+        self._load_retriever()
+        with timer.stage("embed_query", batch_size=len(texts)):
+            vectors = self._embedding_fn.embed_documents(texts)
+        with timer.stage("vector_search", batch_size=len(texts)):
+            # One store call per distinct filter (a single call when no question is filtered)
+            groups: Dict[Optional[SearchFilter], List[int]] = {}
+            for i, question in enumerate(texts):
+                groups.setdefault(search_filters[question], []).append(i)
+            sources: List[List[Document]] = [[] for _ in texts]
+            used_filters = [search_filters[question] for question in texts]
+            for search_filter, members in groups.items():
+                found = self._vector_search_batch([vectors[i] for i in members], search_filter)
+                for i, docs in zip(members, found):
+                    sources[i] = docs
+            # As in _retrieve, questions whose filter matches nothing are searched without it
+            empty = [i for i, docs in enumerate(sources) if not docs and used_filters[i] is not None]
+            if empty:
+                logger.info(f"No chunks match the filters of {len(empty)} questions; searching without them")
+                for i, docs in zip(empty, self._vector_search_batch([vectors[i] for i in empty], None)):
+                    sources[i], used_filters[i] = docs, None
+        if self._sparse_index is not None:
+            with timer.stage("sparse_search", batch_size=len(texts)):
+                sources = [self._fuse_sparse(q, docs, f) for q, docs, f in zip(texts, sources, used_filters)]
+        if self._reranker is not None:
+            with timer.stage("rerank", batch_size=len(texts), reranker=self._reranker.name):
+                sources = self._rerank(texts, vectors, sources)
+        return sources
+
+    def _build_prompts(self, texts: List[str], sources: List[List[Document]], timer: StageTimer
+                       ) -> Tuple[List[str], List[List[Document]], List[Dict[str, int]]]:
+        """Batch counterpart of _build_prompt."""
+        with timer.stage("prompt_build", batch_size=len(texts)) as info:
+            builder = self._get_context_builder()
+            if builder is None:
+                prompts = [self._get_prompt().format(context=self._format_docs(docs), question=q)
+                           for q, docs in zip(texts, sources)]
+                return prompts, sources, [{} for _ in prompts]
+            contexts = [builder.build(q, docs) for q, docs in zip(texts, sources)]
+            info["prompt_tokens"] = sum(context.prompt_tokens for context in contexts)
+            return ([context.prompt for context in contexts], [context.documents for context in contexts],
+                    [context.token_counts() for context in contexts])
+
+    def _generate_sorted(self, prompts: List[str], batch_size: int
+                         ) -> Tuple[List[str], List[Dict[str, int]], List[Dict[str, float]], set]:
+        """
+        Generates prompts `batch_size` at a time, sorted by length to minimize
+        padding. A batch that fails is retried one prompt at a time, so only
+        the prompts that fail on their own get the error answer.
+
+        Returns:
+            Tuple: Answers, token counts and stage timings per prompt, and the
+            indexes of the prompts that failed.
+        """
+        answers: List[str] = [""] * len(prompts)
+        tokens: List[Dict[str, int]] = [{} for _ in prompts]
+        generation: List[Dict[str, float]] = [{} for _ in prompts]
+        failed = set()
+        order = sorted(range(len(prompts)), key=lambda i: len(prompts[i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            batch_timer = StageTimer(self._hooks)
+            try:
+                batch_answers, batch_tokens = self._generate_batch([prompts[i] for i in batch], batch_timer)
+            except Exception as e:
+                logger.error(f"Batch generation failed, retrying its {len(batch)} prompts one at a time: {e}")
+                for i in batch:
+                    timer = StageTimer(self._hooks)
+                    try:
+                        answers[i], tokens[i] = self._generate(prompts[i], timer)
+                    except Exception as e:
+                        logger.error(f"Query execution failed: {e}")
+                        answers[i] = "Error: Unable to generate response."
+                        failed.add(i)
+                    generation[i] = dict(timer.timings)
+                continue
+            for j, i in enumerate(batch):
+                answers[i], tokens[i] = batch_answers[j], batch_tokens[j]
+                generation[i] = {name: secs / len(batch) for name, secs in batch_timer.timings.items()}
+        return answers, tokens, generation, failed
+
+    def _get_batcher(self) -> GenerationBatcher:
+        if self._batcher is None:
+            self._batcher = GenerationBatcher(self._generate_queued)
+        return self._batcher
+
+    def _generate_queued(self, prompts: List[str]) -> List[Tuple[str, Dict[str, int], Dict[str, float]]]:
+        """GenerationBatcher callback: one padded batch, with each prompt's share of the stage timings."""
+        timer = StageTimer(self._hooks)
+        with profiled(self.profile, label="aquery_generate"):
+            answers, tokens = self._generate_batch(prompts, timer)
+        shares = {name: secs / len(prompts) for name, secs in timer.timings.items()}
+        return [(answer, token_counts, shares) for answer, token_counts in zip(answers, tokens)]
+
+    def _profiled_call(self, label: str, fn: Callable[..., Any], *args) -> Any:
+        """Runs fn(*args) under cProfile when profiling is on (aquery's blocking steps run on threads)."""
+        with profiled(self.profile, label=label):
+            return fn(*args)
+
+    async def aquery(self, question: str, filters: Filters = None) -> RAGResult:
+        """
+        Async counterpart of query_with_sources for serving concurrent users.
+
+        Retrieval runs on a thread pool of cfg.RETRIEVAL_WORKERS, so the
+        event loop stays free. Prompts then go through a bounded
+        GenerationBatcher, which groups requests arriving within
+        cfg.GENERATION_BATCH_WINDOW_MS into one padded generate() call; a
+        failed batch is retried prompt by prompt, so one bad prompt only
+        fails its own request. The time spent queued is reported as the
+        "queue_wait" stage.
+        With `profile` on, the retrieval and generation steps are profiled
+        on their threads ("aquery" and "aquery_generate" dumps).
+        
+        Args:
+            question (str): User's question.
+            filters (Filters): Optional metadata restriction on retrieval.
+            
+        Returns:
+            RAGResult: Answer, source documents, per-stage timings and token counts.
+        """
+        start = time.perf_counter()
+        timer = StageTimer(self._hooks)
+        search_filter = self._resolve_filter(question, filters)
+        with timer.stage("cache_lookup"):
+            cached = self._cached_result(question, search_filter)
+        if cached is not None:
+            timer.timings["total"] = time.perf_counter() - start
+            return RAGResult(question=question, answer=cached.answer, sources=cached.sources,
+                             timings=timer.timings, tokens=cached.tokens, cached=True,
+                             filters=search_filter)
+
+        if self._retrieval_executor is None:
+            self._retrieval_executor = ThreadPoolExecutor(
+                max_workers=cfg.RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+        loop = asyncio.get_running_loop()
+        docs = await loop.run_in_executor(
+            self._retrieval_executor, self._profiled_call, "aquery", self._retrieve, question, timer, search_filter)
+
+        failed = False
+        tokens = {}
+        try:
+            # Tokenizing may wait for the tokenizer to load, so it stays off the event loop too
+            prompt, docs, tokens = await loop.run_in_executor(
+                self._retrieval_executor, self._build_prompt, question, docs, timer)
+            (answer, generated, shares), wait = await self._get_batcher().submit(prompt)
+            tokens = {**tokens, **generated}
+            timer.record("queue_wait", wait)
+            timer.timings.update(shares)
+        except Exception as e:
+            logger.error(f"Query execution failed: {e}")
+            answer = "Error: Unable to generate response."
+            failed = True
+
+        timings = timer.timings
+        timings["retrieval"] = sum(timings.get(s, 0.0) for s in RETRIEVAL_STAGES)
+        timings["generation"] = sum(timings.get(s, 0.0) for s in GENERATION_STAGES)
+        timings["total"] = time.perf_counter() - start
+        result = RAGResult(question=question, answer=answer, sources=docs, timings=timings, tokens=tokens,
+                           filters=search_filter)
+        if self._query_cache is not None and not failed:
+            self._query_cache.put(self._cache_key(question, search_filter), result)
+        return result
+
+    def queue_stats(self) -> Dict[str, float]:
+        """Depth and wait-time counters of the aquery generation queue (empty before first use)."""
+        return self._batcher.stats() if self._batcher is not None else {}
+
+    def reset_generation_queue(self):
+        """
+        Closes the aquery generation queue, failing any request still queued
+        on it, and frees its generation thread. The next aquery starts a new
+        queue with zeroed queue_stats counters.
+        """
+        batcher, self._batcher = self._batcher, None
+        if batcher is not None:
+            batcher.close()
 
-    def retrieve_only(self, question: str) -> List[Document]:
+    def retrieve_only(self, question: str, filters: Filters = None) -> List[Document]:
         """
         Retrieves relevant documents without generation.
         
         Args:
             question (str): Query string.
+            filters (Filters): Optional metadata restriction.
             
         Returns:
             List[Document]: List of retrieved documents.
         """
-        retriever = self._load_retriever()
-        return retriever.invoke(question)
+        return self._retrieve(question, StageTimer(self._hooks), self._resolve_filter(question, filters))
 
 if __name__ == "__main__":
     # Test block
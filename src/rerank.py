@@ -0,0 +1,163 @@
+import logging
+import threading
+from contextlib import nullcontext
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+import src.config as cfg
+
+logger = logging.getLogger(__name__)
+
+# Rerankers selectable through cfg.RERANKER
+RERANKERS = ('none', 'mmr', 'cross-encoder')
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def mmr_order(query_vector: np.ndarray, doc_vectors: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    Maximal marginal relevance: greedily picks the candidate maximizing
+    lambda * sim(query, d) - (1 - lambda) * max sim(d, already picked).
+
+    All cosine similarities come from two matrix products up front; each of
+    the k picks is then a vectorized argmax plus one running maximum.
+
+    Returns:
+        List[int]: Indices into `doc_vectors`, in pick order.
+    """
+    docs = _normalize(np.asarray(doc_vectors, dtype=np.float32))
+    relevance = docs @ _normalize(np.asarray(query_vector, dtype=np.float32))
+    similarity = docs @ docs.T
+    redundancy = np.zeros(len(docs), dtype=np.float32)
+    available = np.ones(len(docs), dtype=bool)
+    picked = []
+    for _ in range(min(k, len(docs))):
+        scores = np.where(available, lambda_mult * relevance - (1.0 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+class Reranker:
+    """
+    Reorders a retrieved candidate pool and keeps the best k.
+
+    Subclasses set `needs_vectors` when they score candidate embeddings
+    rather than text; ComplaintRAG then supplies the stored vectors.
+    """
+
+    name = 'none'
+    needs_vectors = False
+
+    def rerank(self, question: str, docs: List[Document], k: int,
+               query_vector: Optional[Sequence[float]] = None,
+               doc_vectors: Optional[np.ndarray] = None) -> List[Document]:
+        return docs[:k]
+
+    def rerank_batch(self, questions: List[str], pools: List[List[Document]], k: int,
+                     query_vectors: Optional[Sequence[Sequence[float]]] = None,
+                     doc_vectors: Optional[List[np.ndarray]] = None) -> List[List[Document]]:
+        """Reranks several pools; the default simply loops over rerank()."""
+        return [
+            self.rerank(question, docs, k,
+                        None if query_vectors is None else query_vectors[i],
+                        None if doc_vectors is None else doc_vectors[i])
+            for i, (question, docs) in enumerate(zip(questions, pools))
+        ]
+
+class MMRReranker(Reranker):
+    """Diversifies the pool with MMR over the candidates' stored embeddings (no model call)."""
+
+    name = 'mmr'
+    needs_vectors = True
+
+    def __init__(self, lambda_mult: float = cfg.MMR_LAMBDA):
+        self.lambda_mult = lambda_mult
+
+    def rerank(self, question: str, docs: List[Document], k: int,
+               query_vector: Optional[Sequence[float]] = None,
+               doc_vectors: Optional[np.ndarray] = None) -> List[Document]:
+        if not docs:
+            return []
+        if query_vector is None or doc_vectors is None:
+            raise ValueError("MMR reranking needs the query vector and the candidate vectors")
+        return [docs[i] for i in mmr_order(np.asarray(query_vector), doc_vectors, k, self.lambda_mult)]
+
+class CrossEncoderReranker(Reranker):
+    """
+    Scores (question, chunk) pairs with a small cross-encoder on CPU and
+    keeps the k highest. Pairs are tokenized and scored in batches of
+    `batch_size`, so a 50-candidate pool is a single forward pass and
+    rerank_batch() scores the pools of several questions together.
+    """
+
+    name = 'cross-encoder'
+
+    def __init__(self, model_name: str = cfg.CROSS_ENCODER_MODEL, batch_size: int = cfg.CROSS_ENCODER_BATCH_SIZE,
+                 max_length: int = 512):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.max_length = max_length
+        self._tokenizer = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Tuple[Any, Any]:
+        with self._lock:
+            if self._model is None:
+                from transformers import AutoModelForSequenceClassification, AutoTokenizer
+                logger.info(f"Loading cross-encoder: {self.model_name}")
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+                self._model.eval()
+        return self._tokenizer, self._model
+
+    def score(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """Relevance logit of every (question, passage) pair."""
+        tokenizer, model = self._load()
+        try:
+            import torch
+            no_grad = torch.inference_mode()
+        except ImportError:
+            no_grad = nullcontext()
+        scores = []
+        with no_grad:
+            for start in range(0, len(pairs), self.batch_size):
+                batch = pairs[start:start + self.batch_size]
+                inputs = tokenizer([q for q, _ in batch], [p for _, p in batch], padding=True,
+                                   truncation=True, max_length=self.max_length, return_tensors="pt")
+                logits = model(**inputs).logits
+                logits = logits.detach().cpu().numpy() if hasattr(logits, 'detach') else np.asarray(logits)
+                scores.append(logits.reshape(len(batch), -1)[:, -1])
+        return np.concatenate(scores) if scores else np.empty(0, dtype=np.float32)
+
+    def rerank(self, question: str, docs: List[Document], k: int,
+               query_vector: Optional[Sequence[float]] = None,
+               doc_vectors: Optional[np.ndarray] = None) -> List[Document]:
+        return self.rerank_batch([question], [docs], k)[0]
+
+    def rerank_batch(self, questions: List[str], pools: List[List[Document]], k: int,
+                     query_vectors: Optional[Sequence[Sequence[float]]] = None,
+                     doc_vectors: Optional[List[np.ndarray]] = None) -> List[List[Document]]:
+        pairs = [(question, doc.page_content) for question, docs in zip(questions, pools) for doc in docs]
+        scores = self.score(pairs)
+        ranked, offset = [], 0
+        for docs in pools:
+            pool_scores = scores[offset:offset + len(docs)]
+            offset += len(docs)
+            ranked.append([docs[i] for i in np.argsort(-pool_scores, kind='stable')[:k]])
+        return ranked
+
+def load_reranker(name: str = cfg.RERANKER) -> Optional[Reranker]:
+    """The reranker called `name`, or None for 'none'."""
+    if name not in RERANKERS:
+        raise ValueError(f"Unknown reranker '{name}'; expected one of {RERANKERS}")
+    if name == 'mmr':
+        return MMRReranker()
+    if name == 'cross-encoder':
+        return CrossEncoderReranker()
+    return None
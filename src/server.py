@@ -0,0 +1,465 @@
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import src.config as cfg
+from src.filters import SearchFilter
+from src.indexing import split_cpu_threads
+from src.instrumentation import StageRecorder
+from src.startup import StartupReport, start
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from src.rag_pipeline import ComplaintRAG, RAGResult
+
+logger = logging.getLogger(__name__)
+
+METRICS_INTERVAL_SECONDS = 1.0 # how often each worker publishes its metrics file
+LATENCY_WINDOW = 1000 # recent requests per endpoint kept for percentiles
+
+def document_to_dict(doc: "Document") -> Dict[str, Any]:
+    return {'id': doc.id, 'content': doc.page_content, 'metadata': doc.metadata}
+
+def result_to_dict(result: "RAGResult", worker: int) -> Dict[str, Any]:
+    return {
+        'question': result.question,
+        'answer': result.answer,
+        'sources': [document_to_dict(doc) for doc in result.sources],
+        'timings': result.timings,
+        'tokens': result.tokens,
+        'cached': result.cached,
+        'filters': result.filters.to_dict() if result.filters is not None else None,
+        'worker': worker,
+    }
+
+def _json_default(value: Any) -> Any:
+    # numpy scalars in metadata and token counts
+    return value.item() if hasattr(value, 'item') else str(value)
+
+def memory_usage() -> Dict[str, float]:
+    """
+    Resident, proportional (PSS) and shared memory of this process in MB,
+    from /proc/self/smaps_rollup (Linux only; empty elsewhere). Pages shared
+    with the other workers count fully in `rss_mb` but only by their share in
+    `pss_mb`, so summing `pss_mb` over workers gives the real footprint.
+    """
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return {}
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    return {'rss_mb': round(fields.get('Rss', 0) / 1024, 1), 'pss_mb': round(fields.get('Pss', 0) / 1024, 1),
+            'shared_mb': round(shared / 1024, 1)}
+
+def read_pool_metrics(metrics_dir: str) -> List[Dict[str, Any]]:
+    """The latest metrics published by every worker, in worker order."""
+    pool = []
+    for name in sorted(os.listdir(metrics_dir)):
+        if name.startswith('worker-') and name.endswith('.json'):
+            try:
+                with open(os.path.join(metrics_dir, name)) as f:
+                    pool.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return sorted(pool, key=lambda m: m['worker'])
+
+class Worker:
+    """
+    One serving process: its ComplaintRAG, an event loop thread on which
+    /query requests are answered with aquery (so concurrent requests share
+    padded generate() calls), and per-endpoint counters. Metrics are
+    written to `metrics_dir` every METRICS_INTERVAL_SECONDS, which is how
+    any worker can report on the whole pool.
+    """
+
+    def __init__(self, rag: "ComplaintRAG", recorder: StageRecorder, index: int = 0, workers: int = 1,
+                 metrics_dir: Optional[str] = None):
+        self.rag = rag
+        self.recorder = recorder
+        self.index = index
+        self.workers = workers
+        self.metrics_dir = metrics_dir or tempfile.mkdtemp(prefix='rag-server-')
+        self.report: Optional[StartupReport] = None
+        self.started = time.time()
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.failures: Dict[str, int] = defaultdict(int)
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="worker-loop", daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return self.report is not None and self.report.ready
+
+    def start(self, import_seconds: float = 0.0):
+        """Loads and warms up whatever was not preloaded before the fork (see startup.start)."""
+        self.report = start(self.rag, import_seconds=import_seconds)
+        logger.info(f"Worker {self.index} (pid {os.getpid()}):\n{self.report.summary()}")
+        self.publish()
+
+    def publish_forever(self):
+        while True:
+            self.publish()
+            time.sleep(METRICS_INTERVAL_SECONDS)
+
+    def observe(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self.requests[endpoint] += 1
+            if not ok:
+                self.failures[endpoint] += 1
+            self._latencies[endpoint].append(seconds)
+
+    def query(self, question: str, filters: Optional[SearchFilter]) -> "RAGResult":
+        return asyncio.run_coroutine_threadsafe(self.rag.aquery(question, filters), self._loop).result()
+
+    def retrieve(self, question: str, filters: Optional[SearchFilter]) -> List["Document"]:
+        return self.rag.retrieve_only(question, filters)
+
+    def batch(self, questions: List[str], filters: Optional[SearchFilter]) -> List["RAGResult"]:
+        # Through aquery, so batch questions share the bounded generation queue with /query
+        async def answer_all():
+            return await asyncio.gather(*(self.rag.aquery(q, filters) for q in questions))
+
+        return asyncio.run_coroutine_threadsafe(answer_all(), self._loop).result()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = {endpoint: list(values) for endpoint, values in self._latencies.items()}
+            requests, failures = dict(self.requests), dict(self.failures)
+        return {
+            'worker': self.index,
+            'pid': os.getpid(),
+            'uptime_s': round(time.time() - self.started, 1),
+            'ready': self.ready,
+            'startup': asdict(self.report) if self.report is not None else None,
+            'requests': requests,
+            'failures': failures,
+            'latency_ms': {
+                endpoint: {'p50': round(float(np.percentile(values, 50)) * 1000, 1),
+                           'p95': round(float(np.percentile(values, 95)) * 1000, 1)}
+                for endpoint, values in latencies.items()
+            },
+            'stages': self.recorder.summary(),
+            'cache': self.rag.cache_stats(),
+            'queue': self.rag.queue_stats(),
+            'memory': memory_usage(),
+        }
+
+    def publish(self):
+        path = os.path.join(self.metrics_dir, f"worker-{self.index}.json")
+        with self._publish_lock:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(self.metrics(), f, default=_json_default)
+            os.replace(path + '.tmp', path)
+
+    def pool_status(self) -> Dict[str, Any]:
+        """Readiness of the whole pool: every worker has published and finished starting up."""
+        self.publish()
+        pool = read_pool_metrics(self.metrics_dir)
+        workers = {m['worker']: {'pid': m['pid'], 'ready': m['ready'],
+                                 'errors': (m['startup'] or {}).get('errors', {})} for m in pool}
+        ready = len(workers) == self.workers and all(w['ready'] for w in workers.values())
+        return {'ready': ready, 'workers': workers}
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API over one Worker (`self.server.worker`):
+
+    - GET /health: the process is up (liveness).
+    - GET /ready: 200 once every worker has loaded and warmed up, else 503.
+    - GET /metrics: request counts, latencies, stage timings, caches and memory, per worker.
+    - POST /query {"question", "filters"?}: answer and sources.
+    - POST /retrieve {"question", "filters"?}: sources only.
+    - POST /batch {"questions", "filters"?}: answers, queued for generation like /query.
+
+    `filters` takes the SearchFilter.from_dict form, e.g. {"state": "TX"}.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send(self, status: int, body: Dict[str, Any]):
+        payload = json.dumps(body, default=_json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        worker = self.server.worker
+        if self.path == '/health':
+            self._send(200, {'status': 'ok', 'worker': worker.index, 'pid': os.getpid()})
+        elif self.path == '/ready':
+            status = worker.pool_status()
+            self._send(200 if status['ready'] else 503, status)
+        elif self.path == '/metrics':
+            worker.publish()
+            self._send(200, {'workers': read_pool_metrics(worker.metrics_dir)})
+        else:
+            self._send(404, {'error': f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        routes: Dict[str, Callable[[Dict[str, Any]], Tuple[int, Dict[str, Any]]]] = {
+            '/query': self._query, '/retrieve': self._retrieve, '/batch': self._batch,
+        }
+        # The body is read even for bad requests, so the kept-alive connection stays in sync
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        route = routes.get(self.path)
+        if route is None:
+            self._send(404, {'error': f"Unknown endpoint {self.path}"})
+            return
+        start = time.perf_counter()
+        try:
+            payload = json.loads(body or b'{}')
+            if not isinstance(payload, dict):
+                raise ValueError("Request body must be a JSON object")
+            status, response = route(payload)
+        except (ValueError, TypeError) as e:
+            status, response = 400, {'error': str(e)}
+        except Exception as e:
+            logger.exception(f"{self.path} failed")
+            status, response = 500, {'error': str(e)}
+        self.server.worker.observe(self.path, time.perf_counter() - start, status == 200)
+        self._send(status, response)
+
+    @staticmethod
+    def _filters(payload: Dict[str, Any]) -> Optional[SearchFilter]:
+        filters = payload.get('filters')
+        if filters is None:
+            return None
+        if not isinstance(filters, dict):
+            raise ValueError("'filters' must be an object")
+        return SearchFilter.from_dict(filters)
+
+    @staticmethod
+    def _question(payload: Dict[str, Any]) -> str:
+        question = payload.get('question')
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError("'question' must be a non-empty string")
+        return question
+
+    def _query(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        worker = self.server.worker
+        result = worker.query(self._question(payload), self._filters(payload))
+        return 200, result_to_dict(result, worker.index)
+
+    def _retrieve(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        worker = self.server.worker
+        docs = worker.retrieve(self._question(payload), self._filters(payload))
+        return 200, {'sources': [document_to_dict(doc) for doc in docs], 'worker': worker.index}
+
+    def _batch(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        worker = self.server.worker
+        questions = payload.get('questions')
+        if (not isinstance(questions, list) or not questions
+                or not all(isinstance(q, str) and q.strip() for q in questions)):
+            raise ValueError("'questions' must be a non-empty list of strings")
+        if len(questions) > cfg.SERVER_MAX_BATCH:
+            raise ValueError(f"At most {cfg.SERVER_MAX_BATCH} questions per batch")
+        results = worker.batch(questions, self._filters(payload))
+        return 200, {'results': [result_to_dict(r, worker.index) for r in results]}
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer that handles connections on a pool of `threads`
+    instead of starting a thread for each; further connections wait in
+    the pool's queue.
+    """
+
+    def __init__(self, server_address: Tuple[str, int], handler: Callable[..., BaseHTTPRequestHandler],
+                 threads: int = cfg.SERVER_HANDLER_THREADS, bind_and_activate: bool = True):
+        super().__init__(server_address, handler, bind_and_activate)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="http")
+
+    def process_request(self, request: socket.socket, client_address: Tuple[str, int]):
+        self._pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+def preload(rag: "ComplaintRAG") -> Dict[str, float]:
+    """
+    Loads, before forking, the components whose memory the workers can share
+    copy-on-write: the deferred imports, the PyTorch LLM, the in-process
+    index and the BM25 index (memory-mapped, so every worker reads the same
+    page-cache pages).
+    Nothing runs inference here; thread pools started before a fork do not
+    survive it.
+
+    Left to each worker: ONNX Runtime sessions (they own thread pools), the
+    Chroma client (SQLite connections and background threads) and the
+    embedding model (wrapped in an embedding cache with its own SQLite
+    connection; small compared with the LLM).
+
+    Returns:
+        Dict[str, float]: Seconds per preloaded component.
+    """
+    from src.rag_pipeline import import_dependencies
+
+    seconds = {'imports': import_dependencies()}
+    if rag.generation_backend != 'onnx':
+        start_time = time.perf_counter()
+        rag._load_llm()
+        seconds['llm'] = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    if rag.backend != 'chroma':
+        rag._load_index()
+        seconds['index'] = time.perf_counter() - start_time
+    else:
+        rag._sparse_index = rag._load_sparse_index()
+        seconds['sparse_index'] = time.perf_counter() - start_time
+    # Objects that exist now are never collected, so the collector does not write to their shared pages
+    gc.freeze()
+    return seconds
+
+def run_worker(rag: "ComplaintRAG", recorder: StageRecorder, sock: socket.socket, index: int, workers: int,
+               metrics_dir: str, import_seconds: float = 0.0):
+    """Serves requests from the shared listening socket until interrupted."""
+    threads = split_cpu_threads(workers)
+    if rag.intra_op_threads == 0:
+        rag.intra_op_threads = threads
+    worker = Worker(rag, recorder, index, workers, metrics_dir)
+    threading.Thread(target=worker.start, args=(import_seconds,), name="startup", daemon=True).start()
+    threading.Thread(target=worker.publish_forever, name="metrics", daemon=True).start()
+
+    server = PooledHTTPServer(sock.getsockname()[:2], RequestHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    server.daemon_threads = True
+    server.worker = worker
+    logger.info(f"Worker {index} (pid {os.getpid()}, {threads} threads) serving")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+class Supervisor:
+    """
+    Forks the workers of `serve` and restarts any that die, until SIGINT or
+    SIGTERM, which it forwards to them.
+    """
+
+    def __init__(self, rag: "ComplaintRAG", recorder: StageRecorder, sock: socket.socket, workers: int,
+                 metrics_dir: str, import_seconds: float):
+        self.rag = rag
+        self.recorder = recorder
+        self.sock = sock
+        self.workers = workers
+        self.metrics_dir = metrics_dir
+        self.import_seconds = import_seconds
+        self.children: Dict[int, Tuple[int, float]] = {}
+        self.stopping = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            code = 0
+            try:
+                run_worker(self.rag, self.recorder, self.sock, index, self.workers, self.metrics_dir,
+                           self.import_seconds)
+            except BaseException:
+                logger.exception(f"Worker {index} crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = (index, time.time())
+
+    def stop(self, signum: int, frame: Any):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for index in range(self.workers):
+            self.spawn(index)
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index, spawned = self.children.pop(pid, (None, 0.0))
+            if index is not None and not self.stopping:
+                logger.warning(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+                if time.time() - spawned < 5:
+                    time.sleep(1) # do not spin on a worker that fails at startup
+                self.spawn(index)
+
+def serve(host: str = cfg.SERVER_HOST, port: int = cfg.SERVER_PORT, workers: int = cfg.SERVER_WORKERS,
+          backend: str = cfg.SERVER_RETRIEVER_BACKEND):
+    """
+    Runs `workers` pre-forked processes behind one listening socket; the
+    kernel hands each connection to one of them. The supervisor loads the
+    shareable components first (see preload), forks, and restarts workers
+    that die. Without os.fork (Windows) or with one worker, serves in-process.
+    """
+    started = time.perf_counter()
+    from src.rag_pipeline import ComplaintRAG
+    recorder = StageRecorder()
+    # Filters are parsed from the question when the request has none, as in the UI
+    rag = ComplaintRAG(hooks=[recorder], auto_filter=True, backend=backend)
+    sock = socket.create_server((host, port), backlog=128)
+    metrics_dir = tempfile.mkdtemp(prefix='rag-server-')
+    logger.info(f"Listening on http://{host}:{port} with {workers} worker(s)")
+
+    try:
+        if workers <= 1 or not hasattr(os, 'fork'):
+            run_worker(rag, recorder, sock, 0, 1, metrics_dir, time.perf_counter() - started)
+            return
+        if backend == 'chroma':
+            logger.warning("The chroma backend cannot be shared between workers; each opens its own client. "
+                           "Export an in-process index (python -m src.vector_index) and use --backend exact or ivf.")
+        loaded = preload(rag)
+        logger.info("Preloaded before fork: " + ", ".join(f"{k} {v:.1f}s" for k, v in loaded.items()))
+        Supervisor(rag, recorder, sock, workers, metrics_dir, time.perf_counter() - started).run()
+    finally:
+        sock.close()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+def main(argv: Optional[List[str]] = None):
+    from src.vector_index import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Serve the RAG pipeline over HTTP/JSON from several worker processes.")
+    parser.add_argument('--host', default=cfg.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=cfg.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=cfg.SERVER_WORKERS)
+    parser.add_argument('--backend', default=cfg.SERVER_RETRIEVER_BACKEND,
+                        choices=BACKENDS,
+                        help="Retriever backend; the in-process ones are shared by the workers.")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.backend)
+
+if __name__ == "__main__":
+    main()
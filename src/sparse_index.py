@@ -0,0 +1,310 @@
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+from langchain_core.documents import Document
+
+import src.config as cfg
+from src.data_io import read_table, write_table
+from src.filters import DATE_KEY, FILTER_FIELDS, MetadataIndex, SearchFilter
+from src.indexing import stored_content_hashes
+from src.vector_index import DOCUMENTS_FILE, DocumentTable, documents_path, documents_table
+
+logger = logging.getLogger(__name__)
+
+SPARSE_META_FILE = 'sparse.json'
+VOCAB_FILE = 'vocab.json'
+INDPTR_FILE = 'indptr.npy'
+POSTINGS_FILE = 'postings.npy'
+TF_FILE = 'tf.npy'
+WEIGHTS_FILE = 'weights.npy'
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Common English words plus the XX/XXXX redaction marks in CFPB narratives
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been before being but by can could did do does
+for from had has have he her him his how i if in into is it its me my no not of on or our out she
+so than that the their them then there these they this to was we were what when where which who
+why will with would you your xx xxx xxxx xxxxxxxx
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms without stopwords; 'Zelle' and 'zelle' are the same term."""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+@dataclass
+class SparseSyncStats:
+    """Outcome of a (possibly incremental) sparse index build."""
+    added: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    terms: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (f"{self.added} added, {self.updated} updated, {self.deleted} deleted, "
+                f"{self.unchanged} unchanged; {self.terms} terms in {self.seconds:.1f}s")
+
+class BM25Index:
+    """
+    Okapi BM25 over a CSR inverted index.
+
+    Term t's postings are rows postings[indptr[t]:indptr[t + 1]], stored
+    with their precomputed BM25 weight idf(t) * tf(k1 + 1) / (tf + k1(1 -
+    b + b dl/avgdl)). A query scatter-adds the contiguous posting slices of
+    its few terms into a score array, then takes the top k with one
+    argpartition over the rows those postings touch; there is no
+    per-document Python work.
+
+    Given the dense index's DocumentTable (`documents`), results are read
+    from that table, and the BM25 documents file only contributes its IDs
+    and filter columns, so the texts are not held twice.
+
+    Attributes:
+        path (str): Index directory written by build_sparse_index.
+        count (int): Number of indexed chunks.
+        documents (DocumentTable): Table the returned Documents are read from.
+    """
+
+    def __init__(self, path: str = str(cfg.SPARSE_INDEX_PATH), documents: Optional[DocumentTable] = None):
+        self.path = str(path)
+        with open(os.path.join(self.path, SPARSE_META_FILE)) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(self.path, VOCAB_FILE)) as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        self.count = self.meta['count']
+        self.indptr = np.load(os.path.join(self.path, INDPTR_FILE))
+        self.postings = np.load(os.path.join(self.path, POSTINGS_FILE), mmap_mode='r')
+        self.weights = np.load(os.path.join(self.path, WEIGHTS_FILE), mmap_mode='r')
+        # One zeroed score array per searching thread, reused across queries
+        self._buffers = threading.local()
+        filter_columns = list(FILTER_FIELDS.values()) + [DATE_KEY]
+        own = DocumentTable(documents_path(self.path), None if documents is None else ['id'] + filter_columns)
+        self.metadata_index = MetadataIndex(own.frame(filter_columns))
+        # Row of each BM25 row in the shared table; None when reading from our own file
+        self._shared_rows: Optional[np.ndarray] = None
+        if documents is not None:
+            shared_rows = pc.index_in(own.table['id'], value_set=documents.table['id']).fill_null(-1)
+            shared_rows = shared_rows.to_numpy().astype(np.int64)
+            if (shared_rows >= 0).all():
+                self._shared_rows = shared_rows
+            else:
+                logger.info(f"{int((shared_rows < 0).sum())} BM25 chunks are not in the dense index; "
+                            f"reading documents from {self.path}")
+                documents = None
+        self.documents = documents if documents is not None else DocumentTable(documents_path(self.path))
+
+    def _score_buffer(self) -> np.ndarray:
+        scores = getattr(self._buffers, 'scores', None)
+        if scores is None:
+            scores = self._buffers.scores = np.zeros(self.count, dtype=np.float32)
+        return scores
+
+    def search(self, query: str, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k chunks by BM25 score.
+
+        Args:
+            query (str): Free text; tokenized like the indexed chunks.
+            k (int): Maximum number of results.
+            rows (np.ndarray): Optional sorted rows to restrict the results to.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row indices and scores, best first;
+            only rows sharing at least one term with the query are returned.
+        """
+        term_ids = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+        if not term_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        spans = [(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        touched = np.unique(np.concatenate([self.postings[start:stop] for start, stop in spans]))
+        # Rows are unique within one term's postings, so each term is a plain scatter-add
+        scores = self._score_buffer()
+        try:
+            for start, stop in spans:
+                scores[self.postings[start:stop]] += self.weights[start:stop]
+            candidates = scores[touched]
+        finally:
+            # Only the touched rows changed; zeroing them readies the buffer for the next query
+            scores[touched] = 0.0
+        if rows is not None:
+            keep = np.isin(touched, np.asarray(rows, dtype=np.int64))
+            touched, candidates = touched[keep], candidates[keep]
+        k = min(k, int(np.count_nonzero(candidates)))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-candidates, k - 1)[:k]
+        top = top[np.argsort(-candidates[top], kind='stable')]
+        return touched[top].astype(np.int64), candidates[top]
+
+    def search_documents(self, query: str, k: int, filter: Any = None) -> List[Document]:
+        """search() returning Documents; `filter` is a SearchFilter or its dict form."""
+        if isinstance(filter, Mapping):
+            filter = SearchFilter.from_dict(filter)
+        rows = self.metadata_index.rows(filter) if filter is not None else None
+        found, _ = self.search(query, k, rows=rows)
+        return self.documents.documents(found if self._shared_rows is None else self._shared_rows[found])
+
+def reciprocal_rank_fusion(rankings: Sequence[List[Document]], weights: Optional[Sequence[float]] = None,
+                           k: int = cfg.RRF_K) -> List[Document]:
+    """
+    Merges ranked lists with weighted reciprocal-rank fusion: a document
+    scores sum(weight / (k + rank)) over the lists it appears in. Documents
+    are matched by ID (content for documents without one).
+
+    Args:
+        rankings (Sequence[List[Document]]): Ranked results, best first, e.g. [dense, bm25].
+        weights (Sequence[float]): One weight per list; defaults to 1.0 each.
+        k (int): Rank offset; larger values flatten the gap between top ranks.
+
+    Returns:
+        List[Document]: Every distinct document, best fused score first.
+    """
+    weights = [1.0] * len(rankings) if weights is None else list(weights)
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            docs.setdefault(key, doc)
+    # sorted() is stable, so ties keep the order of the first list they appeared in
+    return [docs[key] for key in sorted(scores, key=lambda key: -scores[key])]
+
+def _count_terms(texts: Iterable[str], vocab: Dict[str, int], first_row: int) -> Tuple[np.ndarray, ...]:
+    """(term, row, tf) triplets for `texts`, adding unseen terms to `vocab`."""
+    terms, rows, tfs = [], [], []
+    for row, text in enumerate(texts, start=first_row):
+        for term, tf in Counter(tokenize(text)).items():
+            terms.append(vocab.setdefault(term, len(vocab)))
+            rows.append(row)
+            tfs.append(tf)
+    return (np.asarray(terms, dtype=np.int64), np.asarray(rows, dtype=np.int64),
+            np.minimum(np.asarray(tfs, dtype=np.int64), np.iinfo(np.uint16).max))
+
+def build_sparse_index(vector_store, output_dir: str = str(cfg.SPARSE_INDEX_PATH), incremental: bool = True,
+                       k1: float = cfg.BM25_K1, b: float = cfg.BM25_B, page_size: int = 10000) -> SparseSyncStats:
+    """
+    Builds or updates the BM25 index from the chunks of a langchain Chroma store.
+
+    In incremental mode the existing index is diffed against the store by
+    content hash (see indexing.assign_chunk_id): only new or changed chunks
+    are fetched and tokenized, and the postings of unchanged chunks are
+    reused. The CSR arrays and BM25 weights are then rebuilt with
+    vectorized sorts, which is cheap next to tokenization.
+
+    Args:
+        vector_store: Chroma store holding the chunks.
+        output_dir (str): Index directory.
+        incremental (bool): Reuse an existing index in `output_dir` when there is one.
+        k1 (float): BM25 term-frequency saturation.
+        b (float): BM25 document-length normalization.
+        page_size (int): Chunks fetched from the store per call.
+
+    Returns:
+        SparseSyncStats: Counts per outcome.
+    """
+    start = time.perf_counter()
+    stats = SparseSyncStats()
+    collection = vector_store._collection
+    stored = stored_content_hashes(vector_store, page_size)
+
+    vocab: Dict[str, int] = {}
+    old_docs = pd.DataFrame(columns=['id', 'content_hash'])
+    terms = rows = tfs = np.empty(0, dtype=np.int64)
+    if incremental and os.path.exists(os.path.join(output_dir, SPARSE_META_FILE)):
+        with open(os.path.join(output_dir, VOCAB_FILE)) as f:
+            vocab = json.load(f)
+        old_docs = read_table(documents_path(output_dir))
+        indptr = np.load(os.path.join(output_dir, INDPTR_FILE))
+        terms = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        rows = np.load(os.path.join(output_dir, POSTINGS_FILE)).astype(np.int64)
+        tfs = np.load(os.path.join(output_dir, TF_FILE)).astype(np.int64)
+
+    # Keep indexed chunks whose content is unchanged; renumber them compactly
+    keep = np.array([stored.get(chunk_id, '\0') == chunk_hash
+                     for chunk_id, chunk_hash in zip(old_docs['id'], old_docs['content_hash'])], dtype=bool)
+    new_row = np.cumsum(keep) - 1
+    posting_keep = keep[rows] if len(rows) else np.empty(0, dtype=bool)
+    terms, rows, tfs = terms[posting_keep], new_row[rows[posting_keep]], tfs[posting_keep]
+    kept_docs = old_docs[keep]
+    kept_ids = set(kept_docs['id'])
+    old_ids = set(old_docs['id'])
+    stats.unchanged = len(kept_docs)
+    stats.deleted = len(old_ids - set(stored))
+
+    changed = [chunk_id for chunk_id in stored if chunk_id not in kept_ids]
+    stats.updated = sum(1 for chunk_id in changed if chunk_id in old_ids)
+    stats.added = len(changed) - stats.updated
+    tables = [kept_docs]
+    offset = len(kept_docs)
+    for begin in range(0, len(changed), page_size):
+        page = collection.get(ids=changed[begin:begin + page_size], include=['documents', 'metadatas'])
+        table = documents_table(page['ids'], page['documents'], page['metadatas'])
+        table['content_hash'] = [(m or {}).get('content_hash') for m in page['metadatas']]
+        new_terms, new_rows, new_tfs = _count_terms(table['text'], vocab, offset)
+        terms = np.concatenate([terms, new_terms])
+        rows = np.concatenate([rows, new_rows])
+        tfs = np.concatenate([tfs, new_tfs])
+        tables.append(table)
+        offset += len(table)
+    docs = pd.concat(tables, ignore_index=True) if len(tables) > 1 else kept_docs.reset_index(drop=True)
+    if docs.empty:
+        raise ValueError("Cannot build a sparse index from an empty vector store")
+    _write_csr(output_dir, docs, vocab, terms, rows, tfs, k1, b)
+    stats.terms = len(vocab)
+    stats.seconds = time.perf_counter() - start
+    logger.info(f"Sparse index at {output_dir}: {stats.summary()}")
+    return stats
+
+def _write_csr(output_dir: str, docs: pd.DataFrame, vocab: Dict[str, int], terms: np.ndarray,
+               rows: np.ndarray, tfs: np.ndarray, k1: float, b: float):
+    """Sorts (term, row, tf) triplets into CSR order and writes them with their BM25 weights."""
+    os.makedirs(output_dir, exist_ok=True)
+    count = len(docs)
+    order = np.lexsort((rows, terms))
+    terms, rows, tfs = terms[order], rows[order], tfs[order]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(vocab)))]).astype(np.int64)
+
+    doc_len = np.bincount(rows, weights=tfs, minlength=count)
+    avgdl = float(doc_len.mean()) if count else 0.0
+    df = np.diff(indptr)
+    idf = np.log1p((count - df + 0.5) / (df + 0.5))
+    norm = k1 * (1.0 - b + b * doc_len[rows] / max(avgdl, 1e-9))
+    weights = idf[terms] * tfs * (k1 + 1.0) / (tfs + norm)
+
+    np.save(os.path.join(output_dir, INDPTR_FILE), indptr)
+    np.save(os.path.join(output_dir, POSTINGS_FILE), rows.astype(np.int32))
+    np.save(os.path.join(output_dir, TF_FILE), tfs.astype(np.uint16))
+    np.save(os.path.join(output_dir, WEIGHTS_FILE), weights.astype(np.float32))
+    write_table(docs, os.path.join(output_dir, DOCUMENTS_FILE), replace=True)
+    with open(os.path.join(output_dir, VOCAB_FILE), 'w') as f:
+        json.dump(vocab, f)
+    with open(os.path.join(output_dir, SPARSE_META_FILE), 'w') as f:
+        json.dump({'count': count, 'postings': int(len(rows)), 'avgdl': avgdl, 'k1': k1, 'b': b}, f)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build or update the BM25 index from the Chroma store.")
+    parser.add_argument('--vector-store', default=str(cfg.VECTOR_STORE_PATH))
+    parser.add_argument('--output', default=str(cfg.SPARSE_INDEX_PATH))
+    parser.add_argument('--full', action='store_true', help="Rebuild from scratch instead of updating.")
+    args = parser.parse_args(argv)
+
+    from langchain_chroma import Chroma
+    stats = build_sparse_index(Chroma(persist_directory=args.vector_store), args.output,
+                               incremental=not args.full)
+    print(f"Sparse index: {stats.summary()}")
+
+if __name__ == "__main__":
+    main()
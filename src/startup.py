@@ -0,0 +1,214 @@
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+import src.config as cfg
+
+if TYPE_CHECKING:
+    from src.rag_pipeline import ComplaintRAG
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MODEL_FILE = 'model.pt'
+SNAPSHOT_TOKENIZER_DIR = 'tokenizer'
+SNAPSHOT_META_FILE = 'snapshot.json'
+
+# Components loaded in parallel by start(), in report order
+COMPONENTS = ('embedder', 'index', 'llm')
+
+@dataclass
+class StartupReport:
+    """
+    Where the time to a ready pipeline went.
+
+    Attributes:
+        import_seconds (float): Importing the application modules (measured by the caller).
+        dependency_seconds (float): Importing the deferred heavy dependencies.
+        load_seconds (Dict[str, float]): Loading each component; these overlap.
+        warmup_seconds (Dict[str, float]): First inference per component ("retrieval" included).
+        ready_seconds (float): Launch to ready: all of the above, as it was overlapped.
+        errors (Dict[str, str]): Components that failed to load or warm up.
+    """
+    import_seconds: float = 0.0
+    dependency_seconds: float = 0.0
+    load_seconds: Dict[str, float] = field(default_factory=dict)
+    warmup_seconds: Dict[str, float] = field(default_factory=dict)
+    ready_seconds: float = 0.0
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ready(self) -> bool:
+        return not self.errors
+
+    def summary(self) -> str:
+        lines = [f"Imports: {self.import_seconds:.2f}s, deferred dependencies: {self.dependency_seconds:.2f}s"]
+        for name in list(COMPONENTS) + ['retrieval']:
+            if name in self.load_seconds or name in self.warmup_seconds:
+                lines.append(f"  {name}: load {self.load_seconds.get(name, 0.0):.2f}s, "
+                             f"warm-up {self.warmup_seconds.get(name, 0.0):.2f}s")
+        for name, error in self.errors.items():
+            lines.append(f"  {name} FAILED: {error}")
+        lines.append(f"{'Ready' if self.ready else 'Started with errors'} in {self.ready_seconds:.2f}s")
+        return "\n".join(lines)
+
+def _timed(step: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    step()
+    return time.perf_counter() - start
+
+def start(rag: "ComplaintRAG", warm_up: bool = cfg.STARTUP_WARMUP,
+          question: str = cfg.STARTUP_WARMUP_QUESTION, import_seconds: float = 0.0) -> StartupReport:
+    """
+    Loads everything a query needs before the first user arrives.
+
+    The deferred imports run first, on this thread (they hold the interpreter
+    lock anyway). The embedding model, the vector store plus sparse index, and
+    the LLM then load on three threads; weight loading is mostly I/O and
+    native code, so they overlap. With `warm_up`, the embedder and the LLM
+    each run one inference on their thread, and a retrieval runs as soon as
+    embedder and index are both up. A failing component is logged and
+    reported, not raised, so the caller can still serve (and report) health.
+
+    Args:
+        rag (ComplaintRAG): Pipeline to load.
+        warm_up (bool): Run the warm-up inferences.
+        question (str): Text used for warm-up.
+        import_seconds (float): Time the caller spent importing, for the report.
+
+    Returns:
+        StartupReport: Per-component timings and errors.
+    """
+    from src.rag_pipeline import import_dependencies
+
+    report = StartupReport(import_seconds=import_seconds)
+    launched = time.perf_counter()
+    report.dependency_seconds = import_dependencies()
+
+    tasks = {
+        'embedder': (rag._load_embedding_fn, rag._warm_up_embedder),
+        'index': (rag._load_index, None),
+        'llm': (rag._load_llm, rag._warm_up_generator),
+    }
+
+    def run(name: str):
+        load, warm = tasks[name]
+        try:
+            report.load_seconds[name] = _timed(load)
+            if warm_up and warm is not None:
+                report.warmup_seconds[name] = _timed(lambda: warm(question))
+        except Exception as e:
+            logger.error(f"Startup: {name} failed: {e}")
+            report.errors[name] = str(e)
+
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="startup") as executor:
+        futures = {name: executor.submit(run, name) for name in tasks}
+        futures['embedder'].result()
+        futures['index'].result()
+        if warm_up and not {'embedder', 'index'} & set(report.errors):
+            try:
+                report.warmup_seconds['retrieval'] = _timed(lambda: rag._warm_up_retrieval(question))
+            except Exception as e:
+                logger.error(f"Startup: retrieval warm-up failed: {e}")
+                report.errors['retrieval'] = str(e)
+        futures['llm'].result()
+
+    report.ready_seconds = import_seconds + time.perf_counter() - launched
+    logger.info(f"Startup finished in {report.ready_seconds:.2f}s (ready={report.ready})")
+    return report
+
+def snapshot_path(model_name: str, directory: str = str(cfg.LLM_SNAPSHOT_DIR)) -> str:
+    return os.path.join(directory, re.sub(r'[^A-Za-z0-9._-]+', '--', model_name))
+
+def _versions() -> Dict[str, str]:
+    import torch
+    import transformers
+    return {'torch': torch.__version__, 'transformers': transformers.__version__}
+
+def _snapshot_meta(model_name: str, directory: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(snapshot_path(model_name, directory), SNAPSHOT_META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def snapshot_tokenizer_path(model_name: str, directory: str = str(cfg.LLM_SNAPSHOT_DIR)) -> Optional[str]:
+    """Local copy of the tokenizer saved with a snapshot (no hub lookup), if there is one."""
+    if _snapshot_meta(model_name, directory) is None:
+        return None
+    return os.path.join(snapshot_path(model_name, directory), SNAPSHOT_TOKENIZER_DIR)
+
+def save_model_snapshot(model_name: str, tokenizer: Any, model: Any,
+                        directory: str = str(cfg.LLM_SNAPSHOT_DIR)) -> str:
+    """
+    Serializes the loaded model with torch.save (the whole module, not just
+    the weights) and the tokenizer with save_pretrained. Loading it back
+    skips from_pretrained's hub lookups, config parsing and weight
+    initialization.
+
+    Returns:
+        str: Snapshot directory.
+    """
+    import torch
+
+    path = snapshot_path(model_name, directory)
+    os.makedirs(path, exist_ok=True)
+    tokenizer.save_pretrained(os.path.join(path, SNAPSHOT_TOKENIZER_DIR))
+    torch.save(model, os.path.join(path, SNAPSHOT_MODEL_FILE))
+    with open(os.path.join(path, SNAPSHOT_META_FILE), 'w') as f:
+        json.dump({'model': model_name, **_versions()}, f)
+    logger.info(f"Saved {model_name} snapshot to {path}")
+    return path
+
+def load_model_snapshot(model_name: str, directory: str = str(cfg.LLM_SNAPSHOT_DIR)) -> Optional[Any]:
+    """
+    The model saved by save_model_snapshot, or None if there is no snapshot
+    or it was written by other torch/transformers versions (a pickled module
+    is only safe to load with the classes it was saved from).
+
+    The snapshot is unpickled (weights_only=False), so only load snapshots
+    this application wrote.
+    """
+    meta = _snapshot_meta(model_name, directory)
+    if meta is None:
+        return None
+    import torch
+
+    if meta != {'model': model_name, **_versions()}:
+        logger.warning(f"Ignoring stale model snapshot {meta}; delete it or rerun `python -m src.startup --snapshot`")
+        return None
+    start = time.perf_counter()
+    model = torch.load(os.path.join(snapshot_path(model_name, directory), SNAPSHOT_MODEL_FILE),
+                       weights_only=False, mmap=True)
+    model.eval()
+    logger.info(f"Loaded {model_name} snapshot in {time.perf_counter() - start:.2f}s")
+    return model
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load and warm up the RAG pipeline, reporting time to ready.")
+    parser.add_argument('--snapshot', action='store_true',
+                        help="Save a torch snapshot of the LLM for faster later starts.")
+    parser.add_argument('--no-warm-up', action='store_true', help="Only load, skip the warm-up inferences.")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    from src.rag_pipeline import ComplaintRAG
+    import_seconds = time.perf_counter() - started
+
+    rag = ComplaintRAG()
+    report = start(rag, warm_up=not args.no_warm_up, import_seconds=import_seconds)
+    print(report.summary())
+    if args.snapshot and rag.generation_backend != 'torch':
+        # int8 is quantized at load time from the fp32 snapshot; onnx has its own export
+        print(f"--snapshot needs the torch backend, not '{rag.generation_backend}'")
+    elif args.snapshot and 'llm' not in report.errors:
+        tokenizer, model = rag._load_generator()
+        print(f"Snapshot saved to {save_model_snapshot(rag.llm_model_name, tokenizer, model)}")
+
+if __name__ == "__main__":
+    main()
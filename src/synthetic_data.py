@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+# Raw CFPB products, including ones that process_data.py filters out.
+PRODUCTS = [
+    'Credit card',
+    'Credit card or prepaid card',
+    'Payday loan, title loan, or personal loan',
+    'Checking or savings account',
+    'Money transfer, virtual currency, or money service',
+    'Money transfers',
+    'Mortgage',
+    'Debt collection',
+    'Credit reporting, credit repair services, or other personal consumer reports',
+]
+PRODUCT_WEIGHTS = [0.12, 0.12, 0.06, 0.12, 0.08, 0.02, 0.14, 0.14, 0.20]
+
+SUB_PRODUCTS = [
+    'General-purpose credit card or charge card',
+    'Savings account',
+    'Checking account',
+    'Other banking product or service',
+    'CD (Certificate of Deposit)',
+    'Domestic (US) money transfer',
+    'Installment loan',
+    None,
+]
+
+ISSUES = [
+    'Fees or interest',
+    'Problem with a purchase shown on your statement',
+    'Managing an account',
+    'Fraud or scam',
+    'Trouble during payment process',
+    'Getting a line of credit',
+]
+
+COMPANIES = [
+    'SYNCHRONY FINANCIAL',
+    'CAPITAL ONE FINANCIAL CORPORATION',
+    'JPMORGAN CHASE & CO.',
+    'BANK OF AMERICA, NATIONAL ASSOCIATION',
+    'PAYPAL HOLDINGS, INC.',
+    'Block, Inc.',
+    'WELLS FARGO & COMPANY',
+]
+
+STATES = ['TX', 'CA', 'NY', 'FL', 'GA', 'IL', 'PA', 'OH', 'NC', 'WA', None]
+
+WORDS = (
+    "i my the a to and was of on for account card bank they me that this "
+    "fee fees late charged interest payment transfer money loan savings "
+    "credit dispute fraud zelle called told customer service days refund "
+    "balance statement closed without notice unauthorized transaction "
+    "XXXX XX/XX/XXXX {$100.00} never received still waiting"
+).split()
+
+# Mixed-case and odd-whitespace tokens that cleaning has to handle.
+NOISE_TOKENS = ['Chase', 'PayPal', 'CAPITAL', '"unauthorized"', '\t', '\n\n', '  ', '\x0b', '\x1f', 'Xx', 'XXXXXXXX']
+# Non-ASCII tokens are rarer: roughly one narrative in ten contains one.
+UNICODE_TOKENS = ['café', 'İstanbul', 'don’t', '\xa0', 'ÆON', '\u2003']
+
+def _narratives(rng: np.random.Generator, n_rows: int, max_words: int) -> list:
+    lengths = rng.integers(1, max_words, size=n_rows)
+    vocabulary = WORDS + [w.upper() for w in WORDS] + NOISE_TOKENS + UNICODE_TOKENS
+    # ~5% upper-cased words, ~2% noise tokens and ~0.07% non-ASCII tokens
+    weights = np.concatenate([
+        np.full(len(WORDS), 0.9293 / len(WORDS)),
+        np.full(len(WORDS), 0.05 / len(WORDS)),
+        np.full(len(NOISE_TOKENS), 0.02 / len(NOISE_TOKENS)),
+        np.full(len(UNICODE_TOKENS), 0.0007 / len(UNICODE_TOKENS)),
+    ])
+    indices = rng.choice(len(vocabulary), size=int(lengths.sum()), p=weights)
+    words = [vocabulary[i] for i in indices.tolist()]
+
+    narratives = []
+    offset = 0
+    for length in lengths.tolist():
+        narratives.append(' '.join(words[offset:offset + length]))
+        offset += length
+    return narratives
+
+def generate_complaints(n_rows: int, seed: int = 42, max_words: int = 300,
+                        narrative_fraction: float = 0.6) -> pd.DataFrame:
+    """
+    Generates a synthetic stand-in for the raw CFPB complaints dump.
+
+    The frame has the same column names as `data/complaints.csv` and covers
+    the cases the preprocessing has to handle (non-target products, ambiguous
+    checking/savings sub-products, missing narratives, redactions, mixed case
+    and non-ASCII text), so tests and benchmarks can run without the real data.
+
+    Args:
+        n_rows (int): Number of complaints to generate.
+        seed (int): Random seed; the same seed always yields the same frame.
+        max_words (int): Upper bound on words per narrative.
+        narrative_fraction (float): Share of rows with a consumer narrative.
+
+    Returns:
+        pd.DataFrame: Raw complaints with every value stored as a string.
+    """
+    rng = np.random.default_rng(seed)
+    narratives = np.array(_narratives(rng, n_rows, max_words), dtype=object)
+    narratives[rng.random(n_rows) >= narrative_fraction] = None
+
+    dates = pd.Timestamp('2019-01-01') + pd.to_timedelta(rng.integers(0, 5 * 365, size=n_rows), unit='D')
+    df = pd.DataFrame({
+        'Date received': dates.strftime('%Y-%m-%d'),
+        'Product': rng.choice(PRODUCTS, size=n_rows, p=PRODUCT_WEIGHTS),
+        'Sub-product': rng.choice(np.array(SUB_PRODUCTS, dtype=object), size=n_rows),
+        'Issue': rng.choice(ISSUES, size=n_rows),
+        'Sub-issue': None,
+        'Consumer complaint narrative': narratives,
+        'Company public response': None,
+        'Company': rng.choice(COMPANIES, size=n_rows),
+        'State': rng.choice(np.array(STATES, dtype=object), size=n_rows),
+        'ZIP code': rng.integers(10000, 99999, size=n_rows).astype(str),
+        'Tags': None,
+        'Consumer consent provided?': 'Consent provided',
+        'Submitted via': 'Web',
+        'Complaint ID': (1_000_000 + np.arange(n_rows)).astype(str),
+    })
+    return df.astype(object).where(df.notna(), None)
+
+def write_raw_csv(path: str, n_rows: int, seed: int = 42, **kwargs) -> str:
+    """Writes `generate_complaints(n_rows, seed)` to `path` as a CFPB-style CSV."""
+    generate_complaints(n_rows, seed=seed, **kwargs).to_csv(path, index=False)
+    return path
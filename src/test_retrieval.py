@@ -1,6 +1,7 @@
 
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
+from src.embeddings import cached_embeddings
 
 VECTOR_STORE_PATH = 'vector_store'
 EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
@@ -8,7 +9,7 @@ EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
 def main():
     print(f"Loading Vector Store from {VECTOR_STORE_PATH}...")
     try:
-        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        embeddings = cached_embeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL), EMBEDDING_MODEL)
         vector_store = Chroma(
             persist_directory=VECTOR_STORE_PATH,
             embedding_function=embeddings
@@ -0,0 +1,662 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+import src.config as cfg
+from src.data_io import TableWriter, read_arrow, replacing
+from src.filters import DATE_FIELD, DATE_KEY, FILTER_FIELDS, MetadataIndex, SearchFilter, date_key
+
+logger = logging.getLogger(__name__)
+
+# Retriever backends selectable through cfg.RETRIEVER_BACKEND
+BACKENDS = ('chroma', 'exact', 'ivf', 'quantized')
+# Compressed encodings for the 'quantized' backend
+QUANT_CODECS = ('float16', 'int8', 'pq')
+
+INDEX_META_FILE = 'index.json'
+VECTORS_FILE = 'vectors.npy'
+NORMS_FILE = 'norms.npy'
+# Arrow IPC, so the table can be memory-mapped (and shared by forked workers)
+DOCUMENTS_FILE = 'documents.arrow'
+# Written by exports that predate DOCUMENTS_FILE; still read
+LEGACY_DOCUMENTS_FILE = 'documents.parquet'
+IVF_CENTROIDS_FILE = 'ivf_centroids.npy'
+IVF_ORDER_FILE = 'ivf_order.npy'
+IVF_OFFSETS_FILE = 'ivf_offsets.npy'
+IVF_VECTORS_FILE = 'ivf_vectors.npy'
+QUANT_FILES = {'float16': 'vectors_f16.npy', 'int8': 'vectors_i8.npy', 'pq': 'pq_codes.npy'}
+INT8_PARAMS_FILE = 'int8_params.npy'
+INT8_NORMS_FILE = 'int8_norms.npy'
+PQ_CODEBOOKS_FILE = 'pq_codebooks.npy'
+
+# Rows scored per matrix product; bounds the temporary score matrix to queries x BLOCK_ROWS
+BLOCK_ROWS = 16384
+
+def documents_path(directory: str) -> str:
+    """The documents file of an index directory, falling back to the Parquet file of older exports."""
+    path = os.path.join(directory, DOCUMENTS_FILE)
+    legacy = os.path.join(directory, LEGACY_DOCUMENTS_FILE)
+    return legacy if not os.path.exists(path) and os.path.exists(legacy) else path
+
+def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k smallest distances per row, sorted ascending."""
+    k = min(k, distances.shape[1])
+    if k == 0:
+        return np.empty((distances.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(distances, part, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1)
+
+class ExactIndex:
+    """
+    Exact L2 search over a memory-mapped float32 matrix.
+
+    Distances are computed as ||x||^2 - 2 q.x + ||q||^2 with one BLAS matrix
+    product per block of rows, which ranks neighbours exactly as Chroma's
+    default L2 space does, without the SQLite and metadata layers.
+
+    Attributes:
+        path (str): Index directory written by export_from_chroma.
+        count (int): Number of indexed vectors.
+        dim (int): Vector dimensionality.
+    """
+
+    backend = 'exact'
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        with open(os.path.join(self.path, INDEX_META_FILE)) as f:
+            meta = json.load(f)
+        self.count = meta['count']
+        self.dim = meta['dim']
+        self.vectors = np.load(os.path.join(self.path, VECTORS_FILE), mmap_mode='r')
+        self.norms = np.load(os.path.join(self.path, NORMS_FILE))
+
+    def search(self, queries: np.ndarray, k: int,
+               rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k nearest rows for every query.
+
+        Args:
+            queries (np.ndarray): (m, dim) query vectors.
+            k (int): Neighbours per query.
+            rows (np.ndarray): Optional sorted row numbers to restrict the search to
+                (e.g. from a MetadataIndex); only those vectors are read.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (m, k) row indices and their squared L2 distances.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if rows is not None:
+            return self._search_rows(queries, k, rows)
+        idx, dist = self._blocked_top_k(queries, k)
+        return idx, dist + np.einsum('ij,ij->i', queries, queries)[:, None]
+
+    def _search_rows(self, queries: np.ndarray, k: int, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact search over a subset of rows; cost grows with the subset, not the corpus."""
+        best_idx = np.full((len(queries), 0), -1, dtype=np.int64)
+        best_dist = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            dist = np.concatenate([best_dist, self.norms[block] - 2.0 * (queries @ self.vectors[block].T)], axis=1)
+            idx = np.concatenate([best_idx, np.broadcast_to(block, (len(queries), len(block)))], axis=1)
+            keep = _top_k(dist, k)
+            best_dist = np.take_along_axis(dist, keep, axis=1)
+            best_idx = np.take_along_axis(idx, keep, axis=1)
+        return best_idx, best_dist + np.einsum('ij,ij->i', queries, queries)[:, None]
+
+    def _prepare(self, queries: np.ndarray) -> Any:
+        """Per-search query state handed to _block_distances (kept off self for thread safety)."""
+        return queries
+
+    def _block_distances(self, prepared: Any, start: int, stop: int) -> np.ndarray:
+        """Squared L2 distances to rows start:stop, minus the per-query constant ||q||^2."""
+        return self.norms[start:stop] - 2.0 * (prepared @ self.vectors[start:stop].T)
+
+    def _blocked_top_k(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        prepared = self._prepare(queries)
+        best_idx = np.empty((len(queries), 0), dtype=np.int64)
+        best_dist = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, self.count, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, self.count)
+            dist = self._block_distances(prepared, start, stop)
+            local = _top_k(dist, k)
+            # Merge the block's own top k with the best seen so far
+            dist = np.concatenate([best_dist, np.take_along_axis(dist, local, axis=1)], axis=1)
+            idx = np.concatenate([best_idx, local + start], axis=1)
+            keep = _top_k(dist, k)
+            best_dist = np.take_along_axis(dist, keep, axis=1)
+            best_idx = np.take_along_axis(idx, keep, axis=1)
+        return best_idx, best_dist
+
+class IVFIndex(ExactIndex):
+    """
+    Approximate inverted-file (IVF) search.
+
+    Vectors are clustered by k-means into `n_lists` lists at build time and
+    stored contiguously per list. A query is only compared against the
+    vectors in its `nprobe` nearest lists, so raising `nprobe` trades speed
+    for recall (nprobe == n_lists is exact).
+    """
+
+    backend = 'ivf'
+
+    def __init__(self, path: str, nprobe: int = cfg.IVF_NPROBE):
+        super().__init__(path)
+        if not os.path.exists(os.path.join(self.path, IVF_CENTROIDS_FILE)):
+            raise FileNotFoundError(f"No IVF lists in {self.path}; run `python -m src.vector_index --ivf`")
+        self.centroids = np.load(os.path.join(self.path, IVF_CENTROIDS_FILE))
+        self.order = np.load(os.path.join(self.path, IVF_ORDER_FILE))
+        self.offsets = np.load(os.path.join(self.path, IVF_OFFSETS_FILE))
+        self.list_vectors = np.load(os.path.join(self.path, IVF_VECTORS_FILE), mmap_mode='r')
+        self.list_norms = self.norms[self.order]
+        self.centroid_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.nprobe = max(1, min(nprobe, len(self.centroids)))
+
+    def search(self, queries: np.ndarray, k: int,
+               rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if rows is not None:
+            # A filtered subset is already small; search it exactly
+            return self._search_rows(queries, k, rows)
+        probes = _top_k(self.centroid_norms - 2.0 * (queries @ self.centroids.T), self.nprobe)
+
+        all_idx = np.full((len(queries), k), -1, dtype=np.int64)
+        all_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for qi, query in enumerate(queries):
+            # Lists are contiguous, so each probe is a slice of the matrix rather than a gather
+            ranges = [(self.offsets[p], self.offsets[p + 1]) for p in probes[qi]]
+            rows = np.concatenate([np.arange(a, b) for a, b in ranges])
+            if len(rows) == 0:
+                continue
+            dist = np.concatenate([
+                self.list_norms[a:b] - 2.0 * (self.list_vectors[a:b] @ query) for a, b in ranges
+            ])
+            keep = _top_k(dist[None, :], k)[0]
+            all_idx[qi, :len(keep)] = self.order[rows[keep]]
+            all_dist[qi, :len(keep)] = dist[keep] + query @ query
+        return all_idx, all_dist
+
+class QuantizedIndex(ExactIndex):
+    """
+    Search over compressed vectors with exact re-ranking.
+
+    The candidate scan reads only the quantized copy written by
+    quantize_index: float16 (2x smaller), per-dimension int8 (4x) or product
+    quantization (pq_subvectors bytes per vector, e.g. 32x smaller for
+    384-dim vectors with 48 subvectors). NumPy has no float16 BLAS, so
+    float16 saves memory but scans slower than int8 or pq. The best `rerank` candidates are then
+    re-scored against the float32 matrix, so only those rows of it are ever
+    paged in. All files are memory-mapped, which lets several server
+    processes share one copy through the OS page cache.
+    """
+
+    backend = 'quantized'
+
+    def __init__(self, path: str, codec: str = cfg.QUANTIZATION, rerank: int = cfg.RERANK_CANDIDATES):
+        super().__init__(path)
+        if codec not in QUANT_CODECS:
+            raise ValueError(f"Unknown codec '{codec}'; expected one of {QUANT_CODECS}")
+        codes_path = os.path.join(self.path, QUANT_FILES[codec])
+        if not os.path.exists(codes_path):
+            raise FileNotFoundError(f"No {codec} codes in {self.path}; run `python -m src.vector_index --quantize {codec}`")
+        self.codec = codec
+        self.rerank = rerank
+        self.codes = np.load(codes_path, mmap_mode='r')
+        if codec == 'int8':
+            self.int8_scale, self.int8_offset = np.load(os.path.join(self.path, INT8_PARAMS_FILE))
+            self.code_norms = np.load(os.path.join(self.path, INT8_NORMS_FILE))
+        elif codec == 'pq':
+            self.codebooks = np.load(os.path.join(self.path, PQ_CODEBOOKS_FILE))
+
+    def search(self, queries: np.ndarray, k: int,
+               rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if rows is not None:
+            return self._search_rows(queries, k, rows)
+        candidates, _ = self._blocked_top_k(queries, max(k, self.rerank))
+
+        all_idx = np.full((len(queries), k), -1, dtype=np.int64)
+        all_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for qi, query in enumerate(queries):
+            rows = np.sort(candidates[qi])
+            exact = self.norms[rows] - 2.0 * (self.vectors[rows] @ query) + query @ query
+            keep = _top_k(exact[None, :], k)[0]
+            all_idx[qi, :len(keep)] = rows[keep]
+            all_dist[qi, :len(keep)] = exact[keep]
+        return all_idx, all_dist
+
+    def _pq_tables(self, queries: np.ndarray) -> np.ndarray:
+        """(queries, subvectors, 256) squared distances from each query slice to each centroid."""
+        sub = queries.reshape(len(queries), len(self.codebooks), -1)
+        diff = sub[:, :, None, :] - self.codebooks[None, :, :, :]
+        return np.einsum('qmcd,qmcd->qmc', diff, diff)
+
+    def _prepare(self, queries: np.ndarray) -> np.ndarray:
+        if self.codec == 'int8':
+            return queries * self.int8_scale
+        if self.codec == 'pq':
+            return self._pq_tables(queries)
+        return queries
+
+    def _block_distances(self, prepared: np.ndarray, start: int, stop: int) -> np.ndarray:
+        if self.codec != 'pq':
+            codes = self.codes[start:stop]
+        if self.codec == 'float16':
+            return self.norms[start:stop] - 2.0 * (prepared @ codes.astype(np.float32).T)
+        if self.codec == 'int8':
+            # x ~ code * scale + offset; prepared holds q * scale and the q.offset term is constant per query
+            return self.code_norms[start:stop] - 2.0 * (prepared @ codes.astype(np.float32).T)
+        # PQ: sum the per-subvector table entries selected by each code (asymmetric distance).
+        # Codes are stored subvector-major, so each row of the block is contiguous.
+        codes = self.codes[:, start:stop]
+        dist = np.zeros((len(prepared), stop - start), dtype=np.float32)
+        for m in range(len(codes)):
+            dist += prepared[:, m, codes[m]]
+        return dist
+
+def load_index(path: str = str(cfg.VECTOR_INDEX_PATH), backend: str = cfg.RETRIEVER_BACKEND,
+               nprobe: int = cfg.IVF_NPROBE, codec: str = cfg.QUANTIZATION) -> ExactIndex:
+    if backend == 'exact':
+        return ExactIndex(path)
+    if backend == 'ivf':
+        return IVFIndex(path, nprobe=nprobe)
+    if backend == 'quantized':
+        return QuantizedIndex(path, codec=codec)
+    raise ValueError(f"Unknown index backend '{backend}'; expected one of {BACKENDS[1:]}")
+
+class DocumentTable:
+    """
+    The documents file of an index (see documents_table), kept as an Arrow
+    table. Arrow files are memory-mapped, so texts and metadata stay in the
+    page cache rather than becoming Python objects; only the rows a search
+    returns are turned into Documents. The dense and sparse indexes can
+    share one instance.
+
+    Attributes:
+        path (str): The documents file.
+        table (pa.Table): Its columns.
+        count (int): Number of rows.
+    """
+
+    def __init__(self, path: str, columns: Optional[List[str]] = None):
+        self.path = str(path)
+        self.table = read_arrow(self.path, columns)
+        self.count = self.table.num_rows
+        self._rows_by_id: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+
+    def has_columns(self, columns: List[str]) -> bool:
+        return all(c in self.table.column_names for c in columns)
+
+    def frame(self, columns: List[str]) -> pd.DataFrame:
+        return self.table.select(columns).to_pandas()
+
+    def metadata_records(self) -> List[Dict[str, Any]]:
+        """Every row's metadata dict (for files without the filter columns)."""
+        return [json.loads(m) if m else {} for m in self.table['metadata'].to_pylist()]
+
+    def documents(self, rows: np.ndarray) -> List[Document]:
+        """Documents of the given rows, in order."""
+        if len(rows) == 0:
+            return []
+        picked = self.table.select(['id', 'text', 'metadata']).take(pa.array(np.asarray(rows, dtype=np.int64)))
+        return [
+            Document(page_content=text or '', metadata=json.loads(metadata) if metadata else {}, id=chunk_id)
+            for chunk_id, text, metadata in zip(
+                picked['id'].to_pylist(), picked['text'].to_pylist(), picked['metadata'].to_pylist())
+        ]
+
+    def rows(self, ids: List[str]) -> np.ndarray:
+        """Row of each chunk ID (-1 for unknown IDs); the lookup is built on first use."""
+        with self._lock:
+            if self._rows_by_id is None:
+                self._rows_by_id = {chunk_id: row for row, chunk_id in enumerate(self.table['id'].to_pylist())}
+        return np.array([self._rows_by_id.get(chunk_id, -1) for chunk_id in ids], dtype=np.int64)
+
+class IndexVectorStore(VectorStore):
+    """
+    Read-only langchain VectorStore over an ExactIndex or IVFIndex, so the
+    RAG pipeline can swap it in for Chroma (as_retriever, similarity_search).
+    The index is rebuilt from the Chroma store with export_from_chroma.
+
+    Searches accept `filter` as a SearchFilter (or its dict form); a
+    MetadataIndex turns it into candidate rows before any vector is scored.
+    """
+
+    def __init__(self, index: ExactIndex, embedding: Embeddings):
+        self.index = index
+        self._embedding = embedding
+        self.documents = DocumentTable(documents_path(index.path))
+        filter_columns = list(FILTER_FIELDS.values()) + [DATE_KEY]
+        if self.documents.has_columns(filter_columns):
+            self.metadata_index = MetadataIndex(self.documents.frame(filter_columns))
+        else:
+            # Exports written before filter columns existed
+            self.metadata_index = MetadataIndex.from_records(self.documents.metadata_records())
+
+    def _filter_rows(self, search_filter: Any) -> Optional[np.ndarray]:
+        if isinstance(search_filter, Mapping):
+            search_filter = SearchFilter.from_dict(search_filter)
+        return self.metadata_index.rows(search_filter) if search_filter is not None else None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def get_vectors(self, ids: List[str]) -> np.ndarray:
+        """Stored float32 vectors of the given chunk IDs (zeros for unknown IDs)."""
+        rows = self.documents.rows(ids)
+        vectors = np.zeros((len(ids), self.index.dim), dtype=np.float32)
+        found = np.flatnonzero(rows >= 0)
+        if len(found):
+            vectors[found] = self.index.vectors[rows[found]]
+        return vectors
+
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4,
+                                     filter: Any = None) -> List[List[Document]]:
+        """Searches for several query vectors with one matrix product per block."""
+        idx, _ = self.index.search(np.asarray(embeddings, dtype=np.float32), k, rows=self._filter_rows(filter))
+        return [self.documents.documents(row[row >= 0]) for row in idx]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Any = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        idx, dist = self.index.search(np.asarray([embedding], dtype=np.float32), k, rows=self._filter_rows(filter))
+        found = idx[0] >= 0
+        return list(zip(self.documents.documents(idx[0][found]), (float(d) for d in dist[0][found])))
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Any = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter=filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Any = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Any = None, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k, filter=filter)
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[Dict[str, Any]]] = None,
+                   ids: Optional[List[str]] = None, path: str = str(cfg.VECTOR_INDEX_PATH),
+                   backend: str = 'exact', **kwargs: Any) -> 'IndexVectorStore':
+        """
+        Embeds `texts`, writes them as a new exact index under `path` and
+        opens it with `backend` ('ivf' needs build_ivf first, so only 'exact'
+        works straight away). The store itself stays read-only.
+        """
+        texts = list(texts)
+        ids = list(ids) if ids is not None else [str(i) for i in range(len(texts))]
+        vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+        write_index(path, vectors, ids, texts, metadatas or [None] * len(texts))
+        return cls(load_index(path, backend), embedding)
+
+def documents_table(ids: List[str], texts: List[Optional[str]],
+                    metadatas: List[Optional[Dict[str, Any]]]) -> pd.DataFrame:
+    """
+    Rows of the documents file shared by the exported indexes: id, text and
+    metadata JSON, plus the filterable fields as their own columns so that
+    MetadataIndex never parses the JSON.
+    """
+    metadatas = [m or {} for m in metadatas]
+    table = pd.DataFrame({
+        'id': list(ids),
+        'text': [text or '' for text in texts],
+        'metadata': [json.dumps(m) if m else '' for m in metadatas],
+    })
+    for key in FILTER_FIELDS.values():
+        table[key] = pd.array([m.get(key) for m in metadatas], dtype='string')
+    table[DATE_KEY] = pd.array(
+        [m.get(DATE_KEY, date_key(m.get(DATE_FIELD))) for m in metadatas], dtype='Int64')
+    return table
+
+def export_from_chroma(vector_store, output_dir: str = str(cfg.VECTOR_INDEX_PATH),
+                       page_size: int = 10000) -> Dict[str, int]:
+    """
+    Copies every vector, text and metadata record out of a langchain Chroma
+    store into the flat index layout read by ExactIndex/IVFIndex.
+
+    Returns:
+        Dict[str, int]: The "count" and "dim" of the exported matrix.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    collection = vector_store._collection
+    count = collection.count()
+    vectors = None
+    offset = 0
+    # Every file is written aside and renamed into place, so running workers keep their mapped copy
+    with replacing(os.path.join(output_dir, VECTORS_FILE)) as vectors_path, \
+            TableWriter(os.path.join(output_dir, DOCUMENTS_FILE), replace=True) as writer:
+        while offset < count:
+            page = collection.get(include=['embeddings', 'documents', 'metadatas'],
+                                  limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            block = np.asarray(page['embeddings'], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    vectors_path, mode='w+', dtype=np.float32, shape=(count, block.shape[1]))
+            vectors[offset:offset + len(block)] = block
+            writer.write(documents_table(page['ids'], page['documents'], page['metadatas']))
+            offset += len(block)
+        if vectors is None:
+            raise ValueError("Cannot export an empty vector store")
+        vectors.flush()
+    meta = _write_index_meta(output_dir, vectors)
+    logger.info(f"Exported {offset} vectors to {output_dir}")
+    return meta
+
+def write_index(output_dir: str, vectors: np.ndarray, ids: List[str], texts: List[Optional[str]],
+                metadatas: List[Optional[Dict[str, Any]]]) -> Dict[str, int]:
+    """
+    Writes in-memory vectors and their documents in the layout
+    export_from_chroma produces.
+
+    Returns:
+        Dict[str, int]: The "count" and "dim" of the written matrix.
+    """
+    if len(vectors) == 0:
+        raise ValueError("Cannot write an empty index")
+    os.makedirs(output_dir, exist_ok=True)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    save_array(os.path.join(output_dir, VECTORS_FILE), vectors)
+    with TableWriter(os.path.join(output_dir, DOCUMENTS_FILE), replace=True) as writer:
+        writer.write(documents_table(ids, texts, metadatas))
+    return _write_index_meta(output_dir, vectors)
+
+def save_array(path: str, array: np.ndarray):
+    """np.save() to a temporary file renamed over `path` (see data_io.replacing)."""
+    with replacing(path) as write_path, open(write_path, 'wb') as f:
+        np.save(f, array)
+
+def _write_index_meta(output_dir: str, vectors: np.ndarray) -> Dict[str, int]:
+    save_array(os.path.join(output_dir, NORMS_FILE), np.einsum('ij,ij->i', vectors, vectors))
+    meta = {'count': int(len(vectors)), 'dim': int(vectors.shape[1]), 'metric': 'l2'}
+    with replacing(os.path.join(output_dir, INDEX_META_FILE)) as write_path, open(write_path, 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid of every vector, computed block by block."""
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + BLOCK_ROWS])
+        labels[start:start + len(block)] = np.argmin(centroid_norms - 2.0 * (block @ centroids.T), axis=1)
+    return labels
+
+def _sample_rows(vectors: np.ndarray, sample_size: int, rng: np.random.Generator) -> np.ndarray:
+    rows = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+    return np.asarray(vectors[rows], dtype=np.float32)
+
+def _kmeans(sample: np.ndarray, n_clusters: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd's k-means; empty clusters keep their previous centroid."""
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=len(sample) < n_clusters)].copy()
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=n_clusters)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+def build_ivf(path: str = str(cfg.VECTOR_INDEX_PATH), n_lists: int = cfg.IVF_N_LISTS,
+              iterations: int = 10, sample_size: int = 100_000, seed: int = 0) -> int:
+    """
+    Trains IVF lists for an exported index with k-means on a sample of the
+    vectors and writes the vectors reordered list by list.
+
+    Args:
+        path (str): Index directory from export_from_chroma.
+        n_lists (int): Number of lists; 0 picks ~sqrt(count).
+        iterations (int): k-means iterations.
+        sample_size (int): Vectors used to train the centroids.
+        seed (int): Random seed for the sample and initial centroids.
+
+    Returns:
+        int: The number of lists built.
+    """
+    index = ExactIndex(path)
+    vectors = index.vectors
+    if n_lists <= 0:
+        n_lists = int(np.sqrt(index.count))
+    n_lists = max(1, min(n_lists, index.count))
+
+    rng = np.random.default_rng(seed)
+    centroids = _kmeans(_sample_rows(vectors, sample_size, rng), n_lists, iterations, rng)
+
+    labels = _assign(vectors, centroids)
+    order = np.argsort(labels, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))])
+    # Written aside and renamed into place, like export_from_chroma's files
+    with replacing(os.path.join(path, IVF_VECTORS_FILE)) as write_path:
+        reordered = np.lib.format.open_memmap(write_path, mode='w+', dtype=np.float32, shape=vectors.shape)
+        for start in range(0, index.count, BLOCK_ROWS):
+            reordered[start:start + BLOCK_ROWS] = vectors[order[start:start + BLOCK_ROWS]]
+        reordered.flush()
+    save_array(os.path.join(path, IVF_CENTROIDS_FILE), centroids.astype(np.float32))
+    save_array(os.path.join(path, IVF_ORDER_FILE), order)
+    save_array(os.path.join(path, IVF_OFFSETS_FILE), offsets)
+    logger.info(f"Built {n_lists} IVF lists over {index.count} vectors")
+    return n_lists
+
+def _write_float16(index: ExactIndex, codes_path: str) -> np.ndarray:
+    codes = np.lib.format.open_memmap(codes_path, mode='w+', dtype=np.float16, shape=index.vectors.shape)
+    for start in range(0, index.count, BLOCK_ROWS):
+        codes[start:start + BLOCK_ROWS] = index.vectors[start:start + BLOCK_ROWS]
+    return codes
+
+def _write_int8(index: ExactIndex, codes_path: str) -> np.ndarray:
+    vectors = index.vectors
+    low = np.full(index.dim, np.inf, dtype=np.float32)
+    high = np.full(index.dim, -np.inf, dtype=np.float32)
+    for start in range(0, index.count, BLOCK_ROWS):
+        block = vectors[start:start + BLOCK_ROWS]
+        low = np.minimum(low, block.min(axis=0))
+        high = np.maximum(high, block.max(axis=0))
+    scale = np.maximum(high - low, 1e-12) / 255.0
+    codes = np.lib.format.open_memmap(codes_path, mode='w+', dtype=np.int8, shape=vectors.shape)
+    norms = np.empty(index.count, dtype=np.float32)
+    for start in range(0, index.count, BLOCK_ROWS):
+        block = np.round((vectors[start:start + BLOCK_ROWS] - low) / scale) - 128
+        codes[start:start + BLOCK_ROWS] = np.clip(block, -128, 127)
+        # Offset folded in so that x ~ code * scale + offset
+        decoded = codes[start:start + BLOCK_ROWS] * scale + (low + 128 * scale)
+        norms[start:start + BLOCK_ROWS] = np.einsum('ij,ij->i', decoded, decoded)
+    save_array(os.path.join(index.path, INT8_PARAMS_FILE), np.stack([scale, low + 128 * scale]).astype(np.float32))
+    save_array(os.path.join(index.path, INT8_NORMS_FILE), norms)
+    return codes
+
+def _write_pq(index: ExactIndex, codes_path: str, pq_subvectors: int, iterations: int,
+              sample_size: int, seed: int) -> np.ndarray:
+    if index.dim % pq_subvectors:
+        raise ValueError(f"pq_subvectors={pq_subvectors} does not divide dimension {index.dim}")
+    width = index.dim // pq_subvectors
+    rng = np.random.default_rng(seed)
+    sample = _sample_rows(index.vectors, sample_size, rng).reshape(-1, pq_subvectors, width)
+    codebooks = np.stack([
+        _kmeans(np.ascontiguousarray(sample[:, m]), 256, iterations, rng) for m in range(pq_subvectors)
+    ]).astype(np.float32)
+    codes = np.lib.format.open_memmap(codes_path, mode='w+', dtype=np.uint8, shape=(pq_subvectors, index.count))
+    for start in range(0, index.count, BLOCK_ROWS):
+        block = np.asarray(index.vectors[start:start + BLOCK_ROWS]).reshape(-1, pq_subvectors, width)
+        for m in range(pq_subvectors):
+            codes[m, start:start + len(block)] = _assign(np.ascontiguousarray(block[:, m]), codebooks[m])
+    save_array(os.path.join(index.path, PQ_CODEBOOKS_FILE), codebooks)
+    return codes
+
+def quantize_index(path: str = str(cfg.VECTOR_INDEX_PATH), codecs: Tuple[str, ...] = (cfg.QUANTIZATION,),
+                   pq_subvectors: int = cfg.PQ_SUBVECTORS, iterations: int = 10,
+                   sample_size: int = 100_000, seed: int = 0) -> Dict[str, int]:
+    """
+    Writes compressed copies of an exported index for QuantizedIndex.
+
+    Args:
+        path (str): Index directory from export_from_chroma.
+        codecs (Tuple[str, ...]): Any of 'float16', 'int8' and 'pq'.
+        pq_subvectors (int): PQ subvectors (one byte each); must divide the dimension.
+        iterations (int): k-means iterations for the PQ codebooks.
+        sample_size (int): Vectors used to train the PQ codebooks.
+        seed (int): Random seed for the PQ training sample.
+
+    Returns:
+        Dict[str, int]: Bytes on disk of each codec's codes.
+    """
+    index = ExactIndex(path)
+    sizes = {}
+    for codec in codecs:
+        if codec not in QUANT_CODECS:
+            raise ValueError(f"Unknown codec '{codec}'; expected one of {QUANT_CODECS}")
+        codes_path = os.path.join(path, QUANT_FILES[codec])
+        # The codes are written aside and renamed into place, so running workers keep their mapped copy
+        with replacing(codes_path) as write_path:
+            if codec == 'float16':
+                codes = _write_float16(index, write_path)
+            elif codec == 'int8':
+                codes = _write_int8(index, write_path)
+            else:
+                codes = _write_pq(index, write_path, pq_subvectors, iterations, sample_size, seed)
+            codes.flush()
+        sizes[codec] = os.path.getsize(codes_path)
+        logger.info(f"Wrote {codec} codes to {codes_path} ({sizes[codec] / 1024 ** 2:.1f} MB)")
+    return sizes
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export the Chroma store into the in-process vector index.")
+    parser.add_argument('--vector-store', default=str(cfg.VECTOR_STORE_PATH))
+    parser.add_argument('--output', default=str(cfg.VECTOR_INDEX_PATH))
+    parser.add_argument('--ivf', action='store_true', help="Also train IVF lists for the 'ivf' backend.")
+    parser.add_argument('--n-lists', type=int, default=cfg.IVF_N_LISTS, help="IVF lists; 0 = ~sqrt(N).")
+    parser.add_argument('--quantize', nargs='*', choices=QUANT_CODECS, default=[],
+                        help="Compressed copies to write for the 'quantized' backend.")
+    args = parser.parse_args(argv)
+
+    from langchain_chroma import Chroma
+    start = time.perf_counter()
+    meta = export_from_chroma(Chroma(persist_directory=args.vector_store), args.output)
+    print(f"Exported {meta['count']} x {meta['dim']} vectors to {args.output}")
+    if args.ivf:
+        n_lists = build_ivf(args.output, n_lists=args.n_lists)
+        print(f"Built {n_lists} IVF lists")
+    if args.quantize:
+        for codec, size in quantize_index(args.output, tuple(args.quantize)).items():
+            print(f"{codec}: {size / 1024 ** 2:.1f} MB")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
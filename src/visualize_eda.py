@@ -1,13 +1,16 @@
 
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+from src.data_io import read_table
+
+DATA_PATH = 'data/filtered_complaints.parquet'
 
 def main():
     print("Loading filtered data...")
     try:
-        df = pd.read_csv('data/filtered_complaints.csv')
+        # Only the two columns the plots need
+        df = read_table(DATA_PATH, columns=['Category', 'word_count'])
     except FileNotFoundError:
         print("Data not found. Run processing first.")
         return
@@ -28,9 +31,7 @@ def main():
     print("Saved reports/product_distribution.png")
     
     # 2. Word Count Distribution
-    # Calculate word counts if not present (though we did it in analysis, let's redo for plot)
-    df['word_count'] = df['cleaned_narrative'].fillna("").apply(lambda x: len(str(x).split()))
-    
+    # word_count is computed by process_data.py and stored with the filtered data
     plt.figure(figsize=(10, 6))
     sns.histplot(df['word_count'], bins=50, kde=True, color='blue')
     plt.title('Distribution of Consumer Complaint Narrative Length')
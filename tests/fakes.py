@@ -0,0 +1,41 @@
+"""Test doubles shared by several test modules."""
+import hashlib
+from typing import List
+from unittest.mock import MagicMock
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from src.rag_pipeline import RAGResult
+
+DOCS = [Document(page_content="late fee charged twice", metadata={"Complaint ID": "1", "State": "TX"}, id="1-0")]
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic 8-dim embeddings derived from a hash of the text."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _embed(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode()).digest()
+        return [b / 255.0 for b in digest[:8]]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(len(texts))
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+def fake_rag() -> MagicMock:
+    """A ComplaintRAG stand-in for the server: aquery answers "answer to <question>" with DOCS."""
+    rag = MagicMock()
+
+    async def aquery(question, filters=None):
+        return RAGResult(question=question, answer=f"answer to {question}", sources=DOCS,
+                         tokens={"input_tokens": 12}, filters=filters)
+
+    rag.aquery = aquery
+    rag.retrieve_only.return_value = DOCS
+    rag.cache_stats.return_value = {}
+    rag.queue_stats.return_value = {}
+    return rag
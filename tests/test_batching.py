@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+import unittest
+import sys
+import os
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.batching import GenerationBatcher
+
+class TestGenerationBatcher(unittest.TestCase):
+    def test_concurrent_requests_are_micro_batched(self):
+        batches = []
+
+        def generate(items):
+            batches.append(list(items))
+            return [item.upper() for item in items]
+
+        batcher = GenerationBatcher(generate, max_batch_size=4, window_ms=50, max_queue=16)
+
+        async def run():
+            return await asyncio.gather(*(batcher.submit(w) for w in ["a", "b", "c", "d", "e"]))
+
+        results = asyncio.run(run())
+        self.assertEqual([output for output, _ in results], ["A", "B", "C", "D", "E"])
+        self.assertEqual(batches, [["a", "b", "c", "d"], ["e"]])
+        self.assertTrue(all(wait >= 0 for _, wait in results))
+        stats = batcher.stats()
+        self.assertEqual(stats["batches"], 2)
+        self.assertEqual(stats["mean_batch_size"], 2.5)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_failed_batch_raises_in_every_caller(self):
+        def generate(items):
+            raise RuntimeError("model crashed")
+
+        batcher = GenerationBatcher(generate, max_batch_size=2, window_ms=10)
+
+        async def run():
+            return await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+    def test_failed_batch_is_retried_item_by_item(self):
+        calls = []
+
+        def generate(items):
+            calls.append(list(items))
+            if "bad" in items:
+                raise RuntimeError("bad prompt")
+            return [item.upper() for item in items]
+
+        batcher = GenerationBatcher(generate, max_batch_size=3, window_ms=50)
+
+        async def run():
+            return await asyncio.gather(*(batcher.submit(w) for w in ["a", "bad", "c"]), return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertEqual(results[0][0], "A")
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertEqual(results[2][0], "C")
+        self.assertEqual(calls, [["a", "bad", "c"], ["a"], ["bad"], ["c"]])
+
+    def test_loop_change_fails_requests_left_on_the_old_loop(self):
+        gate = threading.Event()
+
+        def generate(items):
+            gate.wait(5)
+            return [item.upper() for item in items]
+
+        batcher = GenerationBatcher(generate, max_batch_size=1, window_ms=0)
+        old_loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=old_loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            generating = asyncio.run_coroutine_threadsafe(batcher.submit("a"), old_loop)
+            queued = asyncio.run_coroutine_threadsafe(batcher.submit("b"), old_loop)
+            deadline = time.time() + 5
+            while batcher.queue_depth() < 1 and time.time() < deadline:
+                time.sleep(0.01)
+
+            async def new_loop():
+                task = asyncio.ensure_future(batcher.submit("c"))
+                await asyncio.sleep(0.05)
+                gate.set()
+                return await task
+
+            self.assertEqual(asyncio.run(new_loop())[0], "C")
+            for future in (generating, queued):
+                with self.assertRaises(RuntimeError):
+                    future.result(timeout=5)
+        finally:
+            old_loop.call_soon_threadsafe(old_loop.stop)
+            thread.join(5)
+            old_loop.close()
+
+    def test_close_fails_queued_requests_and_rejects_new_ones(self):
+        batcher = GenerationBatcher(lambda items: items, max_batch_size=4, window_ms=1000)
+
+        async def run():
+            pending = asyncio.ensure_future(batcher.submit("a"))
+            await asyncio.sleep(0.05)
+            batcher.close()
+            with self.assertRaises(RuntimeError):
+                await pending
+            with self.assertRaises(RuntimeError):
+                await batcher.submit("b")
+
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
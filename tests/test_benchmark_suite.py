@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+from src.benchmarks.stubs import HashingEmbeddings, StubSeq2SeqLM, StubTokenizer
+from src.benchmarks.suite import compare_results, flatten, main, prompt_with_tokens
+from src.context import ContextBuilder
+from src.instrumentation import StageTimer
+from src.rag_pipeline import PROMPT_TEMPLATE, ComplaintRAG
+
+class TestStubs(unittest.TestCase):
+    def test_stub_generator_runs_the_pipeline_generate_path(self):
+        rag = ComplaintRAG(cache_size=0)
+        rag._tokenizer, rag._model = StubTokenizer(), StubSeq2SeqLM(new_tokens=4)
+        answer, tokens = rag._generate("Late fees charged twice on my card", StageTimer([]))
+        self.assertEqual(answer, "Late fees charged twice")
+        self.assertEqual(tokens, {"input_tokens": 8, "output_tokens": 4})
+
+        answers, batch_tokens = rag._generate_batch(["one two three", "a b c d e f"], StageTimer([]))
+        self.assertEqual(answers, ["one two three", "a b c d"])
+        self.assertEqual([t["input_tokens"] for t in batch_tokens], [4, 7])
+
+    def test_stub_tokenizer_packs_context_and_cuts_prompts(self):
+        tokenizer = StubTokenizer()
+        self.assertEqual(prompt_with_tokens(tokenizer, "w " * 100, 10), " ".join(["w"] * 9))
+        docs = [Document(page_content="fee " * 300, id="1-0", metadata={'Complaint ID': '1'})]
+        context = ContextBuilder(tokenizer, PROMPT_TEMPLATE, max_tokens=128).build("Why fees?", docs)
+        self.assertLessEqual(len(tokenizer(context.prompt)["input_ids"]), 128)
+
+    def test_hashing_embeddings_are_deterministic_unit_vectors(self):
+        embeddings = HashingEmbeddings(dim=32)
+        a, b = embeddings.embed_documents(["late fee", "Late FEE"])
+        self.assertEqual(a, b)
+        self.assertAlmostEqual(sum(x * x for x in a), 1.0, places=5)
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_tiny_run_writes_comparable_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'run.json')
+            main(['--complaints', '60', '--corpus-sizes', '40', '--k', '1', '3', '--queries', '3',
+                  '--prompt-tokens', '16', '64', '--repeats', '1', '--concurrency', '1', '4',
+                  '--requests', '6', '--output', output])
+            with open(output) as f:
+                report = json.load(f)
+
+        workloads = report['workloads']
+        self.assertEqual(set(workloads), {'indexing', 'retrieval', 'generation', 'e2e'})
+        self.assertGreater(workloads['indexing']['chunks'], 0)
+        self.assertEqual(set(workloads['retrieval']['40']), {'chroma', 'exact', 'ivf'})
+        self.assertEqual(set(workloads['retrieval']['40']['exact']), {'k=1', 'k=3'})
+        self.assertEqual(workloads['generation']['64']['input_tokens'], 64)
+        self.assertEqual(workloads['e2e']['4']['requests'], 6)
+        self.assertIn('commit', report)
+
+        slower = json.loads(json.dumps(report))
+        slower['workloads']['e2e']['4']['qps'] /= 2
+        slower['workloads']['e2e']['4']['p50_ms'] *= 0.5
+        rows = {row['metric']: row for row in compare_results(report, slower)}
+        self.assertTrue(rows['e2e.4.qps']['regression'])
+        self.assertFalse(rows['e2e.4.p50_ms']['regression'])
+        self.assertFalse(rows['indexing.chunks']['regression'])
+        self.assertEqual(len(rows), len(flatten(report['workloads'])))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+import re
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+from src.context import ContextBuilder, overlap_length
+from src.instrumentation import StageRecorder
+from src.rag_pipeline import ComplaintRAG
+
+TEMPLATE = "Context:\n{context}\nQuestion: {question}\nAnswer:"
+
+class WordTokenizer:
+    """One token per whitespace-separated word, plus an end-of-sequence token."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def _encode(self, text, add_special_tokens, return_offsets_mapping):
+        spans = [m.span() for m in re.finditer(r"\S+", text)]
+        ids = list(range(len(spans))) + ([1] if add_special_tokens else [])
+        return ids, spans
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False, **kwargs):
+        self.calls += 1
+        texts = [text] if isinstance(text, str) else text
+        encoded = [self._encode(t, add_special_tokens, return_offsets_mapping) for t in texts]
+        output = {"input_ids": [ids for ids, _ in encoded], "offset_mapping": [spans for _, spans in encoded]}
+        return {name: values[0] for name, values in output.items()} if isinstance(text, str) else output
+
+def words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+def chunk(complaint, index, text):
+    return Document(page_content=text, id=f"{complaint}-{index}", metadata={'Complaint ID': complaint})
+
+class TestContextBuilder(unittest.TestCase):
+    def setUp(self):
+        self.tokenizer = WordTokenizer()
+        # Template + "why?" + end-of-sequence token = 5 tokens, leaving 50 for the context
+        self.builder = ContextBuilder(self.tokenizer, TEMPLATE, max_tokens=55, min_doc_tokens=5)
+
+    def test_budget_keeps_rank_order_trims_then_drops(self):
+        docs = [chunk(str(i), 0, words(f"d{i}w", n)) for i, n in enumerate((20, 20, 30, 4, 12))]
+        context = self.builder.build("why?", docs)
+        self.assertEqual(context.prompt_tokens, 55)
+        self.assertEqual(context.context_tokens, 50)
+        # d2 is cut to the 10 tokens left; d3 and d4 no longer fit
+        self.assertEqual([d.id for d in context.documents], ["0-0", "1-0", "2-0"])
+        self.assertIn(words("d2w", 10) + "\nQuestion", context.prompt)
+        self.assertEqual((context.trimmed, context.dropped), (1, 2))
+        self.assertEqual(context.token_counts()["context_docs"], 3)
+
+        # A chunk too big to trim usefully is skipped, but a smaller one below it still fits
+        docs = [chunk("0", 0, words("a", 48)), chunk("1", 0, words("b", 30)), chunk("2", 0, words("c", 2))]
+        context = self.builder.build("why?", docs)
+        self.assertEqual([d.id for d in context.documents], ["0-0", "2-0"])
+        self.assertLessEqual(context.prompt_tokens, 55)
+
+    def test_overlap_and_duplicates_are_removed(self):
+        first = "the bank charged an overdraft fee on my checking account twice"
+        second = "fee on my checking account twice and never refunded it"
+        docs = [
+            chunk("7", 0, first),
+            chunk("7", 1, second),
+            chunk("8", 0, second),        # another complaint: kept whole
+            chunk("9", 0, first),         # verbatim repeat of the top chunk
+        ]
+        context = self.builder.build("why?", docs)
+        self.assertEqual([d.id for d in context.documents], ["7-0", "7-1", "8-0"])
+        self.assertIn(f"{first}\n\nand never refunded it\n\n{second}", context.prompt)
+        self.assertEqual(context.overlap_chars, len("fee on my checking account twice"))
+        self.assertEqual(context.dropped, 1)
+        self.assertEqual(overlap_length("abc overlap text", "overlap text xyz", 50), len("overlap text"))
+        self.assertEqual(overlap_length("ends in a", "a starts", 50), 0)
+
+    def test_tokenizations_are_cached(self):
+        docs = [chunk(str(i), 0, words(f"d{i}w", 5)) for i in range(3)]
+        self.builder.build("why?", docs)
+        calls = self.tokenizer.calls
+        self.builder.build("why again?", docs)
+        # Only the new question's template and the final prompt are tokenized
+        self.assertEqual(self.tokenizer.calls - calls, 2)
+        self.assertGreater(self.builder.cache_stats()["hits"], 0)
+
+        small = ContextBuilder(self.tokenizer, TEMPLATE, cache_size=2)
+        small.token_ends(["a", "b", "c"])
+        self.assertEqual(small.cache_stats()["entries"], 2)
+
+class TestPipelineContext(unittest.TestCase):
+    def test_prompt_fits_budget_and_counts_are_reported(self):
+        docs = [chunk(str(i), 0, words(f"d{i}w", 40)) for i in range(5)]
+        recorder = StageRecorder()
+        rag = ComplaintRAG(hooks=[recorder], context_tokens=150, hybrid=False)
+        rag._tokenizer = WordTokenizer()
+        rag._retriever = MagicMock()
+        rag._embedding_fn = MagicMock()
+        rag._embedding_fn.embed_query.return_value = [0.1]
+        rag._vector_store = MagicMock()
+        rag._vector_store.similarity_search_by_vector.return_value = docs
+        rag._generate = MagicMock(return_value=("answer", {"input_tokens": 100, "output_tokens": 1}))
+
+        result = rag.query_with_sources("Why fees?")
+        self.assertLessEqual(result.tokens["prompt_tokens"], 150)
+        self.assertEqual(result.tokens["output_tokens"], 1)
+        self.assertEqual([d.id for d in result.sources], ["0-0", "1-0", "2-0"])
+        self.assertEqual(result.tokens["docs_trimmed"], 1)
+        self.assertNotIn("d3w0", rag._generate.call_args[0][0])
+        self.assertIn("prompt_build", recorder.summary())
+        self.assertEqual(recorder.token_summary()["prompt_tokens"]["max"], result.tokens["prompt_tokens"])
+
+        rag._vector_store._collection.query.return_value = {
+            "ids": [[d.id for d in docs]], "documents": [[d.page_content for d in docs]],
+            "metadatas": [[d.metadata for d in docs]]}
+        rag._embedding_fn.embed_documents.return_value = [[0.1]]
+        rag._generate_batch = MagicMock(return_value=(["answer"], [{"input_tokens": 100, "output_tokens": 1}]))
+        batched = rag.query_batch(["Which fees?"])[0]
+        self.assertEqual([d.id for d in batched.sources], ["0-0", "1-0", "2-0"])
+        self.assertLessEqual(batched.tokens["prompt_tokens"], 150)
+
+if __name__ == '__main__':
+    unittest.main()
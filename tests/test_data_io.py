@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.data_io import TableWriter, read_table, table_format
+
+class TestDataIO(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.chunks = [
+            pd.DataFrame({'Complaint ID': ['1', '2'], 'State': ['TX', 'CA'], 'word_count': [3, 5]}),
+            # An all-empty text column must not change the schema
+            pd.DataFrame({'Complaint ID': ['3'], 'State': [None], 'word_count': [7]}),
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunked_round_trip_in_every_format(self):
+        for suffix in ('.parquet', '.feather', '.csv'):
+            path = os.path.join(self.tmp.name, f'out{suffix}')
+            with TableWriter(path) as writer:
+                for chunk in self.chunks:
+                    writer.write(chunk)
+
+            df = read_table(path)
+            self.assertEqual(len(df), 3, suffix)
+            self.assertEqual(df['word_count'].tolist(), [3, 5, 7], suffix)
+            self.assertEqual(df['State'].iloc[:2].tolist(), ['TX', 'CA'], suffix)
+            self.assertTrue(pd.isna(df['State'].iloc[2]), suffix)
+
+    def test_column_projection(self):
+        path = os.path.join(self.tmp.name, 'out.parquet')
+        with TableWriter(path) as writer:
+            writer.write(self.chunks[0])
+        df = read_table(path, columns=['word_count'])
+        self.assertEqual(list(df.columns), ['word_count'])
+
+    def test_unknown_suffix(self):
+        with self.assertRaises(ValueError):
+            table_format('complaints.xlsx')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,41 @@
 
+import io
+import os
+import tempfile
 import unittest
+from unittest.mock import patch
 import pandas as pd
-from src.process_data import clean_text
+import pyarrow.parquet as pq
+from src.process_data import (
+    EDAStats, clean_text, clean_texts, filter_complaints, iter_csv_shards,
+    process_file, process_file_parallel, word_counts,
+)
+from src.synthetic_data import write_raw_csv
+
+RAW_ROWS = pd.DataFrame({
+    'Date received': ['2023-01-01', '2023-01-02', '2023-01-03', '2023-01-04', '2023-01-05', '2023-01-06'],
+    'Product': [
+        'Credit card',
+        'Mortgage',
+        'Checking or savings account',
+        'Checking or savings account',
+        'Money transfers',
+        'Payday loan, title loan, or personal loan',
+    ],
+    'Sub-product': ['General-purpose credit card', 'FHA', 'Savings account', 'Checking account', '', ''],
+    'Consumer complaint narrative': [
+        'Late FEE charged XXXX twice',
+        'Mortgage issue',
+        'Savings interest missing',
+        'Checking overdraft',
+        None,
+        'Loan  payment was   misapplied',
+    ],
+    'Company': ['A', 'B', 'C', 'D', 'E', 'F'],
+    'State': ['TX', 'CA', 'NY', 'FL', 'WA', 'OH'],
+    'Complaint ID': ['1', '2', '3', '4', '5', '6'],
+    'Tags': ['x', 'y', 'z', 'x', 'y', 'z'],
+})
 
 class TestDataProcessing(unittest.TestCase):
     def test_clean_text(self):
@@ -15,5 +49,87 @@ class TestDataProcessing(unittest.TestCase):
         self.assertEqual(clean_text(None), "")
         self.assertEqual(clean_text(123), "")
 
+class TestVectorizedEngine(unittest.TestCase):
+    def test_matches_row_wise_functions_on_generated_fixture(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            raw_path = write_raw_csv(os.path.join(tmp, 'complaints.csv'), 3000, seed=7)
+            raw = pd.read_csv(raw_path, dtype=str)
+
+        expected = filter_complaints(raw, engine='python')
+        actual = filter_complaints(raw, engine='vectorized')
+        self.assertGreater(len(expected), 0)
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_unicode_and_edge_whitespace(self):
+        texts = pd.Series(['  XXXX Fee\x1f', 'İstanbul\xa0xx', '', 'a\x0bb  c', None], dtype='str')
+        cleaned = clean_texts(texts)
+        self.assertEqual(cleaned.tolist(), [clean_text(t) for t in texts])
+        self.assertEqual(word_counts(cleaned).tolist(), [len(clean_text(t).split()) for t in texts])
+
+class TestStreamingProcessing(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.raw_path = os.path.join(self.tmp.name, 'complaints.csv')
+        RAW_ROWS.to_csv(self.raw_path, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunked_output_matches_single_pass(self):
+        single_path = os.path.join(self.tmp.name, 'single.csv')
+        chunked_path = os.path.join(self.tmp.name, 'chunked.csv')
+        single_stats = process_file(self.raw_path, single_path, chunksize=100)
+        chunked_stats = process_file(self.raw_path, chunked_path, chunksize=2)
+
+        with open(single_path) as f1, open(chunked_path) as f2:
+            self.assertEqual(f1.read(), f2.read())
+        self.assertEqual(single_stats.report_lines(), chunked_stats.report_lines())
+
+        output = pd.read_csv(chunked_path)
+        self.assertEqual(output['Complaint ID'].tolist(), [1, 3, 6])
+        self.assertNotIn('Tags', output.columns)
+
+    def test_running_stats_match_pandas(self):
+        df = pd.read_csv(self.raw_path, dtype=str)
+        df_final = filter_complaints(df)
+        stats = EDAStats()
+        stats.update(len(df), df_final)
+
+        self.assertEqual(stats.total_rows, 6)
+        self.assertEqual(stats.category_distribution().to_string(),
+                         df_final['Category'].value_counts().to_string())
+        self.assertEqual(stats.word_count_summary().to_string(),
+                         df_final['word_count'].describe().to_string())
+
+class TestParallelProcessing(unittest.TestCase):
+    def test_shards_split_on_record_boundaries(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'raw.csv')
+            with open(path, 'w') as f:
+                f.write('id,text\n1,"line one\nline ""two""\nthree"\n2,plain\n3,"x\ny"\n')
+            shards = list(iter_csv_shards(path, shard_bytes=8))
+
+        parsed = pd.concat([pd.read_csv(io.BytesIO(s), dtype=str) for s in shards])
+        self.assertEqual(parsed['id'].tolist(), ['1', '2', '3'])
+        self.assertEqual(parsed['text'].iloc[0], 'line one\nline "two"\nthree')
+        self.assertTrue(all(s.startswith(b'id,text\n') for s in shards))
+
+    def test_parallel_output_is_byte_identical(self):
+        # Row groups smaller than a chunk or shard, so the boundaries differ between the runs
+        with tempfile.TemporaryDirectory() as tmp, patch('src.data_io.ROW_GROUP_SIZE', 100):
+            raw_path = write_raw_csv(os.path.join(tmp, 'complaints.csv'), 600, seed=3)
+            for suffix in ('.csv', '.parquet', '.feather'):
+                with self.subTest(suffix=suffix):
+                    single_path = os.path.join(tmp, f'single{suffix}')
+                    parallel_path = os.path.join(tmp, f'parallel{suffix}')
+                    single_stats = process_file(raw_path, single_path, chunksize=250)
+                    parallel_stats = process_file_parallel(raw_path, parallel_path, workers=2, shard_mb=0.05)
+
+                    with open(single_path, 'rb') as f1, open(parallel_path, 'rb') as f2:
+                        self.assertEqual(f1.read(), f2.read())
+                    self.assertEqual(single_stats.report_lines(), parallel_stats.report_lines())
+            metadata = pq.ParquetFile(os.path.join(tmp, 'single.parquet')).metadata
+            self.assertEqual(metadata.row_group(0).num_rows, 100)
+
 if __name__ == '__main__':
     unittest.main()
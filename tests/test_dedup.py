@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.dedup as dedup
+from src.dedup import DUPLICATES_COLUMN, deduplicate, lsh_clusters, minhash_signatures, shingle_hashes
+
+def random_text(rng, words=120, vocab=5000):
+    return ' '.join(f"w{i}" for i in rng.integers(0, vocab, words))
+
+def edit(text, rng, changes):
+    words = text.split()
+    for position in rng.choice(len(words), changes, replace=False):
+        words[position] = 'changed'
+    return ' '.join(words)
+
+class TestDedup(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.base = [random_text(rng) for _ in range(50)]
+        texts = list(self.base)
+        texts.append(self.base[3])                      # exact copy
+        texts.append(self.base[3].upper())              # same words, different case
+        texts.append(edit(self.base[7], rng, 1))        # one word changed
+        texts.append(edit(self.base[7], rng, 40))       # a third of the words changed: not a duplicate
+        texts += ['', 'too short']
+        self.df = pd.DataFrame({'text': texts, 'Complaint ID': [str(i) for i in range(len(texts))]})
+
+    def test_near_duplicates_are_clustered(self):
+        deduped, stats = deduplicate(self.df, 'text')
+        kept = set(deduped['Complaint ID'])
+        self.assertEqual(set(self.df['Complaint ID']) - kept, {'50', '51', '52'})
+        counts = dict(zip(deduped['Complaint ID'], deduped[DUPLICATES_COLUMN]))
+        self.assertEqual(counts['3'], 3)
+        self.assertEqual(counts['7'], 2)
+        self.assertEqual(counts['53'], 1)
+        self.assertEqual((stats.documents, stats.kept, stats.removed, stats.clusters), (len(self.df), 53, 3, 2))
+        self.assertAlmostEqual(stats.saved_fraction, stats.removed_chars / stats.total_chars)
+        self.assertGreater(stats.saved_fraction, 0.04)
+
+    def test_empty_input(self):
+        self.assertEqual(len(lsh_clusters(np.empty((0, 128), dtype=np.uint32))), 0)
+        deduped, stats = deduplicate(self.df.iloc[:0], 'text')
+        self.assertTrue(deduped.empty)
+        self.assertEqual((stats.documents, stats.kept, stats.saved_fraction), (0, 0, 0.0))
+
+    def test_signature_agreement_estimates_jaccard(self):
+        rng = np.random.default_rng(1)
+        texts = pd.Series([self.base[0], edit(self.base[0], rng, 6)])
+        hashes, rows = shingle_hashes(texts)
+        first, second = (set(hashes[rows == r]) for r in (0, 1))
+        jaccard = len(first & second) / len(first | second)
+        signatures = minhash_signatures(hashes, rows, 2, permutations=512)
+        self.assertAlmostEqual((signatures[0] == signatures[1]).mean(), jaccard, delta=0.08)
+
+    def test_blocked_signatures_match_single_block(self):
+        hashes, rows = shingle_hashes(self.df['text'])
+        expected = minhash_signatures(hashes, rows, len(self.df))
+        with patch.object(dedup, 'SHINGLE_BLOCK', 200):
+            np.testing.assert_array_equal(minhash_signatures(hashes, rows, len(self.df)), expected)
+        # Row batches in deduplicate() produce the same clusters
+        small_batches, _ = deduplicate(self.df, 'text', batch_rows=7)
+        self.assertEqual(list(small_batches['Complaint ID']), list(deduplicate(self.df, 'text')[0]['Complaint ID']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from types import SimpleNamespace
+import sys
+import os
+import numpy as np
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.embedding_engine import (
+    OnnxEmbeddings, cache_model_name, length_buckets, load_embeddings, padding_ratio,
+)
+
+class WordTokenizer:
+    """One token per word, whose ID is the word length; 0 pads."""
+    pad_token_id = 0
+
+    def __call__(self, texts, truncation=True, max_length=None):
+        ids = [[len(w) for w in text.split()][:max_length] for text in texts]
+        return {'input_ids': ids}
+
+class FakeSession:
+    """Hidden state of each token is (id, 1, 0); records the padded batch widths it sees."""
+    def __init__(self):
+        self.widths = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name='input_ids'), SimpleNamespace(name='attention_mask')]
+
+    def get_outputs(self):
+        return [SimpleNamespace(name='last_hidden_state')]
+
+    def run(self, names, feeds):
+        ids = feeds['input_ids']
+        self.widths.append(ids.shape[1])
+        hidden = np.stack([ids, np.ones_like(ids), np.zeros_like(ids)], axis=-1).astype(np.float32)
+        return [hidden]
+
+def expected(text):
+    lengths = [len(w) for w in text.split()]
+    vector = np.array([np.mean(lengths), 1.0, 0.0])
+    return vector / np.linalg.norm(vector)
+
+class TestOnnxEmbeddings(unittest.TestCase):
+    def test_batches_by_length_and_keeps_input_order(self):
+        session = FakeSession()
+        model = OnnxEmbeddings(session, WordTokenizer(), batch_size=2)
+        texts = ['a much longer complaint text', 'fee', 'card declined', 'late fee charged twice', 'zelle']
+        vectors = model.embed_documents(texts)
+        # Sorted lengths 1, 1, 2, 4, 5: three forward passes padded to 1, 4 and 5 tokens
+        self.assertEqual(sorted(session.widths), [1, 4, 5])
+        for text, vector in zip(texts, vectors):
+            # Padding is excluded from the mean
+            np.testing.assert_allclose(vector, expected(text), rtol=1e-6)
+        np.testing.assert_allclose(model.embed_query('fee'), vectors[1], rtol=1e-6)
+        self.assertEqual(model.embed_documents([]), [])
+
+    def test_truncates_to_max_length(self):
+        session = FakeSession()
+        OnnxEmbeddings(session, WordTokenizer(), max_length=3).embed_documents(['one two three four five'])
+        self.assertEqual(session.widths, [3])
+
+class TestHelpers(unittest.TestCase):
+    def test_length_buckets_reduce_padding(self):
+        lengths = [10, 200, 12, 180, 11, 190]
+        arrival = [np.arange(0, 2), np.arange(2, 4), np.arange(4, 6)]
+        buckets = length_buckets(lengths, 2)
+        self.assertEqual([sorted(b.tolist()) for b in buckets], [[0, 4], [2, 3], [1, 5]])
+        self.assertLess(padding_ratio(lengths, buckets), padding_ratio(lengths, arrival))
+
+    def test_int8_vectors_get_their_own_cache_namespace(self):
+        self.assertEqual(cache_model_name('m', 'torch'), 'm')
+        self.assertEqual(cache_model_name('m', 'onnx'), 'm')
+        self.assertEqual(cache_model_name('m', 'onnx-int8'), 'm#int8')
+
+    def test_backend_validation(self):
+        with self.assertRaises(ValueError):
+            load_embeddings('m', 'tensorrt')
+        with self.assertRaises(FileNotFoundError):
+            load_embeddings('no-such/model', 'onnx')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+from src.embeddings import CachedEmbeddings, EmbeddingCache, cached_embeddings
+from tests.fakes import FakeEmbeddings
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache', 'embeddings.sqlite')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hits_misses_and_duplicates(self):
+        model = FakeEmbeddings()
+        embeddings = CachedEmbeddings(model, EmbeddingCache(self.path, 'fake-model'))
+
+        first = embeddings.embed_documents(['late fee', 'late  fee ', 'zelle'])
+        second = embeddings.embed_documents(['zelle', 'card lost'])
+
+        # 'late fee' and 'late  fee ' normalize to the same entry
+        self.assertEqual(model.calls, [2, 1])
+        self.assertEqual(first[0], first[1])
+        self.assertEqual(second[0], first[2])
+        self.assertEqual(embeddings.cache.stats()['hits'], 2)
+        self.assertEqual(embeddings.cache.stats()['misses'], 3)
+        self.assertAlmostEqual(embeddings.embed_query('zelle')[0], first[2][0], places=6)
+
+    def test_persists_across_instances_and_is_model_scoped(self):
+        CachedEmbeddings(FakeEmbeddings(), EmbeddingCache(self.path, 'fake-model')).embed_documents(['late fee'])
+
+        model = FakeEmbeddings()
+        CachedEmbeddings(model, EmbeddingCache(self.path, 'fake-model')).embed_query('late fee')
+        self.assertEqual(model.calls, [])
+
+        other = FakeEmbeddings()
+        cache = EmbeddingCache(self.path, 'other-model')
+        CachedEmbeddings(other, cache).embed_documents(['late fee'])
+        self.assertEqual(other.calls, [1])
+
+    def test_lru_eviction_respects_cap(self):
+        cache = EmbeddingCache(self.path, 'fake-model', max_entries=10)
+        embeddings = CachedEmbeddings(FakeEmbeddings(), cache)
+        embeddings.embed_documents([f"complaint {i}" for i in range(8)])
+        embeddings.embed_documents(['complaint 0'])  # refresh entry 0
+        embeddings.embed_documents([f"complaint {i}" for i in range(8, 12)])
+
+        self.assertLessEqual(len(cache), 10)
+        self.assertGreater(cache.evictions, 0)
+        self.assertIn(cache.key('complaint 0'), cache.get_many([cache.key('complaint 0')]))
+
+    def test_caches_sharing_a_file_keep_the_true_size(self):
+        indexer = EmbeddingCache(self.path, 'fake-model', max_entries=10)
+        server = EmbeddingCache(self.path, 'fake-model', max_entries=10)
+        CachedEmbeddings(FakeEmbeddings(), indexer).embed_documents([f"complaint {i}" for i in range(8)])
+        CachedEmbeddings(FakeEmbeddings(), server).embed_documents([f"question {i}" for i in range(6)])
+
+        stored = server._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        self.assertLessEqual(stored, 10)
+        self.assertEqual(len(server), stored)
+        self.assertEqual(server.evictions, 14 - stored)
+
+    def test_reads_defer_access_time_writes(self):
+        cache = EmbeddingCache(self.path, 'fake-model', touch_batch=2)
+        embeddings = CachedEmbeddings(FakeEmbeddings(), cache)
+        embeddings.embed_documents(['late fee', 'zelle'])
+        stored = dict(cache._conn.execute('SELECT key, last_used FROM embeddings').fetchall())
+
+        cache.get_many([cache.key('late fee')])
+        self.assertEqual(cache._conn.total_changes, 2)  # only the two inserts
+        cache.get_many([cache.key('zelle')])
+        refreshed = dict(cache._conn.execute('SELECT key, last_used FROM embeddings').fetchall())
+        self.assertTrue(all(refreshed[key] > stored[key] for key in stored))
+
+    def test_empty_path_disables_cache(self):
+        model = FakeEmbeddings()
+        self.assertIs(cached_embeddings(model, 'fake-model', cache_path=''), model)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from src.filters import MetadataIndex, SearchFilter, parse_filter, to_chroma_where
+from src.indexing import insert_embeddings
+from src.vector_index import ExactIndex, IndexVectorStore, export_from_chroma
+from src.rag_pipeline import ComplaintRAG
+
+CATEGORIES = ['Credit Card', 'Personal Loan', 'Savings Account', 'Money Transfer']
+STATES = ['TX', 'CA', 'NY']
+
+class TestSearchFilter(unittest.TestCase):
+    def test_parse_filter(self):
+        parsed = parse_filter("What do savings account complaints in Texas in 2023 say?")
+        self.assertEqual(parsed.categories, ('Savings Account',))
+        self.assertEqual(parsed.states, ('TX',))
+        self.assertEqual((parsed.date_from, parsed.date_to), ('2023-01-01', '2023-12-31'))
+
+        self.assertEqual(parse_filter("Issues in West Virginia since 2021").states, ('WV',))
+        self.assertIsNone(parse_filter("Issues in West Virginia since 2021").date_to)
+        self.assertTrue(parse_filter("Why are people unhappy with BNPL?").is_empty())
+
+    def test_parse_filter_ignores_amounts_and_company_names(self):
+        self.assertTrue(parse_filter("Why was I charged for 2000 dollars in fees?").is_empty())
+        self.assertTrue(parse_filter("I was charged in 2000 dollars of fees").is_empty())
+        self.assertEqual(parse_filter("Washington Mutual credit cards").states, ())
+        self.assertEqual(parse_filter("Fees at Texas Capital Bank").states, ())
+        self.assertEqual(parse_filter("Credit card complaints in Washington").states, ('WA',))
+        # Two-letter codes that double as words need the full state name
+        self.assertEqual(parse_filter("Is my account in OK standing?").states, ())
+        self.assertEqual(parse_filter("The bank sent a letter from ME").states, ())
+        self.assertEqual(parse_filter("Fee complaints in TX and in Oklahoma").states, ('OK', 'TX'))
+
+    def test_from_dict_and_chroma_where(self):
+        search_filter = SearchFilter.from_dict({'state': 'tx', 'category': ['Credit Card', 'Personal Loan']})
+        self.assertEqual(search_filter.states, ('TX',))
+        self.assertEqual(to_chroma_where(search_filter), {'$and': [
+            {'Category': {'$in': ['Credit Card', 'Personal Loan']}},
+            {'State': {'$in': ['TX']}},
+        ]})
+        self.assertEqual(to_chroma_where(SearchFilter(date_from='2023-02-01')), {'date_int': {'$gte': 20230201}})
+        self.assertIsNone(to_chroma_where(SearchFilter()))
+        self.assertEqual(SearchFilter.from_dict({'date_to': '2023-02-28'}).date_to, '2023-02-28')
+        for bad in ('2023-02-30', 'last year', 20230201):
+            with self.assertRaisesRegex(ValueError, "ISO date"):
+                SearchFilter.from_dict({'date_from': bad})
+        with self.assertRaises(ValueError):
+            SearchFilter.from_dict({'zip': '75001'})
+
+    def test_metadata_index_rows(self):
+        records = [
+            {'Category': CATEGORIES[i % 4], 'State': STATES[i % 3], 'date_int': 20200101 + 10000 * (i % 5)}
+            for i in range(60)
+        ]
+        index = MetadataIndex.from_records(records)
+        search_filter = SearchFilter(categories=('Savings Account', 'Credit Card'), states=('TX',),
+                                     date_from='2021-01-01', date_to='2022-12-31')
+        expected = [i for i, r in enumerate(records)
+                    if r['Category'] in search_filter.categories and r['State'] == 'TX'
+                    and 20210101 <= r['date_int'] <= 20221231]
+        np.testing.assert_array_equal(index.rows(search_filter), expected)
+        self.assertEqual(len(index.rows(SearchFilter(states=('FL',)))), 0)
+        self.assertIsNone(index.rows(SearchFilter()))
+
+class TestFilteredSearch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(1)
+        cls.vectors = rng.standard_normal((400, 8)).astype(np.float32)
+        cls.metadata = [
+            {'Category': CATEGORIES[i % 4], 'State': STATES[i % 3], 'Date received': f"{2019 + i % 5}-06-15"}
+            for i in range(len(cls.vectors))
+        ]
+        cls.store = Chroma(persist_directory=os.path.join(cls.tmp.name, 'chroma'))
+        docs = [Document(page_content=f"complaint {i}", metadata=dict(m, date_int=(2019 + i % 5) * 10000 + 615),
+                         id=f"{i}-0") for i, m in enumerate(cls.metadata)]
+        insert_embeddings(cls.store, docs, cls.vectors.tolist())
+        cls.index_dir = os.path.join(cls.tmp.name, 'index')
+        export_from_chroma(cls.store, cls.index_dir)
+        cls.filter = SearchFilter(categories=('Money Transfer',), states=('CA', 'NY'), date_from='2021-01-01')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def expected_ids(self, query, k):
+        subset = [i for i, m in enumerate(self.metadata)
+                  if m['Category'] == 'Money Transfer' and m['State'] in ('CA', 'NY')
+                  and m['Date received'] >= '2021-01-01']
+        dist = ((self.vectors[subset] - query) ** 2).sum(axis=1)
+        return [f"{subset[j]}-0" for j in np.argsort(dist)[:k]]
+
+    def test_index_store_filtered_search_matches_brute_force(self):
+        store = IndexVectorStore(ExactIndex(self.index_dir), MagicMock())
+        query = self.vectors[7] + 0.1
+        docs = store.similarity_search_by_vector(query.tolist(), k=5, filter=self.filter)
+        self.assertEqual([d.id for d in docs], self.expected_ids(query, 5))
+        # Dict form and batched search agree
+        batched = store.similarity_search_by_vectors(
+            [query.tolist()], k=5, filter={'category': 'Money Transfer', 'state': ['CA', 'NY'],
+                                           'date_from': '2021-01-01'})
+        self.assertEqual([d.id for d in batched[0]], self.expected_ids(query, 5))
+
+    def test_chroma_where_matches_index_store(self):
+        query = self.vectors[11] - 0.2
+        docs = self.store.similarity_search_by_vector(query.tolist(), k=5, filter=to_chroma_where(self.filter))
+        self.assertEqual(sorted(d.id for d in docs), sorted(self.expected_ids(query, 5)))
+
+    def test_pipeline_threads_filter_and_keys_cache_on_it(self):
+        rag = ComplaintRAG(backend="exact", index_path=self.index_dir, auto_filter=True, context_tokens=0)
+        rag._vector_store = IndexVectorStore(ExactIndex(self.index_dir), MagicMock())
+        rag._retriever = MagicMock()
+        query = self.vectors[3]
+        rag._embedding_fn = MagicMock()
+        rag._embedding_fn.embed_query.return_value = query.tolist()
+        rag._generate = MagicMock(return_value=("answer", {}))
+
+        result = rag.query_with_sources("money transfer complaints in California or New York since 2021")
+        self.assertEqual(result.filters.states, ('CA', 'NY'))
+        self.assertEqual([d.id for d in result.sources], self.expected_ids(query, 5))
+        # The unfiltered question is a different cache entry
+        self.assertFalse(rag.query_with_sources("money transfer complaints", filters=SearchFilter()).cached)
+        self.assertTrue(rag.query_with_sources("money transfer complaints in California or New York since 2021").cached)
+
+    def test_filter_matching_nothing_falls_back_to_unfiltered_search(self):
+        rag = ComplaintRAG(backend="exact", index_path=self.index_dir, context_tokens=0)
+        rag._vector_store = IndexVectorStore(ExactIndex(self.index_dir), MagicMock())
+        rag._retriever = MagicMock()
+        query = self.vectors[3]
+        rag._embedding_fn = MagicMock()
+        rag._embedding_fn.embed_query.return_value = query.tolist()
+        rag._embedding_fn.embed_documents.return_value = [query.tolist()]
+        rag._generate = MagicMock(return_value=("answer", {}))
+        rag._generate_batch = MagicMock(return_value=(["answer"], [{}]))
+        unfiltered = [d.id for d in rag.query_with_sources("fees").sources]
+
+        result = rag.query_with_sources("fees in Florida", filters={'state': 'FL'})
+        self.assertEqual([d.id for d in result.sources], unfiltered)
+        batched = rag.query_batch(["fees in Florida?"], filters={'state': 'FL'})
+        self.assertEqual([d.id for d in batched[0].sources], unfiltered)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.generation import OnnxSeq2SeqGenerator, load_generation_model
+from src.benchmarks.generation import REFERENCE_CSV, compare_backends, load_reference, token_f1
+from src.rag_pipeline import ComplaintRAG
+from src.instrumentation import StageTimer
+
+VOCAB = 6
+EOS, PAD = 1, 0
+
+def names(*items):
+    return [SimpleNamespace(name=n) for n in items]
+
+class FakeSession:
+    """An ONNX Runtime session stand-in: run(output_names, feeds) -> list of arrays."""
+    def __init__(self, inputs, outputs, fn):
+        self._inputs, self._outputs, self.fn = names(*inputs), names(*outputs), fn
+        self.feeds = []
+
+    def get_inputs(self):
+        return self._inputs
+
+    def get_outputs(self):
+        return self._outputs
+
+    def run(self, output_names, feeds):
+        self.feeds.append(feeds)
+        values = self.fn(feeds)
+        return [values[n] for n in output_names]
+
+def logits_for(tokens):
+    """One-step logits whose argmax is tokens[row]."""
+    logits = np.zeros((len(tokens), 1, VOCAB), dtype=np.float32)
+    for row, token in enumerate(tokens):
+        logits[row, 0, token] = 1.0
+    return logits
+
+def make_generator(script):
+    """Generator whose decoder emits script[row][step] tokens."""
+    step = {'n': 0}
+
+    def encoder(feeds):
+        return {'last_hidden_state': np.ones(feeds['input_ids'].shape + (4,), dtype=np.float32)}
+
+    def decoder(feeds):
+        n = step['n']
+        step['n'] += 1
+        tokens = [row[min(n, len(row) - 1)] for row in script]
+        return {'logits': logits_for(tokens),
+                'present.0.decoder.key': np.full((1,), n, dtype=np.float32),
+                'present.0.encoder.key': np.full((1,), 100, dtype=np.float32)}
+
+    def decoder_with_past(feeds):
+        out = decoder(feeds)
+        del out['present.0.encoder.key'] # cross-attention cache only comes from the first step
+        return out
+
+    encoder_inputs = ('input_ids', 'attention_mask')
+    decoder_inputs = ('input_ids', 'encoder_hidden_states', 'encoder_attention_mask')
+    past_inputs = decoder_inputs + ('past_key_values.0.decoder.key', 'past_key_values.0.encoder.key')
+    sessions = (
+        FakeSession(encoder_inputs, ('last_hidden_state',), encoder),
+        FakeSession(decoder_inputs, ('logits', 'present.0.decoder.key', 'present.0.encoder.key'), decoder),
+        FakeSession(past_inputs, ('logits', 'present.0.decoder.key'), decoder_with_past),
+    )
+    config = {'decoder_start_token_id': PAD, 'eos_token_id': EOS, 'pad_token_id': PAD}
+    return OnnxSeq2SeqGenerator(*sessions, config), sessions
+
+class TestOnnxGenerator(unittest.TestCase):
+    def test_greedy_decoding_reuses_cache_and_pads_finished_rows(self):
+        generator, (encoder, decoder, with_past) = make_generator([[2, 3, EOS], [4, EOS]])
+        output = generator.generate(np.array([[5, 5], [5, 0]]), np.array([[1, 1], [1, 0]]))
+        np.testing.assert_array_equal(output, [[PAD, 2, 3, EOS], [PAD, 4, EOS, PAD]])
+        self.assertEqual(len(encoder.feeds), 1)
+        self.assertEqual(len(decoder.feeds), 1)
+        self.assertEqual(len(with_past.feeds), 2)
+        # Later steps get one new token, the previous self-attention cache and the first step's cross-attention cache
+        last = with_past.feeds[-1]
+        self.assertEqual(last['input_ids'].shape, (2, 1))
+        self.assertEqual(last['past_key_values.0.decoder.key'][0], 1)
+        self.assertEqual(last['past_key_values.0.encoder.key'][0], 100)
+        # Feeds are filtered down to the inputs each session declares
+        self.assertNotIn('past_key_values.0.decoder.key', decoder.feeds[0])
+
+    def test_max_length_counts_the_start_token(self):
+        generator, _ = make_generator([[2, 3, 4, 5]])
+        self.assertEqual(generator.generate(np.array([[5]]), max_length=3).shape, (1, 3))
+
+    def test_streamer_receives_each_token(self):
+        generator, _ = make_generator([[2, EOS]])
+        streamer = MagicMock()
+        generator.generate(np.array([[5]]), streamer=streamer)
+        self.assertEqual([int(c.args[0][0]) for c in streamer.put.call_args_list], [PAD, 2, EOS])
+        streamer.end.assert_called_once()
+
+class TestBackendSelection(unittest.TestCase):
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            load_generation_model(backend='fp16')
+
+    def test_missing_onnx_export(self):
+        with tempfile.TemporaryDirectory() as tmp, patch('src.generation.onnx_model_dir', return_value=tmp):
+            with self.assertRaises(FileNotFoundError):
+                load_generation_model(backend='onnx')
+
+    @patch('src.rag_pipeline.load_generation_model')
+    def test_onnx_backend_generates_with_numpy_inputs(self, mock_load):
+        generator, _ = make_generator([[2, EOS]])
+        mock_load.return_value = generator
+        tokenizer = MagicMock(pad_token_id=PAD)
+        tokenizer.return_value = {'input_ids': np.array([[5, 5]]), 'attention_mask': np.array([[1, 1]])}
+        tokenizer.decode.return_value = "answer"
+        rag = ComplaintRAG(generation_backend='onnx', context_tokens=0)
+        rag._tokenizer = tokenizer
+        self.assertIsNone(rag._load_llm())
+        answer, tokens = rag._generate("prompt", StageTimer([]))
+        self.assertEqual(answer, "answer")
+        self.assertEqual(tokens, {'input_tokens': 2, 'output_tokens': 2})
+        self.assertEqual(tokenizer.call_args.kwargs['return_tensors'], 'np')
+
+    def test_token_f1(self):
+        self.assertEqual(token_f1("late fees", "late fees"), 1.0)
+        self.assertAlmostEqual(token_f1("late fees charged", "late fees"), 0.8)
+        self.assertEqual(token_f1("", "fees"), 0.0)
+
+    def test_backends_are_scored_against_the_reference_answers(self):
+        reference = load_reference(str(REFERENCE_CSV))
+        questions = list(reference)[:2] + ["A question without a reference?"]
+        answers = {'torch': [reference[questions[0]], reference[questions[1]], "x"],
+                   'onnx': [reference[questions[0]], "something else", "x"]}
+
+        def evaluate(rag, qs, batch_size):
+            return pd.DataFrame({"Generated Answer": answers[rag.generation_backend],
+                                 "Generate (ms)": 10.0 if rag.generation_backend == 'torch' else 5.0,
+                                 "Latency (s)": 1.0}, index=range(len(qs)))
+
+        with patch('src.benchmarks.generation.ComplaintRAG') as rag_cls, \
+                patch('src.benchmarks.generation.evaluate_pipeline', side_effect=evaluate):
+            rag_cls.side_effect = lambda generation_backend, cache_size: MagicMock(
+                generation_backend=generation_backend)
+            results = compare_backends(questions, ['torch', 'onnx'], 2, reference)
+        self.assertEqual(results['torch']['exact_match'], 1.0)
+        self.assertEqual(results['onnx']['exact_match'], 0.5)
+        self.assertLess(results['onnx']['token_f1'], 1.0)
+        self.assertEqual(results['onnx']['speedup'], 2.0)
+
+if __name__ == '__main__':
+    unittest.main()
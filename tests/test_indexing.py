@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+import src.create_vector_store as create_vector_store
+from src.sparse_index import BM25Index
+from src.dedup import DUPLICATES_COLUMN
+from src.indexing import assign_chunk_id, clean_metadata, index_documents, iter_batches, sync_documents
+from tests.fakes import FakeEmbeddings
+
+class TestIndexing(unittest.TestCase):
+    def test_iter_batches(self):
+        self.assertEqual(list(iter_batches(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_clean_metadata_drops_missing_values(self):
+        self.assertEqual(clean_metadata({'State': float('nan'), 'Company': None, 'Product': 'Credit card'}),
+                         {'Product': 'Credit card'})
+
+    def test_index_documents_batches_and_inserts_everything(self):
+        embeddings = FakeEmbeddings()
+        store = Chroma(collection_name='test_index_documents', embedding_function=embeddings)
+        docs = (Document(page_content=f"complaint {i}", metadata={'Complaint ID': str(i)}) for i in range(23))
+
+        stats = index_documents(docs, embeddings, store, embed_batch_size=4, insert_batch_size=10, workers=3)
+
+        self.assertEqual(stats.chunks, 23)
+        self.assertEqual(stats.batches, 3)
+        self.assertTrue(all(n <= 4 for n in embeddings.calls))
+        self.assertEqual(store._collection.count(), 23)
+        hit = store.similarity_search("complaint 7", k=1)[0]
+        self.assertEqual(hit.metadata['Complaint ID'], '7')
+        store.delete_collection()
+
+def complaint_chunks(narratives):
+    return [
+        assign_chunk_id(Document(page_content=text, metadata={'Complaint ID': cid}), 0)
+        for cid, text in narratives.items()
+    ]
+
+class TestIncrementalIndexing(unittest.TestCase):
+    def test_sync_embeds_only_the_delta(self):
+        embeddings = FakeEmbeddings()
+        store = Chroma(collection_name='test_sync_documents', embedding_function=embeddings)
+        sync_documents(complaint_chunks({'1': 'late fee', '2': 'card lost', '3': 'zelle delay'}), embeddings, store)
+        embeddings.calls.clear()
+
+        stats = sync_documents(
+            complaint_chunks({'1': 'late fee', '2': 'card stolen', '4': 'loan denied'}),
+            embeddings, store,
+        )
+
+        self.assertEqual((stats.added, stats.updated, stats.unchanged, stats.deleted), (1, 1, 1, 1))
+        self.assertEqual(sum(embeddings.calls), 2)
+        stored = store._collection.get()
+        self.assertEqual(sorted(stored['ids']), ['1-0', '2-0', '4-0'])
+        self.assertIn('card stolen', stored['documents'])
+        store.delete_collection()
+
+    def test_sync_rewrites_chunks_whose_duplicate_count_changed(self):
+        def chunks(count):
+            return [assign_chunk_id(Document(page_content='late fee', metadata={
+                'Complaint ID': '1', DUPLICATES_COLUMN: count}), 0)]
+
+        self.assertEqual(chunks(1)[0].id, chunks(2)[0].id)
+        self.assertNotEqual(chunks(1)[0].metadata['content_hash'], chunks(2)[0].metadata['content_hash'])
+        embeddings = FakeEmbeddings()
+        store = Chroma(collection_name='test_sync_duplicates', embedding_function=embeddings)
+        sync_documents(chunks(1), embeddings, store)
+        stats = sync_documents(chunks(3), embeddings, store)
+        self.assertEqual((stats.added, stats.updated, stats.unchanged), (0, 1, 0))
+        self.assertEqual(store._collection.get(ids=['1-0'])['metadatas'][0][DUPLICATES_COLUMN], 3)
+        store.delete_collection()
+
+    def test_create_vector_store_main_full_then_incremental(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data_path = os.path.join(tmp, 'filtered.parquet')
+            df = pd.DataFrame({
+                'cleaned_narrative': ['late fee charged', 'transfer never arrived ' * 40, 'savings interest'],
+                'Complaint ID': ['1', '2', '3'],
+                'Date received': ['2023-01-01'] * 3,
+                'Product': ['Credit card', 'Money transfers', 'Checking or savings account'],
+                'Sub-product': [None] * 3,
+                'Issue': ['Fees'] * 3,
+                'Company': ['A', 'B', 'C'],
+                'State': ['TX', None, 'NY'],
+                'Category': ['Credit Card', 'Money Transfer', 'Savings Account'],
+            })
+            df.to_parquet(data_path)
+            store_path = os.path.join(tmp, 'vector_store')
+            sparse_path = os.path.join(tmp, 'sparse_index')
+            with patch.object(create_vector_store, 'VECTOR_STORE_PATH', store_path), \
+                    patch.object(create_vector_store, 'SPARSE_INDEX_PATH', sparse_path), \
+                    patch.object(create_vector_store, 'SAMPLE_PATH', os.path.join(tmp, 'sample.parquet')), \
+                    patch.object(create_vector_store, 'load_embeddings', lambda *args, **kwargs: FakeEmbeddings()):
+                cache = ['--embedding-cache', os.path.join(tmp, 'cache.sqlite')]
+                create_vector_store.main(['--data-path', data_path, '--sample-size', '0', '--workers', '2'] + cache)
+                create_vector_store.main(['--data-path', data_path, '--sample-size', '0', '--incremental'] + cache)
+
+                store = Chroma(persist_directory=store_path, embedding_function=FakeEmbeddings())
+                ids = store._collection.get()['ids']
+            self.assertIn('1-0', ids)
+            self.assertIn('2-1', ids)
+            self.assertEqual(len(ids), len(set(ids)))
+            # The BM25 index was updated in place and covers the same chunks
+            self.assertEqual(BM25Index(sparse_path).count, len(ids))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.instrumentation import StageRecorder, StageTimer, process_uptime
+
+class TestStageTimer(unittest.TestCase):
+    def test_stages_are_timed_and_forwarded_to_hooks(self):
+        calls = []
+        timer = StageTimer([lambda stage, seconds, info: calls.append((stage, dict(info)))])
+        with timer.stage("tokenize") as info:
+            info["input_tokens"] = 7
+        timer.record("generate", 0.5, output_tokens=3)
+
+        self.assertEqual(calls, [("tokenize", {"input_tokens": 7}), ("generate", {"output_tokens": 3})])
+        self.assertGreaterEqual(timer.timings["tokenize"], 0.0)
+        self.assertEqual(timer.timings["generate"], 0.5)
+
+    def test_failing_hook_does_not_break_the_query(self):
+        def broken(stage, seconds, info):
+            raise ValueError("boom")
+        timer = StageTimer([broken])
+        timer.record("decode", 0.1)
+        self.assertEqual(timer.timings, {"decode": 0.1})
+
+    def test_failing_stage_is_still_recorded(self):
+        calls = []
+        timer = StageTimer([lambda stage, seconds, info: calls.append((stage, dict(info)))])
+        with self.assertRaises(RuntimeError):
+            with timer.stage("generate"):
+                raise RuntimeError("out of memory")
+        self.assertIn("generate", timer.timings)
+        self.assertEqual(calls, [("generate", {"failed": True})])
+
+class TestStageRecorder(unittest.TestCase):
+    def test_process_uptime_covers_the_imports_so_far(self):
+        uptime = process_uptime()
+        self.assertGreaterEqual(uptime, 0.0)
+        if sys.platform.startswith('linux'):
+            self.assertGreater(uptime, 0.0)
+
+    def test_percentiles_in_pipeline_order(self):
+        recorder = StageRecorder()
+        for i in range(1, 101):
+            recorder("generate", i / 100, {"output_tokens": i})
+            recorder("embed_query", 0.01, {})
+
+        summary = recorder.summary()
+        self.assertEqual(list(summary), ["embed_query", "generate"])
+        self.assertEqual(summary["generate"]["count"], 100)
+        self.assertAlmostEqual(summary["generate"]["p50"], 0.505)
+        self.assertAlmostEqual(summary["generate"]["p95"], 0.9505)
+        self.assertEqual(recorder.token_summary()["output_tokens"]["max"], 100)
+        self.assertIn("| generate | 100 | 505.0 | 950.5 |", recorder.format_markdown())
+
+        recorder.reset()
+        self.assertEqual(recorder.summary(), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from src.query_cache import QueryCache, normalize_question, store_fingerprint
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestQueryCache(unittest.TestCase):
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question("  Credit card\n LATE fees? "), "credit card late fees?")
+
+    def test_lru_eviction(self):
+        cache = QueryCache(max_entries=2, ttl_seconds=60)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        cache = QueryCache(max_entries=10, ttl_seconds=5, clock=clock)
+        cache.put('q', 'answer')
+        clock.now = 4
+        self.assertEqual(cache.get('q'), 'answer')
+        clock.now = 10
+        self.assertIsNone(cache.get('q'))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['expirations']), (1, 1, 1))
+
+    def test_fingerprint_change_invalidates(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'chroma.sqlite3')
+            with open(path, 'w') as f:
+                f.write('v1')
+            cache = QueryCache()
+            cache.check_fingerprint(store_fingerprint(tmp))
+            cache.put('q', 'answer')
+            cache.check_fingerprint(store_fingerprint(tmp))
+            self.assertEqual(cache.get('q'), 'answer')
+
+            with open(path, 'w') as f:
+                f.write('v2 longer')
+            cache.check_fingerprint(store_fingerprint(tmp))
+            self.assertIsNone(cache.get('q'))
+            self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_fingerprint_is_rechecked_after_ttl(self):
+        clock = FakeClock()
+        cache = QueryCache(clock=clock, fingerprint_ttl=5)
+        fingerprints = iter(['v1', 'v2', 'v3'])
+        compute = fingerprints.__next__
+        cache.refresh_fingerprint(compute)
+        cache.put('q', 'answer')
+        clock.now = 4
+        cache.refresh_fingerprint(compute)
+        self.assertEqual(cache.get('q'), 'answer')
+        clock.now = 6
+        cache.refresh_fingerprint(compute)
+        self.assertIsNone(cache.get('q'))
+
+if __name__ == '__main__':
+    unittest.main()
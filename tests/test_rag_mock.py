@@ -1,13 +1,21 @@
 
+import asyncio
 import unittest
 from unittest.mock import MagicMock, patch
 import sys
 import os
+import tempfile
+import threading
+import time
+import numpy as np
 
 # Put src in path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.rag_pipeline import ComplaintRAG
+from langchain_core.documents import Document
+from src.evaluate_rag import evaluate_pipeline
+from src.rag_pipeline import ComplaintRAG, RAGResult
+from src.instrumentation import StageRecorder, StageTimer, profiled
 
 class TestRAGPipeline(unittest.TestCase):
     @patch('src.rag_pipeline.Chroma')
@@ -22,7 +30,7 @@ class TestRAGPipeline(unittest.TestCase):
         mock_chroma.return_value.as_retriever.return_value = mock_retriever
         
         # Mock the chain invocation
-        rag = ComplaintRAG()
+        rag = ComplaintRAG(context_tokens=0)
         
         # Mock the chain creation/retrieval
         mock_chain = MagicMock()
@@ -36,5 +44,329 @@ class TestRAGPipeline(unittest.TestCase):
         self.assertEqual(response, "Mocked RAG Answer")
         mock_chain.invoke.assert_called_with("Test Question")
 
+    def test_chain_answers_are_cached_separately(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            rag = ComplaintRAG(vector_store_path=store_dir, context_tokens=0, auto_filter=False,
+                               generation_backend='torch')
+            chain = MagicMock()
+            chain.invoke.return_value = "Chain answer"
+            rag.get_chain = MagicMock(return_value=chain)
+
+            self.assertEqual(rag.query("Why fees?"), "Chain answer")
+            self.assertEqual(rag.query("why fees?"), "Chain answer")
+            self.assertEqual(chain.invoke.call_count, 1)
+            self.assertIsNone(rag._cached_result("Why fees?"))
+
+    def _mock_components(self, rag, docs, answer="Fees"):
+        """Replaces the store, embedder and generator with mocks."""
+        rag._retriever = MagicMock()
+        rag._embedding_fn = MagicMock()
+        rag._embedding_fn.embed_query.return_value = [0.1, 0.2]
+        rag._vector_store = MagicMock()
+        rag._vector_store.similarity_search_by_vector.return_value = docs
+        rag._generate = MagicMock(return_value=(answer, {"input_tokens": 12, "output_tokens": 3}))
+        # Prompts are joined verbatim; the token budget is covered by test_context
+        rag.context_tokens = 0
+
+    def test_query_with_sources_retrieves_once(self):
+        docs = [
+            Document(page_content="late fee charged twice", metadata={"Complaint ID": "1"}),
+            Document(page_content="card declined abroad", metadata={"Complaint ID": "2"}),
+        ]
+        recorder = StageRecorder()
+        rag = ComplaintRAG(hooks=[recorder])
+        self._mock_components(rag, docs)
+
+        result = rag.query_with_sources("Why fees?")
+
+        self.assertIsInstance(result, RAGResult)
+        self.assertEqual(result.answer, "Fees")
+        self.assertEqual(result.sources, docs)
+        self.assertEqual(result.tokens, {"input_tokens": 12, "output_tokens": 3})
+        rag._embedding_fn.embed_query.assert_called_once_with("Why fees?")
+        rag._vector_store.similarity_search_by_vector.assert_called_once_with([0.1, 0.2], k=5)
+        prompt = rag._generate.call_args[0][0]
+        self.assertIn("late fee charged twice\n\ncard declined abroad", prompt)
+        self.assertIn("Why fees?", prompt)
+        for stage in ("cache_lookup", "embed_query", "vector_search", "prompt_build", "retrieval", "generation", "total"):
+            self.assertIn(stage, result.timings)
+        self.assertAlmostEqual(
+            result.timings["retrieval"], result.timings["embed_query"] + result.timings["vector_search"])
+        self.assertEqual(
+            list(recorder.summary()), ["cache_lookup", "embed_query", "vector_search", "prompt_build"])
+
+    def test_retrieval_failure_returns_an_error_answer(self):
+        rag = ComplaintRAG()
+        self._mock_components(rag, [])
+        rag._vector_store.similarity_search_by_vector.side_effect = RuntimeError("store unavailable")
+
+        result = rag.query_with_sources("Why fees?")
+        self.assertEqual(result.answer, "Error: Unable to generate response.")
+        self.assertEqual(result.sources, [])
+        rag._generate.assert_not_called()
+        rag._vector_store.similarity_search_by_vector.side_effect = None
+        self.assertEqual(rag.query_with_sources("Why fees?").answer, "Fees") # failures are not cached
+
+    def test_repeated_question_is_served_from_cache(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            rag = ComplaintRAG(vector_store_path=store_dir)
+            self._mock_components(rag, [Document(page_content="late fee", metadata={})])
+            search = rag._vector_store.similarity_search_by_vector
+
+            first = rag.query_with_sources("Why fees?")
+            second = rag.query_with_sources("  why FEES? ")
+            self.assertFalse(first.cached)
+            self.assertTrue(second.cached)
+            self.assertEqual(second.answer, "Fees")
+            self.assertEqual(search.call_count, 1)
+            self.assertEqual(rag.cache_stats()['hits'], 1)
+
+            # Any change to the store invalidates cached answers (once the fingerprint is re-checked)
+            with open(os.path.join(store_dir, 'chroma.sqlite3'), 'w') as f:
+                f.write('new data')
+            rag._query_cache.fingerprint_ttl = 0
+            self.assertFalse(rag.query_with_sources("Why fees?").cached)
+            self.assertEqual(search.call_count, 2)
+
+    def test_query_batch_embeds_and_searches_once(self):
+        rag = ComplaintRAG()
+        self._mock_components(rag, [])
+        rag._embedding_fn.embed_documents.side_effect = lambda texts: [[float(len(t))] for t in texts]
+        rag._vector_store._collection.query.side_effect = lambda query_embeddings, **kw: {
+            "ids": [[f"{v[0]:.0f}-0"] for v in query_embeddings],
+            "documents": [[f"doc for {v[0]:.0f}"] for v in query_embeddings],
+            "metadatas": [[None] for _ in query_embeddings],
+        }
+        rag._generate_batch = MagicMock(side_effect=lambda prompts, timer: (
+            [f"answer {len(p)}" for p in prompts], [{"input_tokens": 1, "output_tokens": 1}] * len(prompts)))
+
+        questions = ["Why fees?", "Loan issues?", "why fees?", "Savings account problems?"]
+        results = rag.query_batch(questions, batch_size=2)
+
+        self.assertEqual([r.question for r in results], questions)
+        rag._embedding_fn.embed_documents.assert_called_once_with(
+            ["Why fees?", "Loan issues?", "Savings account problems?"])
+        self.assertEqual(rag._vector_store._collection.query.call_count, 1)
+        self.assertEqual(rag._generate_batch.call_count, 2)
+        self.assertEqual(results[0].answer, results[2].answer)
+        self.assertEqual(results[1].sources[0].page_content, "doc for 12")
+        self.assertEqual(results[1].sources[0].id, "12-0")
+        # Prompts are generated shortest first to keep padding low
+        first_batch = rag._generate_batch.call_args_list[0][0][0]
+        self.assertIn("doc for 9", first_batch[0])
+        self.assertIn("doc for 12", first_batch[1])
+        self.assertIn("total", results[3].timings)
+
+        # A second batch is answered from the query cache
+        again = rag.query_batch(["Loan issues?"])
+        self.assertTrue(again[0].cached)
+        self.assertEqual(rag._generate_batch.call_count, 2)
+
+    def test_query_batch_isolates_failures(self):
+        rag = ComplaintRAG(cache_size=0)
+        self._mock_components(rag, [])
+        rag._embedding_fn.embed_documents.return_value = [[0.1], [0.2]]
+        rag._vector_store._collection.query.return_value = {"ids": [[], []], "documents": [[], []],
+                                                             "metadatas": [[], []]}
+        rag._generate_batch = MagicMock(side_effect=RuntimeError("out of memory"))
+
+        def generate(prompt, timer):
+            if "Loans?" in prompt:
+                raise RuntimeError("bad prompt")
+            return "Fees", {"output_tokens": 1}
+        rag._generate = MagicMock(side_effect=generate)
+
+        # A failed generation batch is retried prompt by prompt
+        results = rag.query_batch(["Why fees?", "Loans?"])
+        self.assertEqual([r.answer for r in results], ["Fees", "Error: Unable to generate response."])
+
+        # A failed batch retrieval falls back to answering each question on its own
+        rag._embedding_fn.embed_documents.side_effect = RuntimeError("embedder down")
+        rag._query_with_sources = MagicMock(side_effect=lambda q, f=None: RAGResult(question=q, answer="single"))
+        self.assertEqual([r.answer for r in rag.query_batch(["Why fees?", "Loans?"])], ["single", "single"])
+
+    def test_evaluation_survives_a_failing_batch(self):
+        rag = MagicMock()
+        rag.query_batch.side_effect = RuntimeError("boom")
+        rag.query_with_sources.side_effect = [RAGResult(question="a", answer="ok", timings={"total": 1.0}),
+                                              RuntimeError("bad question")]
+        df = evaluate_pipeline(rag, ["a", "b"])
+        self.assertEqual(df["Generated Answer"].tolist(), ["ok", "ERROR"])
+
+    def test_concurrent_aquery_calls_share_a_generation_batch(self):
+        rag = ComplaintRAG(cache_size=0)
+        self._mock_components(rag, [Document(page_content="late fee", metadata={})])
+        rag._generate_batch = MagicMock(side_effect=lambda prompts, timer: (
+            ["Fees"] * len(prompts), [{"input_tokens": 5, "output_tokens": 1}] * len(prompts)))
+
+        async def run():
+            return await asyncio.gather(*(rag.aquery(q) for q in ["Why fees?", "Loans?", "Savings?"]))
+
+        results = asyncio.run(run())
+        self.assertEqual([r.answer for r in results], ["Fees"] * 3)
+        self.assertEqual(rag._generate_batch.call_count, 1)
+        self.assertEqual(len(rag._generate_batch.call_args[0][0]), 3)
+        self.assertIn("queue_wait", results[0].timings)
+        self.assertEqual(rag.queue_stats()["batches"], 1)
+
+        batcher = rag._batcher
+        rag.reset_generation_queue()
+        self.assertTrue(batcher._closed)
+        self.assertEqual(rag.queue_stats(), {})
+        self.assertEqual(asyncio.run(rag.aquery("Why fees?")).answer, "Fees")
+        self.assertEqual(rag.queue_stats()["batches"], 1)
+
+    def test_aquery_builds_prompts_off_the_event_loop(self):
+        rag = ComplaintRAG(cache_size=0)
+        self._mock_components(rag, [Document(page_content="late fee", metadata={})])
+        threads = []
+
+        def failing_build(question, docs, timer):
+            threads.append(threading.current_thread())
+            raise RuntimeError("tokenizer unavailable")
+        rag._build_prompt = failing_build
+
+        result = asyncio.run(rag.aquery("Why fees?"))
+        self.assertEqual(result.answer, "Error: Unable to generate response.")
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    def test_stream_query_exposes_sources_before_generation(self):
+        docs = [Document(page_content="late fee", metadata={})]
+        rag = ComplaintRAG()
+        self._mock_components(rag, docs)
+
+        def fake_stream(prompt, timer, tokens, cancel=None):
+            tokens.update(input_tokens=4, output_tokens=3)
+            yield from ["Late ", "fees ", "apply."]
+        rag._stream_generate = MagicMock(side_effect=fake_stream)
+
+        stream = rag.stream_query("Why fees?")
+        self.assertEqual(stream.sources, docs)
+        self.assertIsNone(stream.result)
+        self.assertEqual(list(stream), ["Late ", "fees ", "apply."])
+        self.assertEqual(stream.result.answer, "Late fees apply.")
+        self.assertEqual(stream.result.tokens["output_tokens"], 3)
+        self.assertLessEqual(stream.result.timings["first_token"], stream.result.timings["total"])
+
+        async def consume():
+            return [piece async for piece in rag.stream_query("why fees?")]
+
+        # Served from the query cache as a single piece
+        self.assertEqual(asyncio.run(consume()), ["Late fees apply."])
+        self.assertEqual(rag._stream_generate.call_count, 1)
+
+    def test_stream_generate_yields_decoded_text(self):
+        class FakeTokenizer:
+            pad_token_id = 0
+
+            def __call__(self, prompt, **kwargs):
+                return {"input_ids": np.array([[5, 6, 7]])}
+
+            def decode(self, ids, **kwargs):
+                return "".join(f"w{i} " for i in ids if i != self.pad_token_id)
+
+        class FakeModel:
+            tensor_type = "np"
+
+            def __init__(self):
+                self.steps = 0
+
+            def generate(self, input_ids, max_length, streamer, stopping_criteria):
+                output = np.array([[0] + list(range(11, max_length + 10))])
+                for step in range(output.shape[1]):
+                    streamer.put(output[:, step])
+                    self.steps += 1
+                    time.sleep(0.001)
+                    if any(criterion(output[:, :step + 1], None) for criterion in stopping_criteria):
+                        break
+                streamer.end()
+                return output[:, :self.steps]
+
+        model = FakeModel()
+        rag = ComplaintRAG()
+        rag._load_generator = MagicMock(return_value=(FakeTokenizer(), model))
+        tokens = {}
+        timer = StageTimer([])
+        with patch('src.rag_pipeline.cfg.GENERATION_MAX_LENGTH', 4):
+            text = "".join(rag._stream_generate("prompt", timer, tokens))
+        self.assertEqual(text, "w11 w12 w13 ")
+        self.assertEqual(tokens, {"input_tokens": 3, "output_tokens": 3})
+        self.assertIn("generate", timer.timings)
+        self.assertIn("queue_wait", timer.timings)
+
+        # A reader that leaves after the first piece stops the model early
+        model = FakeModel()
+        rag._load_generator = MagicMock(return_value=(FakeTokenizer(), model))
+        cancel = threading.Event()
+        stream = rag._stream_generate("prompt", StageTimer([]), {}, cancel)
+        next(stream)
+        stream.close()
+        self.assertTrue(cancel.is_set())
+        rag._stream_executor.shutdown(wait=True)
+        self.assertLess(model.steps, 100)
+
+    def test_streams_wait_for_a_generation_slot(self):
+        docs = [Document(page_content="late fee", metadata={})]
+        release = threading.Event()
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        class BlockingModel:
+            tensor_type = "np"
+
+            def generate(self, input_ids, max_length, streamer, stopping_criteria):
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                release.wait(5)
+                with lock:
+                    running[0] -= 1
+                streamer.end()
+                return np.array([[0]])
+
+        class FakeTokenizer:
+            pad_token_id = 0
+
+            def __call__(self, prompt, **kwargs):
+                return {"input_ids": np.array([[5]])}
+
+            def decode(self, ids, **kwargs):
+                return ""
+
+        with patch('src.rag_pipeline.cfg.STREAM_MAX_CONCURRENT', 2):
+            rag = ComplaintRAG(cache_size=0)
+        self._mock_components(rag, docs)
+        rag._load_generator = MagicMock(return_value=(FakeTokenizer(), BlockingModel()))
+        streams = [rag.stream_query(f"Why fees {i}?") for i in range(4)]
+        readers = [threading.Thread(target=list, args=(stream,)) for stream in streams]
+        for reader in readers:
+            reader.start()
+        time.sleep(0.2)
+        release.set()
+        for reader in readers:
+            reader.join(5)
+        self.assertEqual(peak[0], 2)
+        self.assertTrue(all(stream.result is not None for stream in streams))
+
+    def test_profiling_writes_a_stats_file(self):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            rag = ComplaintRAG(profile=True, cache_size=0)
+            self._mock_components(rag, [])
+            with patch('src.rag_pipeline.profiled',
+                       lambda enabled, label: profiled(enabled, label, output_dir=profile_dir)):
+                rag.query_with_sources("Why fees?")
+            self.assertEqual(len(os.listdir(profile_dir)), 1)
+
+    def test_aquery_profiles_its_threads(self):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            rag = ComplaintRAG(profile=True, cache_size=0)
+            self._mock_components(rag, [])
+            rag._generate_batch = MagicMock(return_value=(["Fees"], [{"output_tokens": 1}]))
+            with patch('src.rag_pipeline.profiled',
+                       lambda enabled, label: profiled(enabled, label, output_dir=profile_dir)):
+                asyncio.run(rag.aquery("Why fees?"))
+            labels = sorted(name.split('-')[0] for name in os.listdir(profile_dir))
+            self.assertEqual(labels, ["aquery", "aquery_generate"])
+
 if __name__ == '__main__':
     unittest.main()
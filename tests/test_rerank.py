@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from src.indexing import insert_embeddings
+from src.rerank import CrossEncoderReranker, MMRReranker, load_reranker, mmr_order
+from src.rag_pipeline import ComplaintRAG
+
+class FakeCrossEncoder:
+    """Tokenizer + model pair scoring a passage by how many question words it contains."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, questions, passages, **kwargs):
+        self.batches.append(len(questions))
+        return {'overlap': np.array([[len(set(q.split()) & set(p.split()))] for q, p in zip(questions, passages)])}
+
+    def model(self, overlap):
+        return MagicMock(logits=overlap.astype(np.float32))
+
+class TestRerankers(unittest.TestCase):
+    def test_mmr_order(self):
+        query = np.array([1.0, 0.0, 0.0])
+        docs = np.array([
+            [0.9, 0.1, 0.0],    # most relevant
+            [0.9, 0.11, 0.0],   # near-copy of it
+            [0.7, 0.0, 0.7],    # relevant and different
+            [0.0, 1.0, 0.0],    # irrelevant
+        ])
+        self.assertEqual(mmr_order(query, docs, 3, lambda_mult=1.0), [0, 1, 2])
+        self.assertEqual(mmr_order(query, docs, 3, lambda_mult=0.5)[:2], [0, 2])
+        self.assertEqual(len(mmr_order(query, docs, 10, lambda_mult=0.5)), 4)
+
+    def test_cross_encoder_batches_pairs_across_pools(self):
+        fake = FakeCrossEncoder()
+        reranker = CrossEncoderReranker(batch_size=3)
+        reranker._tokenizer, reranker._model = fake, fake.model
+        pools = [
+            [Document(page_content=t) for t in ("bank fee", "late fee on loan", "zelle")],
+            [Document(page_content=t) for t in ("wire", "zelle scam refund", "zelle")],
+        ]
+        ranked = reranker.rerank_batch(["late loan fee", "zelle scam"], pools, k=2)
+        self.assertEqual([d.page_content for d in ranked[0]], ["late fee on loan", "bank fee"])
+        self.assertEqual([d.page_content for d in ranked[1]], ["zelle scam refund", "zelle"])
+        self.assertEqual(fake.batches, [3, 3])
+
+    def test_load_reranker(self):
+        self.assertIsNone(load_reranker('none'))
+        self.assertIsInstance(load_reranker('mmr'), MMRReranker)
+        with self.assertRaises(ValueError):
+            load_reranker('bm25')
+
+class TestPipelineRerank(unittest.TestCase):
+    def test_mmr_stage_uses_pool_and_stored_vectors(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = Chroma(persist_directory=tmp)
+            rng = np.random.default_rng(0)
+            top = np.array([1.0, 0.2, 0.0, 0.0])
+            vectors = [top, top + 0.01, top + 0.02] + [rng.standard_normal(4) * 0.5 + top for _ in range(12)]
+            docs = [Document(page_content=f"chunk {i}", id=f"{i}-0") for i in range(len(vectors))]
+            insert_embeddings(store, docs, [list(map(float, v)) for v in vectors])
+
+            rag = ComplaintRAG(reranker='mmr', rerank_pool=10, hybrid=False, context_tokens=0)
+            rag._reranker.lambda_mult = 0.3
+            rag._retriever = MagicMock()
+            rag._vector_store = store
+            rag._embedding_fn = MagicMock()
+            rag._embedding_fn.embed_query.return_value = [1.0, 0.2, 0.0, 0.0]
+            rag._generate = MagicMock(return_value=("answer", {}))
+
+            result = rag.query_with_sources("which fees?")
+            ids = [d.id for d in result.sources]
+            self.assertEqual(len(ids), 5)
+            self.assertEqual(ids[0], "0-0")
+            # The near-copies of the top chunk are pushed out by diverse candidates
+            self.assertNotIn("1-0", ids[:2])
+            self.assertIn("rerank", result.timings)
+            # The batch path reranks the same way
+            rag._embedding_fn.embed_documents.return_value = [[1.0, 0.2, 0.0, 0.0]]
+            rag._generate_batch = MagicMock(return_value=(["answer"], [{}]))
+            batched = rag.query_batch(["which fees? (batch)"])[0]
+            self.assertEqual([d.id for d in batched.sources], ids)
+            self.assertIn("rerank", batched.timings)
+
+if __name__ == '__main__':
+    unittest.main()
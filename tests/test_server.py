@@ -0,0 +1,167 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.api_client import RAGClient, format_pool_metrics
+from src.filters import SearchFilter
+from src.instrumentation import StageRecorder
+from src.server import PooledHTTPServer, RequestHandler, Worker, preload
+from src.startup import StartupReport
+from tests.fakes import fake_rag
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+class TestServerAPI(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rag = fake_rag()
+        self.worker = Worker(self.rag, StageRecorder(), metrics_dir=self.tmp.name)
+        self.server = PooledHTTPServer(('127.0.0.1', 0), RequestHandler, threads=2)
+        self.server.worker = self.worker
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = RAGClient(f"http://127.0.0.1:{self.server.server_address[1]}")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_query_retrieve_and_batch(self):
+        result = self.client.query("Why fees?", filters={"state": "tx"})
+        self.assertEqual(result.answer, "answer to Why fees?")
+        self.assertEqual(result.sources[0].page_content, "late fee charged twice")
+        self.assertEqual(result.sources[0].metadata["State"], "TX")
+        self.assertEqual(result.filters, SearchFilter(states=("TX",)))
+
+        self.assertEqual(self.client.retrieve("Why fees?")[0].id, "1-0")
+        answers = [r.answer for r in self.client.batch(["a", "b"])]
+        self.assertEqual(answers, ["answer to a", "answer to b"])
+        self.rag.query_batch.assert_not_called()
+
+        metrics = self.client.metrics()[0]
+        self.assertEqual(metrics["requests"], {"/query": 1, "/retrieve": 1, "/batch": 1})
+        self.assertIn("/query", metrics["latency_ms"])
+        self.assertIn("| 0 |", format_pool_metrics([metrics]))
+
+    def test_bad_requests(self):
+        with self.assertRaisesRegex(RuntimeError, "HTTP 400.*question"):
+            self.client.query("")
+        with self.assertRaisesRegex(RuntimeError, "HTTP 400.*Unknown filter"):
+            self.client.query("Why fees?", filters={"colour": "red"})
+        with self.assertRaisesRegex(RuntimeError, "HTTP 400.*ISO date"):
+            self.client.query("Why fees?", filters={"date_from": "yesterday"})
+        with self.assertRaisesRegex(RuntimeError, "HTTP 404"):
+            self.client._request('/nope', {})
+        self.assertEqual(self.client.metrics()[0]["failures"], {"/query": 3})
+
+    def test_readiness_follows_startup(self):
+        self.assertEqual(self.client.health()["status"], "ok")
+        self.assertFalse(self.client.ready()["ready"])
+        self.worker.report = StartupReport()
+        self.assertTrue(self.client.ready()["ready"])
+        self.worker.report = StartupReport(errors={"index": "no vector store"})
+        status = self.client.ready()
+        self.assertFalse(status["ready"])
+        self.assertEqual(status["workers"]["0"]["errors"], {"index": "no vector store"})
+
+    def test_connections_beyond_the_pool_wait_for_a_thread(self):
+        port = self.server.server_address[1]
+        # Two idle kept-alive connections hold both handler threads
+        idle = [socket.create_connection(('127.0.0.1', port)) for _ in range(2)]
+        try:
+            time.sleep(0.2)
+            waiting = RAGClient(f"http://127.0.0.1:{port}", timeout=0.5)
+            with self.assertRaises(OSError):
+                waiting.health()
+        finally:
+            for conn in idle:
+                conn.close()
+        self.assertEqual(self.client.health()["status"], "ok")
+
+class TestPreload(unittest.TestCase):
+    def test_preloads_the_indexes_for_every_backend(self):
+        for backend in ('exact', 'chroma'):
+            rag = fake_rag()
+            rag.generation_backend, rag.backend = 'onnx', backend
+            with patch('src.server.gc.freeze'):
+                loaded = preload(rag)
+            self.assertNotIn('llm', loaded)
+            if backend == 'chroma':
+                # The Chroma client is not fork-safe; the BM25 index is
+                rag._load_index.assert_not_called()
+                self.assertIs(rag._sparse_index, rag._load_sparse_index.return_value)
+            else:
+                rag._load_index.assert_called_once()
+
+# Runs src.server.serve with a stub pipeline in its own process, so forking and
+# signal handling do not touch the test runner
+SERVE_STUB = """
+import sys
+import src.rag_pipeline as rp
+import src.server as server
+from tests.fakes import fake_rag
+
+def make_rag(**kwargs):
+    rag = fake_rag()
+    rag.generation_backend, rag.backend, rag.intra_op_threads = 'torch', 'exact', 0
+    return rag
+
+rp.ComplaintRAG = make_rag
+rp.import_dependencies = lambda: 0.0
+server.serve('127.0.0.1', int(sys.argv[1]), int(sys.argv[2]))
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+@unittest.skipUnless(hasattr(os, 'fork'), "pre-forked workers need os.fork")
+class TestPreforkServer(unittest.TestCase):
+    def test_workers_share_the_socket_and_report(self):
+        port = free_port()
+        process = subprocess.Popen([sys.executable, '-c', SERVE_STUB, str(port), '2'], cwd=ROOT,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        client = RAGClient(f"http://127.0.0.1:{port}", timeout=5)
+        try:
+            deadline = time.time() + 30
+            status = None
+            while time.time() < deadline:
+                try:
+                    status = client.ready()
+                    if status["ready"]:
+                        break
+                except OSError:
+                    pass
+                time.sleep(0.2)
+            self.assertTrue(status and status["ready"], status)
+            pids = {w["pid"] for w in status["workers"].values()}
+            self.assertEqual(len(pids), 2)
+            self.assertNotIn(process.pid, pids)
+
+            for i in range(6):
+                self.assertEqual(client.query(f"q{i}").answer, f"answer to q{i}")
+            # Other workers publish their counters once a second
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                workers = client.metrics()
+                if sum(w["requests"].get("/query", 0) for w in workers) == 6:
+                    break
+                time.sleep(0.2)
+            self.assertEqual(sum(w["requests"].get("/query", 0) for w in workers), 6)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            self.assertEqual(process.wait(timeout=10), 0)
+
+if __name__ == '__main__':
+    unittest.main()
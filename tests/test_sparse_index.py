@@ -0,0 +1,165 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+import math
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from src.indexing import content_hash, insert_embeddings
+from src.sparse_index import BM25Index, build_sparse_index, reciprocal_rank_fusion, tokenize
+from src.rag_pipeline import ComplaintRAG
+from src.vector_index import ExactIndex, IndexVectorStore, export_from_chroma
+
+TEXTS = [
+    "I sent money with Zelle and the bank never refunded the transfer.",
+    "The overdraft fee was charged twice on my checking account.",
+    "My credit card annual fee appeared although the card was cancelled.",
+    "Wells Fargo closed my savings account without notice.",
+    "Zelle payment to a scammer, bank refused to investigate the Zelle fraud claim.",
+    "Late fee charged on personal loan even though payment was on time.",
+    "Money transfer to Mexico was delayed for three weeks.",
+    "Customer service never answered about the overdraft fee refund.",
+]
+
+def chunk(i, text, state='TX'):
+    return Document(page_content=text, id=f"{i}-0",
+                    metadata={'content_hash': content_hash(text), 'State': state, 'Category': 'Credit Card'})
+
+def bm25_reference(texts, query, k1=1.2, b=0.75):
+    """Textbook BM25, one document at a time."""
+    docs = [Counter(tokenize(t)) for t in texts]
+    avgdl = sum(sum(d.values()) for d in docs) / len(docs)
+    scores = []
+    for doc in docs:
+        dl = sum(doc.values())
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(1 for d in docs if term in d)
+            if term in doc:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                score += idf * doc[term] * (k1 + 1) / (doc[term] + k1 * (1 - b + b * dl / avgdl))
+        scores.append(score)
+    return scores
+
+class TestSparseIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = Chroma(persist_directory=os.path.join(self.tmp.name, 'chroma'))
+        rng = np.random.default_rng(0)
+        docs = [chunk(i, text, 'CA' if i % 2 else 'TX') for i, text in enumerate(TEXTS)]
+        insert_embeddings(self.store, docs, rng.standard_normal((len(docs), 4)).tolist())
+        self.index_dir = os.path.join(self.tmp.name, 'sparse')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("The ZELLE fee wasn't refunded (XXXX)"), ['zelle', 'fee', "wasn't", 'refunded'])
+
+    def test_scores_match_reference_bm25(self):
+        stats = build_sparse_index(self.store, self.index_dir)
+        self.assertEqual(stats.added, len(TEXTS))
+        index = BM25Index(self.index_dir)
+        for query in ("Zelle fraud refund", "overdraft fee", "savings account closed"):
+            rows, scores = index.search(query, k=len(TEXTS))
+            expected = bm25_reference(index.documents.table['text'].to_pylist(), query)
+            np.testing.assert_allclose(scores, [expected[r] for r in rows], rtol=1e-5)
+            self.assertEqual(len(rows), sum(1 for s in expected if s > 0))
+            self.assertEqual(expected[rows[0]], max(expected))
+
+        docs = index.search_documents("zelle", k=3)
+        self.assertEqual({d.id for d in docs}, {"0-0", "4-0"})
+        self.assertEqual(docs[0].id, "4-0")  # two mentions
+        self.assertEqual(index.search_documents("zelle", k=3, filter={'state': 'CA'}), [])
+        self.assertEqual({d.id for d in index.search_documents("fee", k=5, filter={'state': 'CA'})},
+                         {"1-0", "5-0", "7-0"})
+        self.assertEqual(index.search("unrelated words only", k=3)[0].size, 0)
+
+    def test_incremental_update_matches_full_rebuild(self):
+        build_sparse_index(self.store, self.index_dir)
+        changed = "Zelle transfer reversed but the fee stayed."
+        self.store._collection.delete(ids=["3-0"])
+        rng = np.random.default_rng(1)
+        insert_embeddings(self.store, [chunk(1, changed), chunk(8, "New complaint about a Zelle limit.")],
+                          rng.standard_normal((2, 4)).tolist())
+
+        stats = build_sparse_index(self.store, self.index_dir)
+        self.assertEqual((stats.added, stats.updated, stats.deleted, stats.unchanged), (1, 1, 1, 6))
+        full_dir = os.path.join(self.tmp.name, 'full')
+        build_sparse_index(self.store, full_dir, incremental=False)
+
+        incremental, full = BM25Index(self.index_dir), BM25Index(full_dir)
+        self.assertEqual(incremental.count, full.count)
+        for query in ("zelle fee", "savings account", "overdraft refund"):
+            inc_rows, inc_scores = incremental.search(query, k=10)
+            full_rows, full_scores = full.search(query, k=10)
+            inc_ids, full_ids = incremental.documents.table['id'].to_pylist(), full.documents.table['id'].to_pylist()
+            self.assertEqual([inc_ids[r] for r in inc_rows], [full_ids[r] for r in full_rows])
+            np.testing.assert_allclose(inc_scores, full_scores, rtol=1e-5)
+
+    def test_reads_documents_from_the_shared_dense_table(self):
+        build_sparse_index(self.store, self.index_dir)
+        dense_dir = os.path.join(self.tmp.name, 'dense')
+        export_from_chroma(self.store, dense_dir)
+        dense = IndexVectorStore(ExactIndex(dense_dir), MagicMock())
+        own, shared = BM25Index(self.index_dir), BM25Index(self.index_dir, dense.documents)
+        self.assertIs(shared.documents, dense.documents)
+        for query, search_filter in (("zelle fraud", None), ("fee", {'state': 'CA'}), ("overdraft fee", None)):
+            expected = own.search_documents(query, k=4, filter=search_filter)
+            self.assertEqual(shared.search_documents(query, k=4, filter=search_filter), expected)
+            # The reused score buffer starts from zero every time
+            self.assertEqual(own.search_documents(query, k=4, filter=search_filter), expected)
+
+        # A dense index missing chunks cannot stand in for the BM25 documents
+        self.store._collection.delete(ids=["7-0"])
+        export_from_chroma(self.store, dense_dir)
+        partial = IndexVectorStore(ExactIndex(dense_dir), MagicMock())
+        self.assertIsNot(BM25Index(self.index_dir, partial.documents).documents, partial.documents)
+
+    def test_reciprocal_rank_fusion(self):
+        a, b, c, d = (Document(page_content=x, id=x) for x in "abcd")
+        fused = reciprocal_rank_fusion([[a, b, c], [c, d]], k=1)
+        # c: 1/4 + 1/2, a: 1/2, d: 1/3, b: 1/3 (b first: it was seen first)
+        self.assertEqual([doc.id for doc in fused], ['c', 'a', 'b', 'd'])
+        self.assertEqual([doc.id for doc in reciprocal_rank_fusion([[a, b], [b, a]], weights=(0.0, 1.0))],
+                         ['b', 'a'])
+
+    def test_pipeline_fuses_dense_and_sparse(self):
+        build_sparse_index(self.store, self.index_dir)
+        rag = ComplaintRAG(sparse_index_path=self.index_dir, context_tokens=0)
+        rag._retriever = MagicMock()
+        rag._embedding_fn = MagicMock()
+        rag._embedding_fn.embed_query.return_value = [0.0]
+        dense = [Document(page_content=f"dense {i}", id=f"d{i}") for i in range(20)]
+        rag._vector_store = MagicMock()
+        rag._vector_store.similarity_search_by_vector.return_value = dense
+        rag._sparse_index = rag._load_sparse_index()
+        rag._generate = MagicMock(return_value=("answer", {}))
+
+        result = rag.query_with_sources("Zelle fraud")
+        ids = [d.id for d in result.sources]
+        # The best BM25 match is fused in right after the top dense hit
+        self.assertEqual(ids[:2], ["d0", "4-0"])
+        self.assertEqual(len(ids), 5)
+        self.assertIn("sparse_search", result.timings)
+        self.assertEqual(rag._vector_store.similarity_search_by_vector.call_args.kwargs['k'], 20)
+
+        # The chain path retrieves the same way
+        self.assertEqual(rag._chain_context("Zelle fraud"), rag._format_docs(result.sources))
+
+        # Rebuilding the BM25 index invalidates cached answers
+        rag._query_cache.fingerprint_ttl = 0
+        self.assertTrue(rag.query_with_sources("Zelle fraud").cached)
+        build_sparse_index(self.store, self.index_dir, incremental=False)
+        self.assertFalse(rag.query_with_sources("Zelle fraud").cached)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import subprocess
+import tempfile
+import time
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.startup import load_model_snapshot, snapshot_tokenizer_path, start
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def slow(seconds, result=None):
+    def step(*args):
+        time.sleep(seconds)
+        return result
+    return MagicMock(side_effect=step)
+
+class TestLazyImports(unittest.TestCase):
+    def test_pipeline_import_defers_heavy_dependencies(self):
+        code = (
+            "import sys, src.rag_pipeline as rp\n"
+            "heavy = ['transformers', 'langchain_chroma', 'langchain_huggingface', 'chromadb', 'pandas']\n"
+            "print(sorted(m for m in heavy if m in sys.modules))\n"
+            "print(rp.SPARSE_META_FILE)\n"
+        )
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        loaded, meta_file = output.stdout.strip().splitlines()
+        self.assertEqual(loaded, '[]')
+        # Deferred names still resolve as module attributes
+        self.assertEqual(meta_file, 'sparse.json')
+
+class TestStartup(unittest.TestCase):
+    def make_rag(self):
+        rag = MagicMock()
+        rag._load_embedding_fn = slow(0.2)
+        rag._load_index = slow(0.2)
+        rag._load_llm = slow(0.3)
+        rag._warm_up_embedder = slow(0.05)
+        rag._warm_up_generator = slow(0.05)
+        rag._warm_up_retrieval = slow(0.05)
+        return rag
+
+    @patch('src.rag_pipeline.import_dependencies', return_value=0.0)
+    def test_components_load_in_parallel_and_warm_up(self, _):
+        rag = self.make_rag()
+        report = start(rag, question="warm", import_seconds=1.0)
+        self.assertTrue(report.ready)
+        self.assertEqual(set(report.load_seconds), {'embedder', 'index', 'llm'})
+        self.assertEqual(set(report.warmup_seconds), {'embedder', 'llm', 'retrieval'})
+        rag._warm_up_generator.assert_called_once_with("warm")
+        # Sequential loading would take 0.7s plus warm-ups
+        self.assertLess(report.ready_seconds - 1.0, 0.6)
+        self.assertIn("Ready in", report.summary())
+
+    @patch('src.rag_pipeline.import_dependencies', return_value=0.0)
+    def test_failed_component_is_reported(self, _):
+        rag = self.make_rag()
+        rag._load_index = MagicMock(side_effect=RuntimeError("no vector store"))
+        report = start(rag)
+        self.assertFalse(report.ready)
+        self.assertEqual(report.errors, {'index': 'no vector store'})
+        # Retrieval cannot be warmed up without the index; the LLM still loads
+        rag._warm_up_retrieval.assert_not_called()
+        self.assertIn('llm', report.warmup_seconds)
+        self.assertIn("index FAILED", report.summary())
+
+    def test_missing_snapshot_falls_back(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(load_model_snapshot("google/flan-t5-base", tmp))
+            self.assertIsNone(snapshot_tokenizer_path("google/flan-t5-base", tmp))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Put src in path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from src.indexing import insert_embeddings
+from src.vector_index import (
+    QUANT_CODECS, ExactIndex, IVFIndex, IndexVectorStore, QuantizedIndex, build_ivf, export_from_chroma,
+    quantize_index,
+)
+from src.rag_pipeline import ComplaintRAG
+from tests.fakes import FakeEmbeddings
+
+class TestVectorIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        cls.vectors = rng.standard_normal((300, 16)).astype(np.float32)
+        cls.queries = rng.standard_normal((10, 16)).astype(np.float32)
+        cls.store = Chroma(persist_directory=os.path.join(cls.tmp.name, 'chroma'))
+        docs = [
+            Document(page_content=f"complaint {i}", metadata={'Product': 'Credit card', 'row': i} if i % 2 else {},
+                     id=f"{i}-0")
+            for i in range(len(cls.vectors))
+        ]
+        insert_embeddings(cls.store, docs, cls.vectors.tolist())
+        cls.index_dir = os.path.join(cls.tmp.name, 'index')
+        export_from_chroma(cls.store, cls.index_dir, page_size=64)
+        cls.n_lists = build_ivf(cls.index_dir, n_lists=12)
+        cls.sizes = quantize_index(cls.index_dir, QUANT_CODECS, pq_subvectors=4)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def brute_force(self, k):
+        dist = ((self.queries[:, None, :] - self.vectors[None, :, :]) ** 2).sum(axis=2)
+        return np.argsort(dist, axis=1)[:, :k], np.sort(dist, axis=1)[:, :k]
+
+    def test_exact_search_matches_brute_force(self):
+        idx, dist = ExactIndex(self.index_dir).search(self.queries, 5)
+        expected_idx, expected_dist = self.brute_force(5)
+        np.testing.assert_array_equal(idx, expected_idx)
+        np.testing.assert_allclose(dist, expected_dist, rtol=1e-4)
+
+    def test_ivf_probing_every_list_is_exact(self):
+        index = IVFIndex(self.index_dir, nprobe=self.n_lists)
+        idx, _ = index.search(self.queries, 5)
+        np.testing.assert_array_equal(idx, self.brute_force(5)[0])
+        # Fewer probes still return k valid neighbours
+        idx, _ = IVFIndex(self.index_dir, nprobe=2).search(self.queries, 5)
+        self.assertTrue((idx >= 0).all())
+
+    def test_quantized_codes_are_smaller(self):
+        full = ExactIndex(self.index_dir).vectors.nbytes
+        self.assertLess(self.sizes['float16'], full * 0.6)
+        self.assertLess(self.sizes['int8'], full * 0.35)
+        self.assertLess(self.sizes['pq'], full * 0.1)
+
+    def test_quantized_search_reranks_exactly(self):
+        expected_idx, expected_dist = self.brute_force(5)
+        for codec in QUANT_CODECS:
+            # Re-ranking every row is exact whatever the codec
+            idx, dist = QuantizedIndex(self.index_dir, codec=codec, rerank=300).search(self.queries, 5)
+            np.testing.assert_array_equal(idx, expected_idx)
+            np.testing.assert_allclose(dist, expected_dist, rtol=1e-4)
+        # Fine-grained codecs find the true neighbours among a few candidates
+        for codec in ('float16', 'int8'):
+            idx, _ = QuantizedIndex(self.index_dir, codec=codec, rerank=20).search(self.queries, 5)
+            np.testing.assert_array_equal(idx, expected_idx)
+
+    def test_store_returns_same_documents_as_chroma(self):
+        store = IndexVectorStore(ExactIndex(self.index_dir), embedding=MagicMock())
+        for query in self.queries[:3]:
+            expected = self.store.similarity_search_by_vector(query.tolist(), k=4)
+            self.assertEqual(store.similarity_search_by_vector(query.tolist(), k=4), expected)
+        batched = store.similarity_search_by_vectors(self.queries[:3].tolist(), k=4)
+        self.assertEqual(batched[0], store.similarity_search_by_vector(self.queries[0].tolist(), k=4))
+
+    def test_rebuilds_replace_files_that_are_mapped(self):
+        def build(index_dir):
+            export_from_chroma(self.store, index_dir, page_size=64)
+            build_ivf(index_dir, n_lists=4)
+            quantize_index(index_dir, QUANT_CODECS, pq_subvectors=4)
+
+        with tempfile.TemporaryDirectory() as index_dir:
+            build(index_dir)
+            mapped = [ExactIndex(index_dir), IVFIndex(index_dir, nprobe=4),
+                      QuantizedIndex(index_dir, codec='int8', rerank=300)]
+            expected = [index.search(self.queries, 5)[0] for index in mapped]
+            inodes = {name: os.stat(os.path.join(index_dir, name)).st_ino for name in os.listdir(index_dir)}
+
+            build(index_dir)
+            # New files under the old names; the mapped ones are untouched
+            for name, inode in inodes.items():
+                self.assertNotEqual(os.stat(os.path.join(index_dir, name)).st_ino, inode, name)
+            self.assertEqual(sorted(os.listdir(index_dir)), sorted(inodes))
+            for index, idx in zip(mapped, expected):
+                np.testing.assert_array_equal(index.search(self.queries, 5)[0], idx)
+
+    def test_from_texts_writes_a_searchable_index(self):
+        embeddings = FakeEmbeddings()
+        texts = ["late fee", "stolen card", "wire transfer"]
+        with tempfile.TemporaryDirectory() as tmp:
+            store = IndexVectorStore.from_texts(texts, embeddings, metadatas=[{'row': i} for i in range(3)],
+                                                path=os.path.join(tmp, 'index'))
+            docs = store.similarity_search("stolen card", k=1)
+        self.assertEqual([(d.page_content, d.metadata, d.id) for d in docs], [("stolen card", {'row': 1}, "1")])
+
+    @patch('src.rag_pipeline.HuggingFaceEmbeddings')
+    @patch('src.rag_pipeline.cached_embeddings')
+    @patch('src.rag_pipeline.Chroma')
+    def test_rag_pipeline_uses_configured_backend(self, mock_chroma, mock_cached, mock_hf):
+        embedding_fn = MagicMock()
+        embedding_fn.embed_query.return_value = self.queries[0].tolist()
+        mock_cached.return_value = embedding_fn
+        rag = ComplaintRAG(backend="exact", index_path=self.index_dir, cache_size=0)
+        docs = rag.retrieve_only("card fees")
+        mock_chroma.assert_not_called()
+        self.assertIsInstance(rag._vector_store, IndexVectorStore)
+        self.assertEqual([d.id for d in docs], [f"{i}-0" for i in self.brute_force(5)[0][0]])
+
+if __name__ == '__main__':
+    unittest.main()